@@ -0,0 +1,103 @@
+"""Проверки окна финансового менеджера (платформа Qt offscreen)"""
+import os
+import datetime
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QAbstractAnimation, QEvent, QObject
+from PyQt5.QtWidgets import QApplication, QDialog, QMessageBox
+
+from финансы_окно import EXPENSE_BARS, EditTransactionDialog, FinancialApp, TipDialog
+
+app = QApplication.instance() or QApplication([])
+
+
+def open_window(path, monkeypatch):
+    # Модальные окна ждали бы нажатия
+    monkeypatch.setattr(TipDialog, "exec_", lambda self: 0)
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: QMessageBox.Ok)
+    monkeypatch.setattr(QMessageBox, "warning", lambda *args: QMessageBox.Ok)
+    return FinancialApp(str(path))
+
+
+def test_button_animations_do_not_accumulate(tmp_path, monkeypatch):
+    window = open_window(tmp_path / "журнал.sqlite3", monkeypatch)
+    try:
+        window.show()
+        app.processEvents()
+        groups = [group for button, group, down, back in window.button_animator.animations]
+
+        counts = []
+        for cycle in range(2000):
+            window.button_animator.trigger()
+            # Половина запусков застаёт анимацию идущей, половина - завершённой
+            if cycle % 2:
+                for group in groups:
+                    if group.state() == QAbstractAnimation.Running:
+                        group.setCurrentTime(group.totalDuration())
+            if cycle % 500 == 0:
+                # Объекты, которые Qt сам удаляет через deleteLater, удаляются до подсчёта
+                app.processEvents()
+                app.sendPostedEvents(None, QEvent.DeferredDelete)
+                counts.append(len(window.findChildren(QObject)))
+
+        assert len(set(counts)) == 1, counts
+        assert [group for button, group, down, back in window.button_animator.animations] == groups
+    finally:
+        window.close()
+
+
+def test_negative_edit_is_rejected(tmp_path, monkeypatch):
+    window = open_window(tmp_path / "журнал.sqlite3", monkeypatch)
+    try:
+        date = datetime.date(window.finances.year, 1, 5)
+        window.add_to_category("Расходы", "Расходы", date, 45000, "Продукты")
+        app.processEvents()
+        before = list(window.finances.transactions)
+        assert len(before) == 1
+
+        def exec_negative(dialog):
+            dialog.amount_input.setText("-450")
+            dialog.save()
+            return dialog.result()
+
+        monkeypatch.setattr(EditTransactionDialog, "exec_", exec_negative)
+        window.edit_transaction(window.history_proxy.index(0, 0))
+
+        assert list(window.finances.transactions) == before
+        assert window.finances.chart_data["Расходы"]["total"][0] == 45000
+
+        dialog = EditTransactionDialog(before[0], window)
+        dialog.amount_input.setText("-450")
+        dialog.save()
+        assert dialog.result() != QDialog.Accepted
+        assert dialog.status_label.text() == "Некорректная сумма: -450"
+    finally:
+        window.close()
+
+
+def test_budget_line_is_compared_with_budgeted_spending(tmp_path, monkeypatch):
+    window = open_window(tmp_path / "журнал.sqlite3", monkeypatch)
+    try:
+        date = datetime.date(window.finances.year, 2, 10)
+        window.add_to_category("Расходы", "Расходы", date, 30000, "Продукты")
+        window.add_to_category("Расходы", "Расходы", date, 50000, "Транспорт")
+        chart = window.category_charts["Расходы"]
+        budgeted = chart.bar_sets[EXPENSE_BARS[1]]
+        app.processEvents()
+        assert budgeted not in chart.series.barSets() and not chart.line.isVisible()
+
+        # Бюджет есть только у продуктов: транспорт в сравнение с линией не входит
+        window.finances.set_budget("Продукты", 40000)
+        window.refresh_details()
+        app.processEvents()
+        assert budgeted in chart.series.barSets() and chart.line.isVisible()
+        assert budgeted.at(1) == 300
+        assert chart.bar_sets["Расходы"].at(1) == 800
+        assert chart.line.at(1).y() == 400
+
+        window.finances.set_budget("Продукты", 0)
+        window.refresh_details()
+        assert budgeted not in chart.series.barSets() and not chart.line.isVisible()
+    finally:
+        window.close()
@@ -0,0 +1,210 @@
+"""Проверки ядра без Qt"""
+import copy
+import random
+import calendar
+import datetime
+
+from финансы_ядро import (CATEGORIES, DEFAULT_ALLOCATION_RULES, SUBCATEGORIES, AllocationRules, Finances, Recurrence,
+                          RecurringBook, Transaction, date_key, parse_money)
+
+
+def visible_history(finances):
+    """History rows that are not deleted, in row order"""
+    store = finances.transactions
+    return [store[row] for row in range(len(store)) if row not in store.deleted]
+
+
+def totals(finances):
+    """Month buckets of every series of the loaded year and chart_data"""
+    series = [(category, None) for category in CATEGORIES]
+    series += [(category, subcategory) for category in SUBCATEGORIES for subcategory in SUBCATEGORIES[category]]
+    buckets = {key: list(finances.buckets.months(key[0], finances.year, key[1])) for key in series}
+    return buckets, copy.deepcopy(finances.chart_data)
+
+
+def state(finances):
+    return visible_history(finances), totals(finances)
+
+
+def test_edit_undo_redo_restores_history_and_totals(tmp_path):
+    finances = Finances(str(tmp_path / "журнал.sqlite3"))
+    date = datetime.date(finances.year, 3, 15)
+    finances.add("Доходы", "Доходы", date, 1500000, "Зарплата")
+    finances.add("Расходы", "Расходы", date, 45000, "Продукты")
+    finances.load_history()
+    before = state(finances)
+
+    finances.edit(0, Transaction("Доходы", "Доходы", "Подарок", date.replace(month=4), 2000000))
+    edited = state(finances)
+    last_row = finances.ledger.last_row
+    assert last_row == 3
+    assert [transaction.amount for transaction in edited[0]] == [45000, 2000000]
+    assert edited[1] != before[1]
+
+    # Отмена скрывает исправленную строку и возвращает прежнюю, строки журнала не удаляются
+    finances.undo()
+    assert state(finances) == before
+    assert finances.ledger.last_row == last_row
+    finances.redo()
+    assert state(finances) == edited
+    assert finances.ledger.last_row == last_row
+    assert finances.redo() is None
+    finances.close()
+
+
+def test_undo_redo_survive_reopen(tmp_path):
+    path = str(tmp_path / "журнал.sqlite3")
+    finances = Finances(path)
+    date = datetime.date(finances.year, 1, 31)
+    finances.add("Доходы", "Доходы", date, 100000, "Прочее")
+    finances.add("Расходы", "Расходы", date, 30000, "Транспорт")
+    finances.load_history()
+    before = state(finances)
+    finances.edit(1, Transaction("Расходы", "Расходы", "Транспорт", date, 35000))
+    finances.delete(0)
+    changed = state(finances)
+    finances.undo()
+    finances.undo()
+    assert state(finances) == before
+    finances.close()
+
+    finances = Finances(path)
+    finances.load_history()
+    assert state(finances) == before
+    assert finances.ledger.last_row == 3
+    finances.redo()
+    finances.redo()
+    assert state(finances) == changed
+    finances.close()
+
+    finances = Finances(path)
+    finances.load_history()
+    assert state(finances) == changed
+    assert finances.redo() is None
+    finances.close()
+
+
+def random_transactions(generator, count, year):
+    transactions = []
+    for _ in range(count):
+        category = generator.choice(CATEGORIES)
+        subcategory = generator.choice(SUBCATEGORIES.get(category, [""]))
+        date = datetime.date(year, generator.randrange(1, 13), generator.randrange(1, 29))
+        # Повторяющиеся суммы проверяют порядок равных значений
+        transactions.append(Transaction(category, category, subcategory, date, generator.randrange(1, 40) * 500))
+    return transactions
+
+
+def naive_query(store, type=None, category=None, subcategory=None, month=None, low=None, high=None, text="",
+                sort=None):
+    """HistoryIndex.query by a plain pass over the rows and a stable sort"""
+    def matches(row):
+        transaction = store[row]
+        names = [transaction.type, transaction.category, transaction.subcategory]
+        if text:
+            try:
+                amount = parse_money(text)
+            except ValueError:
+                amount = None
+            if not any(text.casefold() in name.casefold() for name in names) and transaction.amount != amount:
+                return False
+        return ((type is None or transaction.type == type) and (category is None or transaction.category == category)
+                and (subcategory is None or transaction.subcategory == subcategory)
+                and (month is None or date_key(transaction.date) // 100 == month)
+                and (low is None or transaction.amount >= low) and (high is None or transaction.amount <= high))
+
+    rows = [row for row in range(len(store)) if row not in store.deleted and matches(row)]
+    if sort == "dates":
+        rows.sort(key=lambda row: store[row].date)
+    elif sort == "amounts":
+        rows.sort(key=lambda row: store[row].amount)
+    elif sort is not None:
+        field = {"types": "type", "categories": "category", "subcategories": "subcategory"}[sort]
+        rows.sort(key=lambda row: getattr(store[row], field))
+    return rows
+
+
+def check_queries(finances):
+    year = finances.year
+    filters = [{}, {"type": "Доходы"}, {"category": "Расходы", "subcategory": "Продукты"},
+               {"subcategory": "Зарплата"}, {"month": year * 100 + 2}, {"month": year * 100 + 7, "type": "Кредиты"},
+               {"low": 5000}, {"high": 2000}, {"low": 3000, "high": 9000, "category": "Расходы"},
+               {"text": "зар"}, {"text": "50"}, {"text": "прочее", "month": year * 100 + 11},
+               {"type": "Нет такой"}, {"month": (year + 1) * 100 + 1}]
+    for conditions in filters:
+        for sort in [None] + finances.history_index.SORT_COLUMNS:
+            expected = naive_query(finances.transactions, sort=sort, **conditions)
+            assert list(finances.history_index.query(sort=sort, **conditions)) == expected, (conditions, sort)
+
+
+def test_history_index_matches_naive_filter_and_sort(tmp_path):
+    generator = random.Random(17)
+    finances = Finances(str(tmp_path / "журнал.sqlite3"))
+    finances.commit(random_transactions(generator, 2000, finances.year))
+    finances.load_history()
+    check_queries(finances)
+
+    # После построения индексов: исправления и удаления, несколько новых строк (вставка в перестановки)
+    # и большая пачка (слияние перестановок)
+    for row in generator.sample(range(2000), 30):
+        transaction = finances.transactions[row]
+        finances.edit(row, transaction._replace(amount=generator.randrange(1, 40) * 500,
+                                                date=transaction.date.replace(day=generator.randrange(1, 29))))
+    for row in generator.sample(range(2000), 40):
+        if row not in finances.transactions.deleted:
+            finances.delete(row)
+    check_queries(finances)
+
+    finances.commit(random_transactions(generator, 10, finances.year))
+    check_queries(finances)
+    finances.commit(random_transactions(generator, 500, finances.year))
+    finances.undo()
+    check_queries(finances)
+    finances.close()
+
+
+def test_monthly_occurrences_clamp_to_month_end():
+    book = RecurringBook(AllocationRules(DEFAULT_ALLOCATION_RULES))
+    for day in [29, 30, 31]:
+        rule = Recurrence("Расходы", "Расходы", "Транспорт", 100, datetime.date(2023, 1, day), None, 1, "Месяцы")
+        dates = book.occurrences(rule, datetime.date(2023, 1, 1), datetime.date(2024, 12, 31))
+        assert dates == [datetime.date(year, month, min(day, calendar.monthrange(year, month)[1]))
+                         for year in [2023, 2024] for month in range(1, 13)]
+        # Високосный февраль 2024 года получает 29-е, невисокосный 2023 года - 28-е
+        assert datetime.date(2023, 2, 28) in dates and datetime.date(2024, 2, 29) in dates
+
+    # После короткого месяца повторение возвращается к своему дню
+    rule = Recurrence("Доходы", "Доходы", "Зарплата", 100, datetime.date(2024, 1, 31), datetime.date(2024, 5, 31), 2,
+                      "Месяцы")
+    assert book.occurrences(rule, datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)) == [
+        datetime.date(2024, 1, 31), datetime.date(2024, 3, 31), datetime.date(2024, 5, 31)]
+    rule = rule._replace(start=datetime.date(2024, 2, 29), end=None, every=1, unit="Годы")
+    assert book.occurrences(rule, datetime.date(2024, 1, 1), datetime.date(2028, 12, 31)) == [
+        datetime.date(2024, 2, 29), datetime.date(2025, 2, 28), datetime.date(2026, 2, 28),
+        datetime.date(2027, 2, 28), datetime.date(2028, 2, 29)]
+
+
+def test_materialize_twice_adds_no_duplicates(tmp_path):
+    path = str(tmp_path / "журнал.sqlite3")
+    finances = Finances(path)
+    rule = Recurrence("Доходы", "Доходы", "Зарплата", 100000, datetime.date(2024, 1, 31), None, 1, "Месяцы")
+    finances.save_recurrence(rule)
+    projected = finances.total("Доходы", 2024, 2024), finances.total("Сбережения", 2024, 2024)
+    assert projected[0] == 12 * 100000
+
+    assert finances.materialize(datetime.date(2024, 6, 30)) == 6
+    assert finances.materialize(datetime.date(2024, 6, 30)) == 0
+    assert finances.materialize(datetime.date(2024, 7, 30)) == 0
+    assert finances.ledger.last_row == 6
+    assert (finances.total("Доходы", 2024, 2024), finances.total("Сбережения", 2024, 2024)) == projected
+    finances.close()
+
+    finances = Finances(path)
+    assert finances.materialize(datetime.date(2024, 6, 30)) == 0
+    assert finances.materialize(datetime.date(2024, 8, 31)) == 2
+    finances.load_history()
+    dates = [transaction.date for transaction in visible_history(finances)]
+    assert dates == sorted(set(dates)) and len(dates) == 8
+    assert dates[1] == datetime.date(2024, 2, 29) and dates[-1] == datetime.date(2024, 8, 31)
+    assert (finances.total("Доходы", 2024, 2024), finances.total("Сбережения", 2024, 2024)) == projected
+    finances.close()
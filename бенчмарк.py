@@ -0,0 +1,896 @@
+"""Бенчмарки финансового менеджера.
+
+Набор «пути» (по умолчанию) строит синтетический журнал заданного размера,
+открывает на нём окно и замеряет горячие пути приложения: добавление
+операции, обновление таблицы истории, показ категории с подкатегориями и
+простой категории, общую диаграмму, масштабирование периода колесом мыши
+при шаге оси «Авто», фильтр истории с сортировкой по сумме, вставку столбца
+сумм в форму добавления и исправление строки истории вместе с его отменой.
+Каждый размер журнала замеряется в отдельном процессе, чтобы пиковый RSS
+относился к нему. Для каждого пути
+печатаются p50/p99 задержки, число Python-аллокаций за один вызов и пиковый
+RSS; --output сохраняет результаты в JSON вместе с коммитом, --baseline
+сравнивает их с сохранёнными раньше:
+
+    QT_QPA_PLATFORM=offscreen python бенчмарк.py --output было.json
+    QT_QPA_PLATFORM=offscreen python бенчмарк.py --sizes 1000 100000 --baseline было.json
+
+Набор «сравнения» сравнивает задержку добавления одной операции в таблицу при заполненной
+истории: старый путь (QTableWidget, перестроение всех ячеек) и модель
+TransactionsTableModel, размер строки TransactionStore и время подсчёта
+суммы по категории, а также время кадра и число Python-аллокаций при
+обновлении диаграмм: пересоздание QChart против контроллеров с заменой
+значений на месте, старт окна на пустом журнале (построение виджетов и
+их оформление), холодный старт окна с заполненным Ledger на диске,
+скорость импорта CSV-выписки и экспорта журнала в CSV и по столбцам,
+сумму десяти миллионов сумм в копейках против сложения рублей во float,
+применение правил распределения к пачке доходов: по одной операции и
+пачкой, графики погашения 1000 кредитов на 360 месяцев: полный расчёт
+с NumPy и без него и пересчёт после изменения одного кредита, и проекцию
+1000 повторяющихся операций на один показанный год и на 1900-2100 годы.
+Запуск без дисплея:
+
+    QT_QPA_PLATFORM=offscreen python бенчмарк.py --suite сравнения --sizes 1000 100000 1000000
+
+Набор «приём» - генератор нагрузки для сервера приёма операций: запускает
+финансы.py serve на временном журнале (или подключается к уже запущенному
+серверу по --address), открывает --connections подключений и отправляет
+по ним --ingest-rows операций запросами по --ingest-batch операций.
+Печатает операций в секунду, p50/p99 задержки ответа на запрос и число
+пачек, которыми сервер сохранил операции:
+
+    python бенчмарк.py --suite приём --connections 20 --ingest-rows 200000 --ingest-batch 100
+"""
+import os
+import sys
+import json
+import math
+import time
+import platform
+import resource
+import subprocess
+import random
+import signal
+import asyncio
+import calendar
+import argparse
+import decimal
+import operator
+import functools
+import datetime
+import tempfile
+import statistics
+import tracemalloc
+from array import array
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QTableView, QHeaderView
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtChart import QChart, QChartView, QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis, QStackedBarSeries, \
+    QPieSeries
+
+import финансы_ядро
+from финансы_ядро import (LOAN_KINDS, MONTHS, MONTHS_SHORT, SUBCATEGORIES, Transaction, TransactionStore,
+                          AggregateIndex, BucketIndex, Ledger, LedgerExporter, Loan, LoanBook, AllocationRules,
+                          Recurrence, RecurringBook, DEFAULT_ALLOCATION_RULES, aggregate_deltas)
+from финансы_окно import TransactionsTableModel, BarChartController, PieChartController, FinancialApp
+from финансы_тема import CATEGORY_COLORS
+from финансы_сервер import parse_address
+
+
+def make_transactions(count):
+    transactions = []
+    for i in range(count):
+        category = "Доходы" if i % 3 == 0 else "Расходы"
+        date = datetime.date(2025, i % 12 + 1, 15)
+        transactions.append(Transaction(category, category, "Прочее", date, i % 1000 * 100 + i % 100))
+    return transactions
+
+
+def make_store(count):
+    store = TransactionStore()
+    store.extend(make_transactions(count))
+    return store
+
+
+def make_legacy_transactions(count):
+    # Прежний формат истории: список словарей
+    return [{"type": t.type, "category": t.category, "subcategory": t.subcategory,
+             "month": MONTHS[t.date.month - 1], "amount": t.amount} for t in make_transactions(count)]
+
+
+def legacy_update_table(table, transactions):
+    # Копия прежнего FinancialApp.update_transactions_table
+    table.setRowCount(len(transactions))
+
+    for row, transaction in enumerate(transactions):
+        table.setItem(row, 0, QTableWidgetItem(transaction["type"]))
+        table.setItem(row, 1, QTableWidgetItem(transaction["category"]))
+        table.setItem(row, 2, QTableWidgetItem(transaction["subcategory"]))
+        table.setItem(row, 3, QTableWidgetItem(transaction["month"]))
+        table.setItem(row, 4, QTableWidgetItem(f"{transaction['amount']} ₽"))
+
+        if transaction["type"] == "Доходы":
+            color = QColor("#4CAF50")
+        elif transaction["type"] == "Расходы":
+            color = QColor("#F44336")
+        else:
+            color = QColor("#2196F3")
+
+        for col in range(5):
+            table.item(row, col).setBackground(color.lighter(180))
+
+
+def bench_legacy(app, size, repeats):
+    transactions = make_legacy_transactions(size)
+    table = QTableWidget()
+    table.setColumnCount(5)
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+    table.resize(800, 600)
+    table.show()
+    legacy_update_table(table, transactions)
+    app.processEvents()
+
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        transactions.append(make_legacy_transactions(1)[0])
+        legacy_update_table(table, transactions)
+        app.processEvents()
+        timings.append(time.perf_counter() - start)
+    table.close()
+    return timings
+
+
+def bench_model(app, size, repeats):
+    model = TransactionsTableModel(make_store(size))
+    view = QTableView()
+    view.setModel(model)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+    view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    view.resize(800, 600)
+    view.show()
+    app.processEvents()
+
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        model.append_transactions(make_transactions(1))
+        app.processEvents()
+        timings.append(time.perf_counter() - start)
+    view.close()
+    return timings
+
+
+def make_chart_data():
+    return {
+        "Доходы": {"total": [0] * 12, "Зарплата": [0] * 12, "Подарок": [0] * 12, "Прочее": [0] * 12},
+        "Расходы": {"total": [0] * 12, "Транспорт": [0] * 12, "Продукты": [0] * 12,
+                    "Развлечения": [0] * 12, "Прочее": [0] * 12},
+        "Сбережения": [0] * 12,
+        "Благотворительность": [0] * 12,
+        "Кредиты": [0] * 12
+    }
+
+
+def legacy_bar_chart(title, series, bar_values, max_value):
+    # Как прежние show_category_with_subcategories / create_all_categories_chart: всё заново
+    chart = QChart()
+    chart.setAnimationOptions(QChart.SeriesAnimations)
+    chart.setTitle(title)
+    chart.setTitleFont(QFont("Arial", 12, QFont.Bold))
+    chart.setBackgroundBrush(QColor("transparent"))
+    for name, values in bar_values:
+        bar_set = QBarSet(name)
+        bar_set.setColor(QColor(CATEGORY_COLORS[name]))
+        for value in values:
+            bar_set.append(value)
+        series.append(bar_set)
+    chart.addSeries(series)
+
+    axis_x = QBarCategoryAxis()
+    axis_x.append(MONTHS_SHORT)
+    chart.addAxis(axis_x, Qt.AlignBottom)
+    series.attachAxis(axis_x)
+    axis_y = QValueAxis()
+    axis_y.setRange(0, max(max_value * 1.2, 100))
+    chart.addAxis(axis_y, Qt.AlignLeft)
+    series.attachAxis(axis_y)
+    return chart
+
+
+def legacy_rebuild_charts(views, chart_data):
+    chart_view, pie_view, all_view = views
+    totals = chart_data["Доходы"]["total"]
+    chart_view.setChart(legacy_bar_chart("Месячные доходы", QBarSeries(), [("Доходы", totals)], max(totals)))
+
+    pie_chart = QChart()
+    pie_chart.setAnimationOptions(QChart.SeriesAnimations)
+    pie_series = QPieSeries()
+    for subcat in ["Зарплата", "Подарок", "Прочее"]:
+        total = sum(chart_data["Доходы"][subcat])
+        if total > 0:
+            pie_series.append(f"{subcat}: {total} ₽", total)
+    pie_chart.addSeries(pie_series)
+    pie_view.setChart(pie_chart)
+
+    bar_values = [(category, chart_data[category]["total"] if category in ["Доходы", "Расходы"]
+                   else chart_data[category]) for category in AggregateIndex.CATEGORIES]
+    stacked_max = max(sum(values[month] for name, values in bar_values) for month in range(12))
+    all_view.setChart(legacy_bar_chart("Общая финансовая картина", QStackedBarSeries(), bar_values, stacked_max))
+
+
+def measure_frame(app, action):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    action()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return elapsed, allocations
+
+
+def bench_charts(app, repeats):
+    views = [QChartView(), QChartView(), QChartView()]
+    for view in views:
+        view.resize(800, 400)
+        view.show()
+
+    chart_data = make_chart_data()
+    aggregates = AggregateIndex(chart_data)
+    results = {"пересоздание": [], "обновление на месте": []}
+
+    def add(i):
+        month = i % 12
+        aggregates.add("Доходы", month, 10000, "Зарплата")
+        aggregates.add("Сбережения", month, 1000)
+        return month
+
+    for i in range(repeats):
+        add(i)
+        results["пересоздание"].append(measure_frame(app, lambda: legacy_rebuild_charts(views, chart_data)))
+
+    chart = BarChartController("Месячные доходы", ["Доходы"])
+    pie = PieChartController(["Зарплата", "Подарок", "Прочее"])
+    all_chart = BarChartController("Общая финансовая картина", AggregateIndex.CATEGORIES, stacked=True)
+    views[0].setChart(chart.chart)
+    views[1].setChart(pie.chart)
+    views[2].setChart(all_chart.chart)
+    app.processEvents()
+
+    def update(month):
+        for category in ["Доходы", "Сбережения"]:
+            value = aggregates.series(category)[month]
+            all_chart.set_value(category, month, value)
+        chart.set_value("Доходы", month, aggregates.series("Доходы")[month])
+        chart.set_maximum(aggregates.maximum("Доходы"))
+        pie.set_value("Зарплата", aggregates.yearly_total("Доходы", "Зарплата"))
+        all_chart.set_maximum(aggregates.stacked_maximum())
+
+    for i in range(repeats):
+        month = add(i)
+        results["обновление на месте"].append(measure_frame(app, lambda: update(month)))
+
+    for view in views:
+        view.close()
+    return results
+
+
+class BenchApp(FinancialApp):
+    def show_random_tip(self):
+        pass
+
+
+def bench_cold_start(app, rows):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ledger.sqlite3")
+        ledger = Ledger(path)
+        buckets = BucketIndex()
+        for start in range(0, rows, 100000):
+            transactions = make_transactions(min(100000, rows - start))
+            ledger.append(transactions)
+            buckets.apply(aggregate_deltas(transactions))
+        ledger.save_snapshot(buckets)
+        ledger.close()
+
+        start = time.perf_counter()
+        window = BenchApp(path)
+        window.show()
+        window.repaint()
+        elapsed = time.perf_counter() - start
+
+        window.close()
+        return elapsed
+
+
+def bench_startup(app, repeats):
+    """Seconds from creating the window on an empty ledger to its first paint, one per repeat"""
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(repeats + 1):
+            start = time.perf_counter()
+            window = BenchApp(os.path.join(directory, f"ledger{i}.sqlite3"))
+            window.show()
+            window.repaint()
+            timings.append(time.perf_counter() - start)
+            window.close()
+            app.processEvents()
+    # Первый запуск греет кэши Qt (шрифты, разбор стилей) и в медиану не идёт
+    return timings[1:]
+
+
+def bench_import(app, rows):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "statement.csv")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("дата;сумма;категория;подкатегория\n")
+            for i in range(rows):
+                amount = i % 1000 if i % 3 == 0 else -(i % 1000)
+                file.write(f"2025-{i % 12 + 1:02d}-15;{amount},{i % 100:02d};;\n")
+
+        window = BenchApp(os.path.join(directory, "ledger.sqlite3"))
+        app.processEvents()
+        imported, skipped, elapsed = window.import_file(path)
+        window.close()
+        return imported, elapsed
+
+
+def bench_export(rows):
+    """Seconds to export a synthetic ledger of the given size, per format"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ledger.sqlite3")
+        make_ledger(path, rows)
+        for format, target in [("csv", "export.csv"), ("колонки", "columns")]:
+            exporter = LedgerExporter(path)
+            start = time.perf_counter()
+            for written in exporter.export(os.path.join(directory, target), format):
+                pass
+            results[format] = time.perf_counter() - start
+            exporter.close()
+    return results
+
+
+def bench_money(count):
+    # Столбец сумм в копейках, как TransactionStore.amounts, и те же суммы в рублях во float
+    generator = random.Random(1)
+    kopecks = array("q", (generator.randrange(1, 1000000) for i in range(count)))
+    rubles = array("d", (amount / 100 for amount in kopecks))
+
+    start = time.perf_counter()
+    exact = sum(kopecks)
+    kopecks_elapsed = time.perf_counter() - start
+
+    # Прежний путь: нарастающий итог во float, как chart_data[...][month] += amount
+    start = time.perf_counter()
+    approximate = functools.reduce(operator.add, rubles, 0.0)
+    rubles_elapsed = time.perf_counter() - start
+
+    # Ошибка float в копейках относительно точной суммы
+    error = abs(decimal.Decimal(approximate) * 100 - exact)
+    return kopecks_elapsed, rubles_elapsed, error
+
+
+def bench_rules(count):
+    rules = AllocationRules(DEFAULT_ALLOCATION_RULES)
+    date = datetime.date(2025, 1, 15)
+    incomes = [Transaction("Доходы", "Доходы", "Зарплата", date, i % 1000 * 100 + i % 100) for i in range(count)]
+
+    start = time.perf_counter()
+    for transaction in incomes:
+        rules.evaluate(transaction)
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    allocations = rules.allocate(incomes)
+    batch_elapsed = time.perf_counter() - start
+
+    store = TransactionStore()
+    store.extend(incomes, allocations)
+    return single_elapsed, batch_elapsed, len(allocations), store.nbytes() / count
+
+
+def bench_loans(count, term):
+    """Seconds to schedule all loans from scratch and to reschedule one, with and without NumPy"""
+    generator = random.Random(1)
+    loans = {}
+    for i in range(count):
+        # Платежи и в конце месяца: в коротких месяцах они переносятся на последний день
+        year, month = generator.randrange(2000, 2030), generator.randrange(1, 13)
+        start = datetime.date(year, month, min(generator.choice([1, 15, 28, 31]), calendar.monthrange(year, month)[1]))
+        loans[i] = Loan(f"Кредит {i}", generator.randrange(100000, 100000000), generator.choice([0, 7.5, 12, 19.9]),
+                        term, LOAN_KINDS[i % 2], start)
+    changed = loans[0]._replace(rate=loans[0].rate + 1)
+
+    results = {}
+    numpy = финансы_ядро.load_numpy()
+    for name, module in [("NumPy", numpy), ("без NumPy", None)]:
+        if name == "NumPy" and numpy is None:
+            continue
+        # Запасной путь ядра включается так же, как без установленного NumPy
+        финансы_ядро.numpy = module
+        try:
+            book = LoanBook()
+            start = time.perf_counter()
+            book.rebuild(loans)
+            rebuild_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            book.set(0, changed)
+            set_elapsed = time.perf_counter() - start
+        finally:
+            финансы_ядро.numpy = numpy
+        results[name] = rebuild_elapsed, set_elapsed
+    return results
+
+
+def bench_recurring(count):
+    """Seconds to project count endless recurring operations into one year and into 1900-2100, and the occurrences"""
+    generator = random.Random(1)
+    rules = {}
+    for i in range(count):
+        category = "Доходы" if i % 4 == 0 else "Расходы"
+        start = datetime.date(generator.randrange(2000, 2026), generator.randrange(1, 13), generator.randrange(1, 29))
+        rules[i] = Recurrence(category, category, SUBCATEGORIES[category][i % 3], generator.randrange(100, 10000000),
+                              start, None, generator.choice([1, 2]), ["Дни", "Недели", "Месяцы"][i % 3])
+
+    results = []
+    for years in [range(2026, 2027), range(1900, 2101)]:
+        book = RecurringBook(AllocationRules(DEFAULT_ALLOCATION_RULES), rules)
+        start = time.perf_counter()
+        book.expand(years)
+        elapsed = time.perf_counter() - start
+        occurrences = sum(len(book.occurrences(rule, datetime.date(years[0], 1, 1), datetime.date(years[-1], 12, 31)))
+                          for rule in rules.values())
+        results.append((elapsed, occurrences))
+    return results
+
+
+# Горячие пути набора «пути»: подготовка перед замером и одна итерация
+PATHS = ["add_to_category", "update_transactions_table", "show_category_with_subcategories",
+         "show_simple_category", "create_all_categories_chart", "zoom_chart_range",
+         "filter_history", "paste_amounts", "edit_and_undo"]
+
+
+def make_synthetic_transactions(start, count):
+    """Mixed incomes, expenses and credits over the last three years, the same for the same start"""
+    year = datetime.date.today().year
+    incomes, expenses = SUBCATEGORIES["Доходы"], SUBCATEGORIES["Расходы"]
+    transactions = []
+    for i in range(start, start + count):
+        date = datetime.date(year - 2 + i % 3, i % 12 + 1, i % 28 + 1)
+        amount = i * 7919 % 500000 + 100
+        kind = i % 10
+        if kind < 3:
+            transactions.append(Transaction("Доходы", "Доходы", incomes[i % len(incomes)], date, amount * 3))
+        elif kind < 9:
+            transactions.append(Transaction("Расходы", "Расходы", expenses[i % len(expenses)], date, amount))
+        else:
+            transactions.append(Transaction("Кредиты", "Кредиты", "", date, amount))
+    return transactions
+
+
+def make_ledger(path, rows):
+    """Synthetic ledger with allocations and a snapshot, written in chunks of 100k rows"""
+    ledger = Ledger(path)
+    buckets = BucketIndex()
+    rules = AllocationRules(DEFAULT_ALLOCATION_RULES)
+    for start in range(0, rows, 100000):
+        transactions = make_synthetic_transactions(start, min(100000, rows - start))
+        allocations = rules.allocate(transactions)
+        ledger.append(transactions, allocations)
+        buckets.apply(aggregate_deltas(transactions, allocations))
+    ledger.save_snapshot(buckets)
+    ledger.close()
+
+
+def open_window(app, path):
+    window = BenchApp(path)
+    window.show()
+    # История грузится теми же частями, что и по таймеру окна, но сразу целиком
+    window.history_timer.stop()
+    while not window.finances.history_loaded:
+        window.finances.load_history(window.HISTORY_CHUNK)
+    window.redraw.mark_dirty()
+    window.redraw.flush()
+    app.processEvents()
+    return window
+
+
+def path_steps(app, window):
+    """(prepare, action) of every path; action(i) runs one iteration and draws the result"""
+    finances = window.finances
+    date = datetime.date(finances.year, 6, 15)
+
+    def draw():
+        # Перерисовка, которую иначе сделал бы таймер RedrawScheduler, и синхронная отрисовка окна
+        window.redraw.flush()
+        window.repaint()
+
+    def add(i):
+        window.add_to_category("Доходы", "Доходы", date, 150000 + i, "Зарплата")
+        draw()
+
+    def update_table(i):
+        window.refresh_after_commit(finances.commit([Transaction("Расходы", "Расходы", "Продукты", date, 5000 + i)]))
+        draw()
+
+    def show(categories):
+        def action(i):
+            window.show_chart(categories[i % 2])
+            draw()
+        return action
+
+    def all_categories(i):
+        window.redraw.mark_dirty()
+        window.show_all_categories()
+        draw()
+
+    def select_tab(widget):
+        return lambda: window.tab_widget.setCurrentWidget(widget)
+
+    def prepare_zoom():
+        # Все три года синтетического журнала, шаг оси подбирается по ширине диаграммы
+        window.tab_widget.setCurrentWidget(window.all_chart_tab)
+        window.granularity_combo.setCurrentText("Авто")
+        window.show_range(datetime.date(finances.year - 2, 1, 1), datetime.date(finances.year, 12, 31))
+
+    def prepare_history():
+        window.tab_widget.setCurrentWidget(window.transactions_tab)
+        window.history_proxy.sort(4, Qt.DescendingOrder)
+
+    def filter_history(i):
+        window.history_proxy.set_filters({"category": ["Расходы", "Доходы"][i % 2], "low": 100000 + i})
+        draw()
+
+    def prepare_paste():
+        window.tab_widget.setCurrentWidget(window.current_chart_tab)
+        window.open_add_money_window("Расходы", "Расходы")
+
+    def paste(i):
+        # Столбец из 100 сумм, вставленный в форму и добавленный одним Enter
+        form = window.add_windows["Расходы"]
+        form.amount_input.setPlainText("\n".join(f"{100 + i + line},50" for line in range(100)))
+        form.add_money()
+        draw()
+
+    def zoom(i):
+        window.zoom_period(0.5 if i % 2 else 2, 0.3)
+        draw()
+
+    def prepare_edit():
+        window.tab_widget.setCurrentWidget(window.transactions_tab)
+        window.history_proxy.sort(-1)
+
+    def edit_and_undo(i):
+        # Исправление строки из середины истории и его отмена: два события журнала
+        row = (i + 1) * 7919 % (len(finances.transactions) // 2)
+        transaction = finances.transactions[row]
+        window.change_history(finances.edit, row, transaction._replace(amount=transaction.amount + 100))
+        window.undo()
+        draw()
+
+    return {
+        "add_to_category": (select_tab(window.current_chart_tab), add),
+        "update_transactions_table": (select_tab(window.transactions_tab), update_table),
+        "show_category_with_subcategories": (select_tab(window.current_chart_tab), show(["Доходы", "Расходы"])),
+        "show_simple_category": (select_tab(window.current_chart_tab), show(["Кредиты", "Сбережения"])),
+        "create_all_categories_chart": (select_tab(window.all_chart_tab), all_categories),
+        "zoom_chart_range": (prepare_zoom, zoom),
+        "filter_history": (prepare_history, filter_history),
+        "paste_amounts": (prepare_paste, paste),
+        "edit_and_undo": (prepare_edit, edit_and_undo)
+    }
+
+
+def percentile(samples, fraction):
+    # Ближайший ранг: p99 из 100 замеров - второй по величине
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def bench_paths(app, size, repeats, paths):
+    """Results of every path on a synthetic ledger of the given size"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ledger.sqlite3")
+        start = time.perf_counter()
+        make_ledger(path, size)
+        generated = time.perf_counter() - start
+
+        start = time.perf_counter()
+        window = open_window(app, path)
+        opened = time.perf_counter() - start
+
+        results = []
+        steps = path_steps(app, window)
+        for name in paths:
+            prepare, action = steps[name]
+            prepare()
+            app.processEvents()
+            action(-1)  # прогрев
+
+            samples = []
+            for i in range(repeats):
+                start = time.perf_counter()
+                action(i)
+                samples.append(time.perf_counter() - start)
+
+            # Аллокации считаются отдельным вызовом: tracemalloc замедляет код в разы
+            allocations = measure_frame(app, lambda: action(repeats))[1]
+            results.append({
+                "path": name,
+                "size": size,
+                "repeats": repeats,
+                "p50_ms": percentile(samples, 0.5) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+                "mean_ms": statistics.fmean(samples) * 1000,
+                "allocations": allocations
+            })
+
+        window.close()
+
+    rss = peak_rss_mb()
+    for result in results:
+        result.update(peak_rss_mb=rss, ledger_seconds=generated, open_seconds=opened)
+    return results
+
+
+def git_commit():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directory, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def run_paths(args):
+    results = []
+    for size in args.sizes:
+        # Каждый размер в своём процессе: пиковый RSS процесса не смешивается между размерами
+        command = [sys.executable, os.path.abspath(__file__), "--worker-size", str(size),
+                   "--repeats", str(args.repeats), "--paths", *args.paths]
+        worker = subprocess.run(command, capture_output=True, text=True)
+        if worker.returncode != 0:
+            sys.stderr.write(worker.stderr)
+            sys.exit(f"замер размера {size} завершился с кодом {worker.returncode}")
+        results.extend(json.loads(worker.stdout.splitlines()[-1]))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = {(result["path"], result["size"]): result for result in json.load(file)["results"]}
+
+    print(f"{'путь':>34} {'строк':>9} {'p50, мс':>9} {'p99, мс':>9} {'аллокаций':>10} {'RSS, МБ':>8}"
+          + (f" {'p50 к базе':>11}" if baseline else ""))
+    for result in results:
+        line = (f"{result['path']:>34} {result['size']:>9} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                f"{result['allocations']:>10} {result['peak_rss_mb']:>8.0f}")
+        old = baseline.get((result["path"], result["size"]))
+        if old:
+            line += f" {result['p50_ms'] / old['p50_ms']:>10.2f}x"
+        print(line)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qt_platform": os.environ.get("QT_QPA_PLATFORM"),
+            "results": results
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def run_comparisons(args):
+    app = QApplication(sys.argv[:1])
+
+    print(f"{'строк':>10} {'QTableWidget, мс':>18} {'модель, мс':>12}")
+    for size in args.sizes:
+        if size <= args.legacy_max:
+            # Старый путь перестраивает всю таблицу, одного повтора достаточно на больших размерах
+            legacy = statistics.median(bench_legacy(app, size, args.repeats if size <= 100000 else 1))
+            legacy_text = f"{legacy * 1000:.2f}"
+        else:
+            legacy_text = "пропущено"
+        model = statistics.median(bench_model(app, size, args.repeats))
+        print(f"{size:>10} {legacy_text:>18} {model * 1000:>12.3f}")
+
+    print()
+    print(f"{'строк':>10} {'байт/строка':>12} {'сумма по категории, мс':>24}")
+    for size in args.sizes:
+        store = make_store(size)
+        start = time.perf_counter()
+        store.total("Доходы")
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {store.nbytes() / size:>12.1f} {elapsed * 1000:>24.2f}")
+
+    print()
+    print(f"{'диаграммы':>20} {'кадр, мс':>10} {'аллокаций':>10}")
+    for name, samples in bench_charts(app, args.repeats).items():
+        frame = statistics.median(elapsed for elapsed, allocations in samples)
+        allocations = statistics.median(allocations for elapsed, allocations in samples)
+        print(f"{name:>20} {frame * 1000:>10.2f} {allocations:>10.0f}")
+
+    print()
+    elapsed = statistics.median(bench_startup(app, max(args.repeats, 10)))
+    print(f"старт окна на пустом журнале до первой отрисовки: {elapsed * 1000:.1f} мс")
+
+    elapsed = bench_cold_start(app, args.ledger_rows)
+    print(f"холодный старт до первой диаграммы при {args.ledger_rows} операциях на диске: {elapsed * 1000:.1f} мс")
+
+    imported, elapsed = bench_import(app, args.import_rows)
+    print(f"импорт CSV: {imported} строк за {elapsed:.2f} с ({imported / elapsed:.0f} строк/с)")
+
+    for format, elapsed in bench_export(args.export_rows).items():
+        print(f"экспорт {format}: {args.export_rows} строк за {elapsed:.2f} с ({args.export_rows / elapsed:.0f} строк/с)")
+
+    single_elapsed, batch_elapsed, allocations, row_bytes = bench_rules(args.rules_count)
+    print(f"правила распределения для {args.rules_count} доходов: по одной {single_elapsed * 1000:.0f} мс, "
+          f"пачкой {batch_elapsed * 1000:.0f} мс; {allocations} ссылок, {row_bytes:.1f} байт на доход с распределением")
+
+    kopecks_elapsed, rubles_elapsed, error = bench_money(args.money_count)
+    print(f"сумма {args.money_count} операций: копейки (int64) {kopecks_elapsed * 1000:.1f} мс, точно; "
+          f"рубли (float) {rubles_elapsed * 1000:.1f} мс, ошибка {error:.4f} коп.")
+
+    for name, (rebuild_elapsed, set_elapsed) in bench_loans(args.loan_count, args.loan_term).items():
+        print(f"графики {args.loan_count} кредитов на {args.loan_term} мес. ({name}): "
+              f"все {rebuild_elapsed * 1000:.1f} мс, изменение одного {set_elapsed * 1000:.2f} мс")
+
+    (year_elapsed, year_occurrences), (all_elapsed, all_occurrences) = bench_recurring(args.recurring_count)
+    print(f"{args.recurring_count} повторяющихся операций без конца: проекция одного года {year_elapsed * 1000:.1f} мс "
+          f"({year_occurrences} повторений), 1900-2100 {all_elapsed * 1000:.0f} мс ({all_occurrences} повторений, "
+          f"столько строк записали бы повторения операциями)")
+
+
+def make_ingest_payloads(count, batch):
+    """count request lines of batch JSON operations each, encoded in advance so the clients only send bytes"""
+    payloads = []
+    for i in range(count):
+        operations = []
+        for j in range(batch):
+            category = "Доходы" if (i + j) % 3 == 0 else "Расходы"
+            operations.append({"category": category, "subcategory": SUBCATEGORIES[category][j % 3],
+                               "date": f"2025-{j % 12 + 1:02d}-{i % 28 + 1:02d}",
+                               "kopecks": 100 + (i * batch + j) % 100000})
+        payloads.append(json.dumps(operations, ensure_ascii=False).encode() + b"\n")
+    return payloads
+
+
+async def ingest_client(address, payloads, requests, latencies):
+    if address[0] == "unix":
+        reader, writer = await asyncio.open_unix_connection(address[1])
+    else:
+        reader, writer = await asyncio.open_connection(address[1], address[2])
+    try:
+        for i in range(requests):
+            start = time.perf_counter()
+            writer.write(payloads[i % len(payloads)])
+            await writer.drain()
+            answer = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if "accepted" not in answer:
+                raise RuntimeError(f"сервер отклонил запрос: {answer}")
+    finally:
+        writer.close()
+
+
+async def drive_ingest(address, connections, requests, payloads):
+    """Seconds for all the clients to get their answers, and the latency of every request"""
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(ingest_client(address, payloads, requests, latencies) for i in range(connections)))
+    return time.perf_counter() - start, latencies
+
+
+def wait_for_server(server, address, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"сервер приёма завершился с кодом {server.returncode}: {server.stderr.read()}")
+        if os.path.exists(address[1]):
+            return
+        time.sleep(0.05)
+    server.kill()
+    sys.exit("сервер приёма не открыл сокет")
+
+
+def bench_ingest(address, rows, batch, connections):
+    """(operations sent, seconds, request latencies, server batches or None for an external server)"""
+    requests = max(1, rows // (batch * connections))
+    payloads = make_ingest_payloads(min(requests, 100), batch)
+    if address is not None:
+        elapsed, latencies = asyncio.run(drive_ingest(parse_address(address), connections, requests, payloads))
+        return requests * batch * connections, elapsed, latencies, None
+
+    with tempfile.TemporaryDirectory() as directory:
+        address = ("unix", os.path.join(directory, "приём.sock"))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "финансы.py")
+        command = [sys.executable, script, "--ledger", os.path.join(directory, "ledger.sqlite3"),
+                   "--rules", os.path.join(directory, "rules.json"), "serve", "--address", address[1]]
+        server = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            wait_for_server(server, address)
+            elapsed, latencies = asyncio.run(drive_ingest(address, connections, requests, payloads))
+        finally:
+            # Ctrl+C останавливает сервер, и он печатает число принятых операций и пачек
+            server.send_signal(signal.SIGINT)
+            output, errors = server.communicate(timeout=30)
+        batches = int(output.rsplit("пачек:", 1)[1]) if "пачек:" in output else None
+        return requests * batch * connections, elapsed, latencies, batches
+
+
+def run_ingest(args):
+    rows, elapsed, latencies, batches = bench_ingest(args.address, args.ingest_rows, args.ingest_batch,
+                                                     args.connections)
+    print(f"приём: {rows} операций по {args.ingest_batch} в запросе через {args.connections} подключений "
+          f"за {elapsed:.2f} с ({rows / elapsed:.0f} операций/с)")
+    print(f"задержка запроса: p50 {percentile(latencies, 0.5) * 1000:.2f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} мс")
+    if batches:
+        print(f"сохранено пачками: {batches}, в среднем {rows / batches:.0f} операций в пачке")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей и сравнения со старой реализацией")
+    parser.add_argument("--suite", choices=["пути", "сравнения", "приём"], default="пути")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeats", type=int, default=None,
+                        help="замеров на путь и размер (по умолчанию 100 для путей и 5 для сравнений)")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=PATHS)
+    parser.add_argument("--output", help="сохранить результаты путей в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого запуска для сравнения p50")
+    parser.add_argument("--worker-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--legacy-max", type=int, default=1000000,
+                        help="не запускать старый путь для истории больше этого размера")
+    parser.add_argument("--ledger-rows", type=int, default=1000000,
+                        help="сколько операций сохранить на диск для замера холодного старта")
+    parser.add_argument("--import-rows", type=int, default=1000000,
+                        help="размер CSV-выписки для замера импорта")
+    parser.add_argument("--export-rows", type=int, default=1000000,
+                        help="размер журнала для замера экспорта")
+    parser.add_argument("--rules-count", type=int, default=1000000,
+                        help="сколько доходов распределять в замере правил")
+    parser.add_argument("--money-count", type=int, default=10000000,
+                        help="сколько сумм складывать в замере арифметики копеек")
+    parser.add_argument("--loan-count", type=int, default=1000, help="сколько кредитов в замере графиков погашения")
+    parser.add_argument("--loan-term", type=int, default=360, help="срок кредитов в замере, месяцев")
+    parser.add_argument("--recurring-count", type=int, default=1000,
+                        help="сколько повторяющихся операций в замере их проекции")
+    parser.add_argument("--address", help="адрес уже запущенного сервера приёма, по умолчанию запускается свой")
+    parser.add_argument("--connections", type=int, default=10, help="сколько подключений открывает генератор нагрузки")
+    parser.add_argument("--ingest-rows", type=int, default=200000, help="сколько операций отправить серверу приёма")
+    parser.add_argument("--ingest-batch", type=int, default=100, help="сколько операций в одном запросе к серверу")
+    args = parser.parse_args()
+
+    if args.worker_size is not None:
+        app = QApplication(sys.argv[:1])
+        print(json.dumps(bench_paths(app, args.worker_size, args.repeats, args.paths)))
+    elif args.suite == "пути":
+        args.repeats = args.repeats or 100
+        run_paths(args)
+    elif args.suite == "приём":
+        run_ingest(args)
+    else:
+        args.repeats = args.repeats or 5
+        run_comparisons(args)
+
+
+if __name__ == "__main__":
+    main()
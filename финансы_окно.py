@@ -0,0 +1,2504 @@
+import os
+import sys
+import time
+import asyncio
+import bisect
+import random
+import calendar
+import datetime
+from array import array
+from itertools import filterfalse
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                             QLabel, QPushButton, QSizePolicy, QSpacerItem, QTabWidget,
+                             QLineEdit, QFormLayout, QMessageBox, QComboBox, QTableView,
+                             QHeaderView, QAbstractItemView, QDialog, QFileDialog, QProgressDialog,
+                             QDateEdit, QSpinBox, QDoubleSpinBox, QShortcut, QPlainTextEdit, QGraphicsScene,
+                             QTableWidget, QTableWidgetItem)
+from PyQt5.QtCore import (Qt, QPropertyAnimation, QEasingCurve, QAbstractTableModel, QAbstractProxyModel,
+                          QModelIndex, QTimer,
+                          QObject, QRunnable, QThreadPool, pyqtSignal, QDate, QSequentialAnimationGroup,
+                          QAbstractAnimation, QEvent, QPointF, QRectF, QSizeF, QMarginsF)
+from PyQt5.QtGui import QPainter, QKeySequence, QImage, QPdfWriter, QPageSize
+from PyQt5.QtChart import QChart, QChartView, QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis, QStackedBarSeries, \
+    QPieSeries, QLineSeries
+
+from финансы_ядро import (ALLOCATION_RULES_PATH, CATEGORIES, DEFAULT_ALLOCATION_RULES, LEDGER_PATH, LOAN_KINDS,
+                          MONTHS, MONTHS_SHORT, GRANULARITIES, PROFILER, RECURRENCE_UNITS, SUBCATEGORIES,
+                          AllocationRules, BudgetIndex, Finances, Loan, LoanBook, Recurrence, RecurringBook,
+                          Transaction, LedgerExporter, StatementImporter, aggregate_deltas,
+                          choose_granularity, format_money, load_allocation_rules, money_text, parse_money,
+                          period_buckets, profiled, recurrence_text)
+from финансы_сервер import IngestServer
+from финансы_тема import (BAR_COLORS, DEFAULT_BAR_COLOR, DEFAULT_ROW_COLOR, DEFAULT_SLICE_COLOR, ROW_COLORS,
+                          SLICE_COLORS, TRANSPARENT, apply_theme, set_flag, title_font)
+
+
+class TipDialog(QDialog):
+    def __init__(self, tip, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Финансовый совет")
+        self.setFixedSize(400, 200)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+
+        self.tip_label = QLabel(tip)
+        self.tip_label.setWordWrap(True)
+        self.tip_label.setAlignment(Qt.AlignCenter)
+        self.tip_label.setObjectName("tipLabel")
+
+        self.close_btn = QPushButton("Закрыть")
+        self.close_btn.setProperty("role", "primary")
+        self.close_btn.clicked.connect(self.close)
+
+        layout.addWidget(self.tip_label)
+        layout.addWidget(self.close_btn)
+        self.setLayout(layout)
+
+
+class AnimatedButton(QPushButton):
+    def __init__(self, text, parent=None):
+        super().__init__(text, parent)
+        self.setFixedSize(120, 120)
+        # Цвет кнопки и цвет при наведении берутся из таблицы стилей по названию
+        self.setProperty("role", "category")
+        self.setProperty("category", text)
+
+
+class ButtonAnimator:
+    """Reusable bounce animations for a fixed set of buttons.
+
+    Every button gets one sequential group (down, then back) created up
+    front. A trigger only sets the start and end geometry and restarts the
+    group, so no Qt objects are allocated per trigger; a button whose group
+    is still running ignores the trigger.
+    """
+    DURATION = 500
+    OFFSET = 20
+
+    def __init__(self, buttons, parent):
+        self.animations = []
+        for button in buttons:
+            group = QSequentialAnimationGroup(parent)
+            down = QPropertyAnimation(button, b"geometry", group)
+            back = QPropertyAnimation(button, b"geometry", group)
+            for animation in [down, back]:
+                animation.setDuration(self.DURATION)
+                animation.setEasingCurve(QEasingCurve.OutBack)
+                group.addAnimation(animation)
+            self.animations.append((button, group, down, back))
+
+    def trigger(self):
+        """Start the bounce of every idle button; returns how many started"""
+        started = 0
+        for button, group, down, back in self.animations:
+            if group.state() == QAbstractAnimation.Running:
+                continue
+
+            start_pos = button.geometry()
+            end_pos = start_pos.translated(0, self.OFFSET)
+            down.setStartValue(start_pos)
+            down.setEndValue(end_pos)
+            back.setStartValue(end_pos)
+            back.setEndValue(start_pos)
+            group.start()
+            started += 1
+        return started
+
+
+class WorkerSignals(QObject):
+    partial = pyqtSignal(object)
+    progress = pyqtSignal(int)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """Runs a job on the thread pool and delivers its results through signals.
+
+    The job gets the worker as its first argument to report progress, post
+    partial results and check is_cancelled(). Results are queued back to the
+    GUI thread, so the job must not touch widgets or the ledger itself.
+    """
+
+    def __init__(self, job, *args):
+        super().__init__()
+        self.job = job
+        self.args = args
+        self.signals = WorkerSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+        try:
+            result = self.job(self, *self.args)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+def import_job(worker, path, rules):
+    """Parse a statement and post (transactions, allocations, aggregate deltas) batches back chunk by chunk"""
+    importer = StatementImporter()
+    for chunk in importer.chunks(path):
+        allocations = rules.allocate(chunk)
+        worker.signals.partial.emit((chunk, allocations, aggregate_deltas(chunk, allocations)))
+        worker.signals.progress.emit(importer.progress())
+        if worker.is_cancelled():
+            break
+    return importer.rows, importer.skipped
+
+
+def export_job(worker, ledger_path, path):
+    """Stream the ledger file to CSV or columns through its own connection; returns the rows written"""
+    exporter = LedgerExporter(ledger_path)
+    try:
+        for rows in exporter.export(path):
+            worker.signals.progress.emit(exporter.progress())
+            if worker.is_cancelled():
+                break
+        return exporter.rows
+    finally:
+        exporter.close()
+
+
+class IngestBridge(QObject):
+    """Hands the batches of the ingestion server thread over to the GUI thread.
+
+    commit() is the server's commit coroutine: it emits batch once per batch
+    and waits until the GUI slot calls done with the number of saved
+    operations or the error, since the ledger belongs to the GUI thread.
+    """
+    batch = pyqtSignal(object, object)
+
+    async def commit(self, transactions):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(result):
+            # Сервер мог остановиться, пока пачка сохранялась
+            if future.done():
+                return
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        self.batch.emit(transactions, lambda result: loop.call_soon_threadsafe(settle, result))
+        return await future
+
+
+class TransactionsTableModel(QAbstractTableModel):
+    """Table model over the transaction history.
+
+    Cells are computed lazily in data(), so the view only asks for the rows
+    that are actually visible, and appends emit rowsInserted for new rows only.
+    """
+    HEADERS = ["Тип", "Категория", "Подкатегория", "Дата", "Сумма", "Распределено"]
+
+    def __init__(self, transactions, parent=None):
+        super().__init__(parent)
+        self.transactions = transactions
+        # Сколько строк уже показано представлению; остальные появятся при sync()
+        self.row_count = len(transactions)
+
+        # Цвет фона строки в зависимости от типа операции
+        self.type_colors = ROW_COLORS
+        self.default_color = DEFAULT_ROW_COLOR
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        transaction = self.transactions[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 3:
+                return transaction.date.strftime("%d.%m.%Y")
+            if column == 4:
+                return format_money(transaction.amount)
+            if column == 5:
+                return ", ".join(f"{category}: {format_money(amount)}"
+                                 for category, amount in self.transactions.allocations_of(index.row()))
+            return transaction[column]
+        if role == Qt.BackgroundRole:
+            return self.type_colors.get(transaction.type, self.default_color)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def append_transactions(self, transactions):
+        self.transactions.extend(transactions)
+        self.sync()
+
+    @profiled("TransactionsTableModel.sync")
+    def sync(self):
+        """Announce rows appended to the store since the last sync as one insertion"""
+        count = len(self.transactions)
+        if count > self.row_count:
+            self.beginInsertRows(QModelIndex(), self.row_count, count - 1)
+            self.row_count = count
+            self.endInsertRows()
+
+
+class HistoryProxyModel(QAbstractProxyModel):
+    """Filtered and sorted view of the history table.
+
+    Holds the row ids that HistoryIndex returned for the current filters
+    and sort column and maps view rows onto them; the source model still
+    formats the cells. Without filters and sorting the rows are a range, and
+    appends arrive as row insertions just like in the source model. Rows
+    deleted or restored one at a time are removed or inserted in place.
+    """
+    # Больше стольких скрытых или возвращённых строк сразу - запрос заново
+    CHANGE_LIMIT = 64
+
+    def __init__(self, history_index, parent=None):
+        super().__init__(parent)
+        self.history_index = history_index
+        self.filters = {}
+        self.sort_column = None
+        self.descending = False
+        self.rows = range(0)
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.rowsInserted.connect(self.source_rows_inserted)
+        self.refresh()
+
+    def is_plain(self):
+        return not self.filters and self.sort_column is None and not self.descending
+
+    def source_rows_inserted(self, parent, first, last):
+        if not self.is_plain():
+            self.refresh()
+            return
+
+        added = range(first, last + 1)
+        deleted = self.history_index.store.deleted
+        if deleted:
+            added = array("i", filterfalse(deleted.__contains__, added))
+        if not added:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(added) - 1)
+        if isinstance(self.rows, range) and isinstance(added, range):
+            self.rows = range(last + 1)
+        else:
+            self.make_mutable()
+            self.rows.extend(added)
+        self.endInsertRows()
+
+    def source_rows_hidden(self, rows):
+        """Take deleted source rows out of the view"""
+        if len(rows) > self.CHANGE_LIMIT:
+            self.refresh()
+            return
+
+        for row in rows:
+            position = self.position(row)
+            if position is None:
+                continue
+            view_row = len(self.rows) - 1 - position if self.descending else position
+            self.beginRemoveRows(QModelIndex(), view_row, view_row)
+            self.make_mutable()
+            del self.rows[position]
+            self.endRemoveRows()
+
+    def source_rows_shown(self, rows):
+        """Put restored source rows back into the view"""
+        rows = [row for row in rows if row < self.sourceModel().rowCount()]
+        if not rows:
+            return
+        if not self.is_plain() or len(rows) > self.CHANGE_LIMIT:
+            # Подходит ли строка под фильтры и где её место при сортировке, знает только запрос
+            self.refresh()
+            return
+
+        for row in rows:
+            position = bisect.bisect_left(self.rows, row)
+            self.beginInsertRows(QModelIndex(), position, position)
+            self.make_mutable()
+            self.rows.insert(position, row)
+            self.endInsertRows()
+
+    def make_mutable(self):
+        # Запрос отдаёт range или список, правки на месте идут в array
+        if not isinstance(self.rows, array):
+            self.rows = array("i", self.rows)
+
+    def position(self, row):
+        """Index of a source row in self.rows or None"""
+        if self.sort_column is None:
+            position = bisect.bisect_left(self.rows, row)
+            return position if position < len(self.rows) and self.rows[position] == row else None
+        try:
+            return self.rows.index(row)
+        except ValueError:
+            return None
+
+    @profiled("HistoryProxyModel.refresh")
+    def refresh(self):
+        """Query the index for the current filters and sort and show the result"""
+        self.beginResetModel()
+        self.rows = self.history_index.query(sort=self.sort_column, **self.filters)
+        # Индекс знает о строках, которые модель-источник ещё не показала
+        count = self.sourceModel().rowCount()
+        if isinstance(self.rows, range):
+            self.rows = range(min(len(self.rows), count))
+        elif len(self.history_index.store) > count:
+            self.rows = [row for row in self.rows if row < count]
+        self.endResetModel()
+
+    def set_filters(self, filters):
+        """Show only rows matching HistoryIndex.query keyword conditions"""
+        if filters != self.filters:
+            self.filters = filters
+            self.refresh()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        columns = self.history_index.SORT_COLUMNS
+        self.sort_column = columns[column] if 0 <= column < len(columns) else None
+        self.descending = order == Qt.DescendingOrder and self.sort_column is not None
+        self.refresh()
+
+    def source_row(self, row):
+        return self.rows[len(self.rows) - 1 - row] if self.descending else self.rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self.rows) or not 0 <= column < self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        # Без аргумента это QObject.parent(), с индексом - родитель строки плоской таблицы
+        if index is None:
+            return super().parent()
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.source_row(proxy_index.row()), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self.position(source_index.row())
+        if row is None:
+            return QModelIndex()
+        if self.descending:
+            row = len(self.rows) - 1 - row
+        return self.index(row, source_index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == Qt.DisplayRole:
+            return section + 1
+        return None
+
+
+class RedrawScheduler:
+    """Coalesces redraw requests into one update per timer tick.
+
+    Changes mark every view dirty; a single-shot timer then refreshes only
+    the view on the visible tab. Hidden views keep their pending changes
+    until their tab is shown. A view's pending changes are a set of
+    (category, subcategory, month) keys of the shown year, or None for a
+    full refresh.
+    """
+
+    def __init__(self, tab_widget, views, interval=0):
+        self.tab_widget = tab_widget
+        self.views = views
+        self.pending = {page: set() for page in views}
+
+        self.timer = QTimer(tab_widget)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+        self.tab_widget.currentChanged.connect(self.schedule)
+
+    def mark_dirty(self, changes=None, pages=None):
+        for page in pages or self.views:
+            if changes is None or self.pending[page] is None:
+                self.pending[page] = None
+            else:
+                self.pending[page].update(changes)
+        self.schedule()
+
+    def schedule(self):
+        if not self.timer.isActive():
+            self.timer.start()
+
+    @profiled("RedrawScheduler.flush")
+    def flush(self):
+        page = self.tab_widget.currentWidget()
+        if page not in self.views:
+            return
+
+        changes = self.pending[page]
+        if changes is None or changes:
+            self.pending[page] = set()
+            self.views[page](changes)
+
+
+class BarChartController:
+    """Persistent bar chart over a time axis (12 months by default).
+
+    The chart, its series, bar sets and axes are created once. Updates replace
+    single bar values and move the Y range, so Qt animates only what changed;
+    set_labels() resizes the bar sets when the shown period changes. Values
+    come in kopecks and are drawn in rubles. An optional line series drawn
+    over the bars gets its own Y axis on the right, or shares the bars' axis
+    with own_axis=False.
+    """
+
+    def __init__(self, title, categories, stacked=False, line=None, own_axis=True):
+        self.chart = QChart()
+        self.chart.setAnimationOptions(QChart.SeriesAnimations)
+        self.chart.setTitle(title)
+        self.chart.setTitleFont(title_font(12))
+        self.chart.setBackgroundBrush(TRANSPARENT)
+
+        self.series = QStackedBarSeries() if stacked else QBarSeries()
+        self.bar_sets = {}
+        for category in categories:
+            bar_set = QBarSet(category)
+            bar_set.setColor(BAR_COLORS.get(category, DEFAULT_BAR_COLOR))
+            bar_set.append([0] * 12)
+            self.series.append(bar_set)
+            self.bar_sets[category] = bar_set
+        self.chart.addSeries(self.series)
+
+        # Настройка осей
+        self.labels = list(MONTHS_SHORT)
+        self.axis_x = QBarCategoryAxis()
+        self.axis_x.append(self.labels)
+        self.axis_x.setTitleText("Месяцы")
+        self.chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.series.attachAxis(self.axis_x)
+
+        self.upper = 100
+        self.axis_y = QValueAxis()
+        self.axis_y.setRange(0, self.upper)
+        self.axis_y.setTitleText("Сумма (₽)")
+        self.chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.series.attachAxis(self.axis_y)
+
+        # Линия рисуется по тем же подписям: точка i стоит над столбцом i
+        self.line = None
+        self.line_axis = None
+        if line:
+            self.line = QLineSeries()
+            self.line.setName(line)
+            self.line.setColor(BAR_COLORS.get(line, DEFAULT_BAR_COLOR))
+            self.chart.addSeries(self.line)
+            self.line.attachAxis(self.axis_x)
+            if own_axis:
+                self.line_upper = 100
+                self.line_axis = QValueAxis()
+                self.line_axis.setRange(0, self.line_upper)
+                self.line_axis.setTitleText(f"{line} (₽)")
+                self.chart.addAxis(self.line_axis, Qt.AlignRight)
+                self.line.attachAxis(self.line_axis)
+            else:
+                self.line.attachAxis(self.axis_y)
+
+    @profiled("BarChartController.set_labels")
+    def set_labels(self, labels, title):
+        if labels == self.labels:
+            return
+
+        # Подписи пишутся в новую ось до того, как она попадёт на диаграмму:
+        # ось на диаграмме пересчитывает раскладку на каждую добавленную подпись
+        self.labels = labels
+        axis_x = QBarCategoryAxis()
+        axis_x.append(labels)
+        axis_x.setTitleText(title)
+        self.chart.removeAxis(self.axis_x)
+        self.axis_x.deleteLater()
+        self.axis_x = axis_x
+        self.chart.addAxis(axis_x, Qt.AlignBottom)
+        self.series.attachAxis(axis_x)
+        if self.line is not None:
+            self.line.attachAxis(axis_x)
+        for bar_set in self.bar_sets.values():
+            count = bar_set.count()
+            if count > len(labels):
+                bar_set.remove(len(labels), count - len(labels))
+            elif count < len(labels):
+                bar_set.append([0] * (len(labels) - count))
+
+    def set_value(self, category, index, kopecks):
+        bar_set = self.bar_sets[category]
+        value = kopecks / 100
+        if bar_set.at(index) != value:
+            bar_set.replace(index, value)
+
+    def set_values(self, category, values):
+        for index, value in enumerate(values):
+            self.set_value(category, index, value)
+
+    def show_set(self, category, visible):
+        """Put a bar set on the chart or take it off; a hidden set keeps its values and takes no room"""
+        bar_set = self.bar_sets[category]
+        if (bar_set in self.series.barSets()) == visible:
+            return
+        if visible:
+            self.series.append(bar_set)
+        else:
+            self.series.take(bar_set)
+
+    def set_maximum(self, max_kopecks):
+        upper = max(max_kopecks / 100 * 1.2, 100)
+        if upper != self.upper:
+            self.upper = upper
+            self.axis_y.setRange(0, upper)
+
+    def set_line(self, values):
+        """Replace all points of the line series at once, in kopecks"""
+        self.line.replace([QPointF(index, value / 100) for index, value in enumerate(values)])
+        # На общей оси масштаб задаёт set_maximum
+        if self.line_axis is None:
+            return
+        upper = max(max(values, default=0) / 100 * 1.2, 100)
+        if upper != self.line_upper:
+            self.line_upper = upper
+            self.line_axis.setRange(0, upper)
+
+
+# Столбцы диаграммы «Кредиты»: записанные платежи и графики по кредитам
+LOAN_BARS = ["Кредиты", "Проценты", "Основной долг"]
+# Столбцы диаграммы «Расходы»: все расходы и расходы подкатегорий с бюджетом, с которыми сравнивается линия бюджета
+EXPENSE_BARS = ["Расходы", "Расходы с бюджетом"]
+
+
+def show_loans(chart, loans, recorded, first, last, granularity):
+    """Project the loan schedules of first..last onto the Кредиты chart.
+
+    Scheduled interest and repaid principal go to their bar sets next to the
+    recorded payments, the debt left at the end of each bucket to the line.
+    """
+    maximum = max(recorded, default=0)
+    for series in ["Проценты", "Основной долг"]:
+        values = loans.range_values(series, first, last, granularity)
+        chart.set_values(series, values)
+        maximum = max(maximum, max(values, default=0))
+    chart.set_maximum(maximum)
+    chart.set_line(loans.balance_values(first, last, granularity))
+
+
+def show_budget(chart, finances, spent, first, last, granularity):
+    """Draw the expense budgets of first..last as a line over the Расходы bars, on the same axis.
+
+    The line is the sum of the limits, so next to all expenses the bars show
+    the spending of the subcategories that have a budget; without budgets
+    both are hidden.
+    """
+    budgets = finances.budgets
+    limits = budgets.range_values(first, last, granularity)
+    budgeted = [0] * len(limits)
+    for subcategory in budgets.limits:
+        values = finances.range_values(budgets.CATEGORY, first, last, granularity, subcategory)
+        budgeted = [total + value for total, value in zip(budgeted, values)]
+    chart.line.setVisible(bool(budgets.limits))
+    chart.show_set(EXPENSE_BARS[1], bool(budgets.limits))
+    chart.set_values(EXPENSE_BARS[1], budgeted)
+    chart.set_line(limits)
+    chart.set_maximum(max(max(spent, default=0), max(limits, default=0)))
+
+
+class PieChartController:
+    """Persistent subcategory pie: one slice per subcategory, values updated in place"""
+
+    def __init__(self, subcategories):
+        self.chart = QChart()
+        self.chart.setAnimationOptions(QChart.SeriesAnimations)
+        self.chart.setTitle("Распределение по подкатегориям")
+        self.chart.setTitleFont(title_font(10))
+        self.chart.setBackgroundBrush(TRANSPARENT)
+
+        self.series = QPieSeries()
+        self.slices = {}
+        for subcategory in subcategories:
+            pie_slice = self.series.append(subcategory, 0)
+            pie_slice.setColor(SLICE_COLORS.get(subcategory, DEFAULT_SLICE_COLOR))
+            self.slices[subcategory] = pie_slice
+        self.chart.addSeries(self.series)
+
+        self.markers = dict(zip(subcategories, self.chart.legend().markers(self.series)))
+        for subcategory in subcategories:
+            self._show_slice(subcategory, False)
+
+    def set_value(self, subcategory, total, limit=0):
+        """Set the total of a slice; a budget limit of the period is added to its label"""
+        pie_slice = self.slices[subcategory]
+        label = f"{subcategory}: {format_money(total)}"
+        if limit:
+            label += f" из {format_money(limit)}"
+        if pie_slice.value() != total / 100 or pie_slice.label() != label:
+            pie_slice.setValue(total / 100)
+            pie_slice.setLabel(label)
+            self._show_slice(subcategory, total > 0)
+
+    def _show_slice(self, subcategory, visible):
+        # Пустые подкатегории не подписываем и не показываем в легенде
+        self.slices[subcategory].setLabelVisible(visible)
+        self.markers[subcategory].setVisible(visible)
+
+
+class ChartExporter:
+    """Batch rendering of the report charts of a period to PNG or PDF files.
+
+    The charts are built by the same controllers as in the window and
+    filled from Finances, with animations off so the file gets the final
+    picture. Each chart is drawn from its own QGraphicsScene into a QImage
+    or a one-page QPdfWriter, so no window is shown and the export works on
+    the offscreen platform from a console command as well as from the GUI.
+    """
+    FORMATS = ["png", "pdf"]
+
+    def __init__(self, finances, width=1200, height=600):
+        self.finances = finances
+        self.width = width
+        self.height = height
+
+    def charts(self, first, last, granularity):
+        """(name, controller) of every chart of first..last, built one at a time"""
+        # Как и в окне, шаг укрупняется, пока столбцы не поместятся по ширине
+        granularity = choose_granularity(first, last, self.width, granularity)
+        labels = [label for bucket_first, bucket_last, label in period_buckets(first, last, granularity)]
+        period = f"{first:%d.%m.%Y} - {last:%d.%m.%Y}"
+        stacked = [0] * len(labels)
+
+        overall = BarChartController(f"Общая финансовая картина, {period}", CATEGORIES, stacked=True)
+        overall.set_labels(labels, granularity)
+        for category in CATEGORIES:
+            values = self.finances.range_values(category, first, last, granularity)
+            stacked = [a + b for a, b in zip(stacked, values)]
+            overall.set_values(category, values)
+
+            if category == "Кредиты":
+                chart = BarChartController(f"{category}, {period}", LOAN_BARS, line="Остаток долга")
+                chart.set_labels(labels, granularity)
+                chart.set_values(category, values)
+                show_loans(chart, self.finances.loans, values, first, last, granularity)
+            elif category == "Расходы":
+                chart = BarChartController(f"{category}, {period}", EXPENSE_BARS, line="Бюджет", own_axis=False)
+                chart.set_labels(labels, granularity)
+                chart.set_values(category, values)
+                show_budget(chart, self.finances, values, first, last, granularity)
+            else:
+                chart = BarChartController(f"{category}, {period}", [category])
+                chart.set_labels(labels, granularity)
+                chart.set_values(category, values)
+                chart.set_maximum(max(values))
+            yield category, chart
+
+            if category in SUBCATEGORIES:
+                pie = PieChartController(SUBCATEGORIES[category])
+                pie.chart.setTitle(f"{category} по подкатегориям, {period}")
+                for subcategory in SUBCATEGORIES[category]:
+                    limit = self.finances.budgets.range_limit(first, last, subcategory) if category == "Расходы" else 0
+                    pie.set_value(subcategory, self.finances.range_total(category, first, last, subcategory), limit)
+                yield f"{category} по подкатегориям", pie
+
+        overall.set_maximum(max(stacked))
+        yield "Общая", overall
+
+    def render(self, chart, path):
+        """Draw a chart into a PNG or PDF file, by the extension of path"""
+        chart.setAnimationOptions(QChart.NoAnimation)
+        scene = QGraphicsScene()
+        scene.addItem(chart)
+        chart.resize(QSizeF(self.width, self.height))
+        rect = QRectF(0, 0, self.width, self.height)
+
+        if path.lower().endswith(".pdf"):
+            # Страница размером с диаграмму, один пиксель - один пункт
+            device = QPdfWriter(path)
+            device.setPageSize(QPageSize(QSizeF(self.width, self.height), QPageSize.Point))
+            device.setPageMargins(QMarginsF(0, 0, 0, 0))
+            device.setResolution(72)
+        else:
+            device = QImage(self.width, self.height, QImage.Format_ARGB32)
+            device.fill(Qt.white)
+
+        painter = QPainter(device)
+        if not painter.isActive():
+            raise OSError(f"Не удалось открыть {path} для записи")
+        painter.setRenderHint(QPainter.Antialiasing)
+        scene.render(painter, rect, rect)
+        painter.end()
+        scene.removeItem(chart)
+        if isinstance(device, QImage) and not device.save(path):
+            raise OSError(f"Не удалось сохранить {path}")
+
+    def export(self, directory, first, last, granularity, formats=("png",), prefix=""):
+        """Write every chart of the period to directory; yields the path of each written file"""
+        os.makedirs(directory, exist_ok=True)
+        for name, controller in self.charts(first, last, granularity):
+            for format in formats:
+                path = os.path.join(directory, f"{prefix}{name}.{format}")
+                self.render(controller.chart, path)
+                yield path
+
+
+class AddMoneyWindow(QWidget):
+    """Entry form of one category, built once and kept open between entries.
+
+    Enter adds the amount and clears the field for the next one; several
+    amounts pasted on separate lines are added together as one batch. Errors
+    are shown in the form itself, so nothing blocks fast keyboard entry.
+    """
+
+    def __init__(self, parent=None, category_type=None, category=None):
+        super().__init__(parent, Qt.Window)
+        self.category_type = category_type
+        self.category = category
+        self.setWindowTitle(f"Добавить {category_type.lower()} - {category.lower()}")
+        self.setFixedSize(350, 340)
+        self.setObjectName("addMoneyWindow")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+        form_layout = QFormLayout()
+        form_layout.setSpacing(15)
+
+        # Поле в несколько строк: вставленный столбец сумм добавляется целиком
+        self.amount_input = QPlainTextEdit()
+        self.amount_input.setPlaceholderText("Введите сумму или вставьте несколько, по одной в строке")
+        self.amount_input.setTabChangesFocus(True)
+        self.amount_input.setFixedHeight(70)
+        self.amount_input.installEventFilter(self)
+
+        self.date_edit = QDateEdit(QDate.currentDate())
+        self.date_edit.setCalendarPopup(True)
+        self.date_edit.setDisplayFormat("dd.MM.yyyy")
+
+        form_layout.addRow("Сумма:", self.amount_input)
+        form_layout.addRow("Дата:", self.date_edit)
+
+        # Add subcategory selection for income and expenses
+        if category_type in ["Доходы", "Расходы"]:
+            self.subcategory_combo = QComboBox()
+            self.subcategory_combo.addItems(SUBCATEGORIES[category_type])
+            form_layout.addRow("Подкатегория:", self.subcategory_combo)
+
+        self.add_button = QPushButton("Добавить (Enter)")
+        self.add_button.setProperty("role", "primary")
+        self.add_button.clicked.connect(self.add_money)
+
+        # Итог последнего добавления или ошибка, без модальных окон
+        self.status_label = QLabel()
+        self.status_label.setObjectName("formStatus")
+        self.status_label.setWordWrap(True)
+
+        layout.addLayout(form_layout)
+        layout.addSpacing(10)
+        layout.addWidget(self.add_button)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+
+    def open(self):
+        """Show the form ready for the next amount"""
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.amount_input.setFocus()
+
+    def eventFilter(self, watched, event):
+        # Enter добавляет, Shift+Enter переносит строку
+        if (watched is self.amount_input and event.type() == QEvent.KeyPress
+                and event.key() in (Qt.Key_Return, Qt.Key_Enter) and not event.modifiers() & Qt.ShiftModifier):
+            self.add_money()
+            return True
+        return False
+
+    def show_status(self, text, error=False):
+        set_flag(self.status_label, "error", error)
+        self.status_label.setText(text)
+
+    def add_money(self):
+        lines = [line.strip() for line in self.amount_input.toPlainText().splitlines() if line.strip()]
+        if not lines:
+            return
+
+        amounts, rejected = [], []
+        for line in lines:
+            try:
+                amount = parse_money(line)
+            except ValueError:
+                amount = 0
+            if amount > 0:
+                amounts.append(amount)
+            else:
+                rejected.append(line)
+        if rejected:
+            # Ничего не добавляем, пока все строки не исправлены
+            self.show_status(f"Некорректная сумма: {', '.join(rejected[:3])}", error=True)
+            return
+
+        subcategory = None
+        if hasattr(self, 'subcategory_combo'):
+            subcategory = self.subcategory_combo.currentText()
+
+        if self.parent().add_amounts(self.category_type, self.category, self.date_edit.date().toPyDate(),
+                                     amounts, subcategory):
+            self.amount_input.clear()
+            self.show_status(f"Добавлено: {', '.join(format_money(amount) for amount in amounts[:3])}"
+                             + (f" и ещё {len(amounts) - 3}" if len(amounts) > 3 else ""))
+
+
+class EditTransactionDialog(QDialog):
+    """Dialog correcting the amount, date and subcategory of a history row"""
+
+    def __init__(self, transaction, parent=None):
+        super().__init__(parent)
+        self.transaction = transaction
+        self.setWindowTitle(f"Исправить операцию - {transaction.category.lower()}")
+        self.setFixedSize(350, 260)
+        self.setObjectName("addMoneyWindow")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+        form_layout = QFormLayout()
+        form_layout.setSpacing(15)
+
+        self.amount_input = QLineEdit(money_text(transaction.amount))
+        self.date_edit = QDateEdit(QDate(transaction.date.year, transaction.date.month, transaction.date.day))
+        self.date_edit.setCalendarPopup(True)
+        self.date_edit.setDisplayFormat("dd.MM.yyyy")
+        form_layout.addRow("Сумма:", self.amount_input)
+        form_layout.addRow("Дата:", self.date_edit)
+
+        self.subcategory_combo = None
+        if transaction.type in SUBCATEGORIES:
+            self.subcategory_combo = QComboBox()
+            # Импортированные операции бывают без подкатегории
+            if transaction.subcategory not in SUBCATEGORIES[transaction.type]:
+                self.subcategory_combo.addItem(transaction.subcategory or "Без подкатегории", transaction.subcategory)
+            for subcategory in SUBCATEGORIES[transaction.type]:
+                self.subcategory_combo.addItem(subcategory, subcategory)
+            self.subcategory_combo.setCurrentIndex(self.subcategory_combo.findData(transaction.subcategory))
+            form_layout.addRow("Подкатегория:", self.subcategory_combo)
+
+        self.save_button = QPushButton("Сохранить")
+        self.save_button.setProperty("role", "primary")
+        self.save_button.setDefault(True)
+        self.save_button.clicked.connect(self.save)
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName("formStatus")
+        set_flag(self.status_label, "error", True)
+
+        layout.addLayout(form_layout)
+        layout.addWidget(self.save_button)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+        self.amount_input.selectAll()
+
+    def corrected(self):
+        """The corrected transaction; raises ValueError on an invalid amount"""
+        amount = parse_money(self.amount_input.text())
+        if amount <= 0:
+            raise ValueError(self.amount_input.text())
+        subcategory = self.transaction.subcategory
+        if self.subcategory_combo is not None:
+            subcategory = self.subcategory_combo.currentData()
+        return self.transaction._replace(subcategory=subcategory, date=self.date_edit.date().toPyDate(),
+                                         amount=amount)
+
+    def save(self):
+        try:
+            self.corrected()
+        except ValueError:
+            self.status_label.setText(f"Некорректная сумма: {self.amount_input.text()}")
+            return
+        self.accept()
+
+
+class BudgetsDialog(QDialog):
+    """Monthly budgets of the expense subcategories; an empty field removes the budget"""
+
+    def __init__(self, budgets, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Бюджеты расходов на месяц")
+        self.setObjectName("addMoneyWindow")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+        form_layout = QFormLayout()
+        form_layout.setSpacing(15)
+
+        self.inputs = {}
+        for subcategory in SUBCATEGORIES[BudgetIndex.CATEGORY]:
+            limit = budgets.limit(subcategory)
+            self.inputs[subcategory] = QLineEdit(money_text(limit) if limit else "")
+            self.inputs[subcategory].setPlaceholderText("без бюджета")
+            form_layout.addRow(f"{subcategory}:", self.inputs[subcategory])
+
+        self.save_button = QPushButton("Сохранить")
+        self.save_button.setProperty("role", "primary")
+        self.save_button.setDefault(True)
+        self.save_button.clicked.connect(self.save)
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName("formStatus")
+        set_flag(self.status_label, "error", True)
+
+        layout.addLayout(form_layout)
+        layout.addWidget(self.save_button)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+
+    def limits(self):
+        """{subcategory: kopecks} from the form; raises ValueError naming the first invalid field"""
+        limits = {}
+        for subcategory, field in self.inputs.items():
+            try:
+                limits[subcategory] = parse_money(field.text()) if field.text().strip() else 0
+            except ValueError:
+                limits[subcategory] = -1
+            set_flag(field, "invalid", limits[subcategory] < 0)
+            if limits[subcategory] < 0:
+                raise ValueError(f"Некорректная сумма: {field.text()}")
+        return limits
+
+    def save(self):
+        try:
+            self.limits()
+        except ValueError as e:
+            self.status_label.setText(str(e))
+            return
+        self.accept()
+
+
+class LoansWindow(QWidget):
+    """Loan list with a form that reschedules the selected loan on every change.
+
+    Each edit of a field is checked, saved to the ledger and applied to the
+    LoanBook at once, which subtracts the old schedule of that one loan and
+    adds the new one, and the Кредиты chart follows while typing.
+    """
+    HEADERS = ["Название", "Сумма", "Ставка", "Срок", "Платёж", "Первый платёж"]
+
+    def __init__(self, parent):
+        super().__init__(parent, Qt.Window)
+        self.finances = parent.finances
+        self.loan_id = None
+        self.setWindowTitle("Кредиты")
+        self.resize(640, 520)
+        self.setObjectName("loansWindow")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.currentCellChanged.connect(self.select_loan)
+
+        form_layout = QFormLayout()
+        form_layout.setSpacing(10)
+        self.name_input = QLineEdit()
+        self.principal_input = QLineEdit()
+        self.rate_spin = QDoubleSpinBox()
+        self.rate_spin.setRange(0, 1000)
+        self.rate_spin.setDecimals(2)
+        self.rate_spin.setSuffix(" %")
+        self.term_spin = QSpinBox()
+        self.term_spin.setRange(1, LoanBook.MAX_TERM)
+        self.term_spin.setSuffix(" мес.")
+        self.kind_combo = QComboBox()
+        self.kind_combo.addItems(LOAN_KINDS)
+        self.start_edit = QDateEdit()
+        self.start_edit.setCalendarPopup(True)
+        self.start_edit.setDisplayFormat("dd.MM.yyyy")
+        self.fields = [self.name_input, self.principal_input, self.rate_spin, self.term_spin, self.kind_combo,
+                       self.start_edit]
+
+        form_layout.addRow("Название:", self.name_input)
+        form_layout.addRow("Сумма:", self.principal_input)
+        form_layout.addRow("Ставка, годовых:", self.rate_spin)
+        form_layout.addRow("Срок:", self.term_spin)
+        form_layout.addRow("Платежи:", self.kind_combo)
+        form_layout.addRow("Первый платёж:", self.start_edit)
+
+        self.name_input.textEdited.connect(self.save_loan)
+        self.principal_input.textEdited.connect(self.save_loan)
+        self.rate_spin.valueChanged.connect(self.save_loan)
+        self.term_spin.valueChanged.connect(self.save_loan)
+        self.kind_combo.currentIndexChanged.connect(self.save_loan)
+        self.start_edit.dateChanged.connect(self.save_loan)
+
+        buttons_layout = QHBoxLayout()
+        self.add_button = QPushButton("Новый кредит")
+        self.add_button.setProperty("role", "primary")
+        self.add_button.clicked.connect(self.add_loan)
+        self.delete_button = QPushButton("Удалить")
+        self.delete_button.setProperty("role", "primary")
+        self.delete_button.clicked.connect(self.delete_loan)
+        buttons_layout.addWidget(self.add_button)
+        buttons_layout.addWidget(self.delete_button)
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName("formStatus")
+        self.status_label.setWordWrap(True)
+
+        layout.addWidget(self.table, stretch=1)
+        layout.addLayout(form_layout)
+        layout.addLayout(buttons_layout)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+
+        self.loan_ids = sorted(self.finances.loans.loans)
+        self.table.setRowCount(len(self.loan_ids))
+        for row, loan_id in enumerate(self.loan_ids):
+            self.fill_row(row, self.finances.loans.loans[loan_id])
+        if self.loan_ids:
+            self.table.selectRow(0)
+        else:
+            self.select_loan(-1)
+
+    def open(self):
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def show_status(self, text, error=False):
+        set_flag(self.status_label, "error", error)
+        self.status_label.setText(text)
+
+    def fill_row(self, row, loan):
+        cells = [loan.name, format_money(loan.principal), f"{loan.rate:g} %", f"{loan.term} мес.",
+                 format_money(self.finances.loans.payment(loan)), f"{loan.start:%d.%m.%Y}"]
+        for column, text in enumerate(cells):
+            self.table.setItem(row, column, QTableWidgetItem(text))
+
+    def select_loan(self, row, column=0, previous_row=-1, previous_column=0):
+        """Show the loan of a table row in the form; the form is disabled without one"""
+        self.loan_id = self.loan_ids[row] if 0 <= row < len(self.loan_ids) else None
+        for field in self.fields + [self.delete_button]:
+            field.setEnabled(self.loan_id is not None)
+        if self.loan_id is None:
+            return
+
+        # Заполнение формы не должно сохранять кредит обратно
+        loan = self.finances.loans.loans[self.loan_id]
+        for field in self.fields:
+            field.blockSignals(True)
+        self.name_input.setText(loan.name)
+        self.principal_input.setText(money_text(loan.principal))
+        self.rate_spin.setValue(loan.rate)
+        self.term_spin.setValue(loan.term)
+        self.kind_combo.setCurrentText(loan.kind)
+        self.start_edit.setDate(QDate(loan.start.year, loan.start.month, loan.start.day))
+        for field in self.fields:
+            field.blockSignals(False)
+        set_flag(self.principal_input, "invalid", False)
+        self.show_status("")
+
+    def save_loan(self):
+        if self.loan_id is None:
+            return
+        try:
+            principal = parse_money(self.principal_input.text())
+        except ValueError:
+            principal = 0
+        set_flag(self.principal_input, "invalid", principal <= 0)
+        if principal <= 0:
+            self.show_status(f"Некорректная сумма: {self.principal_input.text()}", error=True)
+            return
+
+        loan = Loan(self.name_input.text().strip() or "Кредит", principal, self.rate_spin.value(),
+                    self.term_spin.value(), self.kind_combo.currentText(), self.start_edit.date().toPyDate())
+        try:
+            self.finances.save_loan(loan, self.loan_id)
+        except ValueError as e:
+            self.show_status(str(e), error=True)
+            return
+        self.fill_row(self.loan_ids.index(self.loan_id), loan)
+        self.show_status(f"Платёж {format_money(self.finances.loans.payment(loan))} в месяц")
+        self.parent().refresh_loans()
+
+    def add_loan(self):
+        # Новый кредит выдан сегодня, первый платёж через месяц
+        today = datetime.date.today()
+        start = datetime.date(today.year + today.month // 12, today.month % 12 + 1, 1)
+        loan = Loan(f"Кредит {len(self.loan_ids) + 1}", 100000000, 10.0, 120, LOAN_KINDS[0],
+                    start.replace(day=min(today.day, calendar.monthrange(start.year, start.month)[1])))
+        self.loan_ids.append(self.finances.save_loan(loan))
+        self.table.setRowCount(len(self.loan_ids))
+        self.fill_row(len(self.loan_ids) - 1, loan)
+        self.table.selectRow(len(self.loan_ids) - 1)
+        self.parent().refresh_loans()
+        self.name_input.setFocus()
+        self.name_input.selectAll()
+
+    def delete_loan(self):
+        if self.loan_id is None:
+            return
+        row = self.loan_ids.index(self.loan_id)
+        self.finances.delete_loan(self.loan_id)
+        del self.loan_ids[row]
+        self.table.removeRow(row)
+        self.select_loan(self.table.currentRow())
+        self.parent().refresh_loans()
+
+
+class RecurringWindow(QWidget):
+    """Recurring operations with a form that saves the selected one on every change.
+
+    Saving subtracts the old projection of that rule from the expanded years
+    and adds the new one, so the charts follow while typing; occurrences
+    already written to the history stay as they are.
+    """
+    HEADERS = ["Категория", "Подкатегория", "Сумма", "Повтор", "С", "По"]
+    # Минимальная дата поля «По» означает повторение без конца
+    NO_END = QDate(1900, 1, 1)
+
+    def __init__(self, parent):
+        super().__init__(parent, Qt.Window)
+        self.finances = parent.finances
+        self.rule_id = None
+        self.setWindowTitle("Повторяющиеся операции")
+        self.resize(700, 560)
+        self.setObjectName("recurringWindow")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 20)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.currentCellChanged.connect(self.select_rule)
+
+        form_layout = QFormLayout()
+        form_layout.setSpacing(10)
+        self.category_combo = QComboBox()
+        self.category_combo.addItems(CATEGORIES)
+        self.subcategory_combo = QComboBox()
+        self.amount_input = QLineEdit()
+        self.every_spin = QSpinBox()
+        self.every_spin.setRange(1, RecurringBook.MAX_EVERY)
+        self.every_spin.setPrefix("раз в ")
+        self.unit_combo = QComboBox()
+        self.unit_combo.addItems(RECURRENCE_UNITS)
+        self.start_edit = QDateEdit()
+        self.end_edit = QDateEdit()
+        for edit in [self.start_edit, self.end_edit]:
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("dd.MM.yyyy")
+        self.end_edit.setMinimumDate(self.NO_END)
+        self.end_edit.setSpecialValueText("без конца")
+        self.fields = [self.category_combo, self.subcategory_combo, self.amount_input, self.every_spin,
+                       self.unit_combo, self.start_edit, self.end_edit]
+
+        step_layout = QHBoxLayout()
+        step_layout.addWidget(self.every_spin)
+        step_layout.addWidget(self.unit_combo)
+        form_layout.addRow("Категория:", self.category_combo)
+        form_layout.addRow("Подкатегория:", self.subcategory_combo)
+        form_layout.addRow("Сумма:", self.amount_input)
+        form_layout.addRow("Повтор:", step_layout)
+        form_layout.addRow("Первая дата:", self.start_edit)
+        form_layout.addRow("Последняя дата:", self.end_edit)
+
+        self.category_combo.currentIndexChanged.connect(self.change_category)
+        self.subcategory_combo.currentIndexChanged.connect(self.save_rule)
+        self.amount_input.textEdited.connect(self.save_rule)
+        self.every_spin.valueChanged.connect(self.save_rule)
+        self.unit_combo.currentIndexChanged.connect(self.save_rule)
+        self.start_edit.dateChanged.connect(self.save_rule)
+        self.end_edit.dateChanged.connect(self.save_rule)
+
+        buttons_layout = QHBoxLayout()
+        self.add_button = QPushButton("Новая операция")
+        self.add_button.setProperty("role", "primary")
+        self.add_button.clicked.connect(self.add_rule)
+        self.delete_button = QPushButton("Удалить")
+        self.delete_button.setProperty("role", "primary")
+        self.delete_button.clicked.connect(self.delete_rule)
+        buttons_layout.addWidget(self.add_button)
+        buttons_layout.addWidget(self.delete_button)
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName("formStatus")
+        self.status_label.setWordWrap(True)
+
+        layout.addWidget(self.table, stretch=1)
+        layout.addLayout(form_layout)
+        layout.addLayout(buttons_layout)
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+
+        self.rule_ids = sorted(self.finances.recurring.recurrences)
+        self.table.setRowCount(len(self.rule_ids))
+        for row, rule_id in enumerate(self.rule_ids):
+            self.fill_row(row, self.finances.recurring.recurrences[rule_id])
+        if self.rule_ids:
+            self.table.selectRow(0)
+        else:
+            self.select_rule(-1)
+
+    def open(self):
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def show_status(self, text, error=False):
+        set_flag(self.status_label, "error", error)
+        self.status_label.setText(text)
+
+    def fill_row(self, row, rule):
+        cells = [rule.category, rule.subcategory, format_money(rule.amount), recurrence_text(rule),
+                 f"{rule.start:%d.%m.%Y}", f"{rule.end:%d.%m.%Y}" if rule.end else "без конца"]
+        for column, text in enumerate(cells):
+            self.table.setItem(row, column, QTableWidgetItem(text))
+
+    def fill_subcategories(self, category, subcategory=""):
+        # Подкатегории есть только у доходов и расходов
+        self.subcategory_combo.blockSignals(True)
+        self.subcategory_combo.clear()
+        self.subcategory_combo.addItems(SUBCATEGORIES.get(category, []))
+        self.subcategory_combo.setCurrentText(subcategory)
+        self.subcategory_combo.setEnabled(self.rule_id is not None and category in SUBCATEGORIES)
+        self.subcategory_combo.blockSignals(False)
+
+    def select_rule(self, row, column=0, previous_row=-1, previous_column=0):
+        """Show the rule of a table row in the form; the form is disabled without one"""
+        self.rule_id = self.rule_ids[row] if 0 <= row < len(self.rule_ids) else None
+        for field in self.fields + [self.delete_button]:
+            field.setEnabled(self.rule_id is not None)
+        if self.rule_id is None:
+            return
+
+        # Заполнение формы не должно сохранять операцию обратно
+        rule = self.finances.recurring.recurrences[self.rule_id]
+        for field in self.fields:
+            field.blockSignals(True)
+        self.category_combo.setCurrentText(rule.category)
+        self.fill_subcategories(rule.category, rule.subcategory)
+        self.amount_input.setText(money_text(rule.amount))
+        self.every_spin.setValue(rule.every)
+        self.unit_combo.setCurrentText(rule.unit)
+        self.start_edit.setDate(QDate(rule.start.year, rule.start.month, rule.start.day))
+        self.end_edit.setDate(QDate(rule.end.year, rule.end.month, rule.end.day) if rule.end else self.NO_END)
+        for field in self.fields:
+            field.blockSignals(False)
+        set_flag(self.amount_input, "invalid", False)
+        self.show_status("")
+
+    def change_category(self):
+        self.fill_subcategories(self.category_combo.currentText(), self.subcategory_combo.currentText())
+        self.save_rule()
+
+    def save_rule(self):
+        if self.rule_id is None:
+            return
+        try:
+            amount = parse_money(self.amount_input.text())
+        except ValueError:
+            amount = 0
+        set_flag(self.amount_input, "invalid", amount <= 0)
+        if amount <= 0:
+            self.show_status(f"Некорректная сумма: {self.amount_input.text()}", error=True)
+            return
+
+        category = self.category_combo.currentText()
+        end = self.end_edit.date()
+        rule = Recurrence(category, category, self.subcategory_combo.currentText() if category in SUBCATEGORIES else "",
+                          amount, self.start_edit.date().toPyDate(), None if end == self.NO_END else end.toPyDate(),
+                          self.every_spin.value(), self.unit_combo.currentText())
+        try:
+            rule_id, year_deltas = self.finances.save_recurrence(rule, self.rule_id)
+        except ValueError as e:
+            self.show_status(str(e), error=True)
+            return
+        self.fill_row(self.rule_ids.index(self.rule_id), rule)
+        self.show_status(f"{format_money(amount)} {recurrence_text(rule)}")
+        self.parent().refresh_after_commit(year_deltas)
+
+    def add_rule(self):
+        # Новая операция - категории показанной диаграммы, каждый месяц с сегодняшнего дня
+        category = self.parent().chart_title.text()
+        rule = Recurrence(category, category, SUBCATEGORIES.get(category, [""])[0], 100000, datetime.date.today(),
+                          None, 1, "Месяцы")
+        rule_id, year_deltas = self.finances.save_recurrence(rule)
+        self.rule_ids.append(rule_id)
+        self.table.setRowCount(len(self.rule_ids))
+        self.fill_row(len(self.rule_ids) - 1, rule)
+        self.table.selectRow(len(self.rule_ids) - 1)
+        self.parent().refresh_after_commit(year_deltas)
+        self.amount_input.setFocus()
+        self.amount_input.selectAll()
+
+    def delete_rule(self):
+        if self.rule_id is None:
+            return
+        row = self.rule_ids.index(self.rule_id)
+        year_deltas = self.finances.delete_recurrence(self.rule_id)
+        del self.rule_ids[row]
+        self.table.removeRow(row)
+        self.select_rule(self.table.currentRow())
+        self.parent().refresh_after_commit(year_deltas)
+
+
+class ProfilerOverlay(QLabel):
+    """Semi-transparent table of PROFILER statistics in the corner of the window"""
+    INTERVAL = 500
+    ROWS = 20
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setTextFormat(Qt.PlainText)
+        self.setObjectName("profilerOverlay")
+
+        # Пока оверлей скрыт, таймер стоит и не тратит время
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_active(self, active):
+        if active:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start(self.INTERVAL)
+        else:
+            self.timer.stop()
+            self.hide()
+
+    def refresh(self):
+        lines = [f"{'':<36}{'вызовов':>8}{'сред, мс':>10}{'макс, мс':>10}{'посл, мс':>10}"]
+        for name, count, mean, maximum, last in PROFILER.summary()[:self.ROWS]:
+            lines.append(f"{name[:36]:<36}{count:>8}{mean:>10.2f}{maximum:>10.2f}{last:>10.2f}")
+        for name, value in PROFILER.counters.items():
+            lines.append(f"{name}: {value}")
+        lines.append("F12 - скрыть, Shift+F12 - сохранить трассу")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(self.parentWidget().width() - self.width() - 20, 20)
+
+
+# Шаг оси подбирается по ширине диаграммы
+AUTO_GRANULARITY = "Авто"
+
+
+class ChartNavigator(QObject):
+    """Mouse zoom and pan of the shown period over a chart view.
+
+    The wheel zooms the date range around the cursor, dragging shifts it and
+    a resize may change the level of detail. Every gesture ends in a new
+    query of the buckets, so the chart holds no more bars than its width fits.
+    """
+    ZOOM_STEP = 1.25
+
+    def __init__(self, view, window):
+        super().__init__(view)
+        self.view = view
+        self.window = window
+        self.drag_x = None
+        view.installEventFilter(self)
+        view.viewport().installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if watched is self.view:
+            if event.type() == QEvent.Resize:
+                self.window.update_detail_level()
+            return False
+
+        if event.type() == QEvent.Wheel and event.angleDelta().y():
+            factor = 1 / self.ZOOM_STEP if event.angleDelta().y() > 0 else self.ZOOM_STEP
+            self.window.zoom_period(factor, self.position(event.pos().x()))
+            return True
+        if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+            self.drag_x = event.pos().x()
+        elif event.type() == QEvent.MouseMove and self.drag_x is not None:
+            shift = self.position(self.drag_x) - self.position(event.pos().x())
+            # Начало перетаскивания сдвигается, только когда период действительно сдвинулся
+            if self.window.pan_period(shift):
+                self.drag_x = event.pos().x()
+        elif event.type() == QEvent.MouseButtonRelease:
+            self.drag_x = None
+        return False
+
+    def position(self, x):
+        """Fraction of the plot area width at the view x coordinate"""
+        area = self.view.chart().plotArea()
+        if area.width() <= 0:
+            return 0.5
+        return min(max((x - area.left()) / area.width(), 0), 1)
+
+
+class FinancialApp(QMainWindow):
+    # Сколько строк истории подгружать с диска за один проход цикла событий
+    HISTORY_CHUNK = 50000
+    # Пауза перед перерисовкой, за которую копятся изменения (мс)
+    REDRAW_INTERVAL = 16
+    # Границы периода совпадают с диапазоном полей выбора года
+    FIRST_DAY = datetime.date(1900, 1, 1)
+    LAST_DAY = datetime.date(2100, 12, 31)
+    # Меньше недели масштаб не уменьшается
+    MIN_PERIOD_DAYS = 7
+    # Сколько держится подтверждение в строке состояния (мс)
+    STATUS_TIMEOUT = 4000
+    # Сколько держится сообщение о бюджете (мс)
+    ALERT_TIMEOUT = 10000
+    # Фильтры диалога экспорта и форматы, которые они выбирают
+    EXPORT_FILTERS = {
+        "Операции CSV (*.csv)": "csv",
+        "Операции по столбцам NumPy (папка)": "колонки",
+        "Диаграммы периода PNG (*.png)": "png",
+        "Диаграммы периода PDF (*.pdf)": "pdf"
+    }
+
+    def __init__(self, ledger_path=LEDGER_PATH, rules_path=ALLOCATION_RULES_PATH):
+        super().__init__()
+        # Общая таблица стилей ставится до создания виджетов, чтобы они сразу оформлялись по ней
+        apply_theme(QApplication.instance())
+        self.init_data(ledger_path, rules_path)
+        self.init_ui()
+        self.show_chart("Доходы")
+
+        # История подгружается по частям после первой отрисовки
+        self.history_timer = QTimer(self)
+        self.history_timer.setSingleShot(True)
+        self.history_timer.timeout.connect(self.load_history_chunk)
+        self.history_timer.start(0)
+
+        # Показываем случайный совет при запуске
+        self.show_random_tip()
+
+        # Колесо мыши над диаграммой меняет масштаб периода, перетаскивание сдвигает его
+        self.chart_navigators = [ChartNavigator(view, self) for view in [self.chart_view, self.all_chart_view]]
+
+        # Формы добавления по категориям, создаются при первом открытии
+        self.add_windows = {}
+        self.loans_window = None
+        self.recurring_window = None
+
+        # Анимации кнопок создаются один раз и перезапускаются
+        self.button_animator = ButtonAnimator([self.income_btn, self.expense_btn, self.savings_btn,
+                                               self.charity_btn, self.loans_btn, self.all_btn, self.tip_btn], self)
+
+        # Профилирование: F12 показывает оверлей, Shift+F12 сохраняет трассу.
+        # С переменной FINANCES_TRACE профилировщик работает с запуска, а трасса пишется в этот файл при закрытии
+        self.trace_path = os.environ.get("FINANCES_TRACE")
+        if self.trace_path:
+            PROFILER.enable()
+        self.profiler_overlay = ProfilerOverlay(self)
+        QShortcut(QKeySequence("F12"), self, self.toggle_profiler)
+        QShortcut(QKeySequence("Shift+F12"), self, self.save_trace)
+
+        # Правка истории: Delete удаляет строку таблицы, двойной щелчок её исправляет,
+        # Ctrl+Z и Ctrl+Shift+Z отменяют и повторяют добавления, импорты и правки
+        QShortcut(QKeySequence.Delete, self.transactions_table, self.delete_transaction, context=Qt.WidgetShortcut)
+        self.transactions_table.doubleClicked.connect(self.edit_transaction)
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
+
+        # С переменной FINANCES_SERVE окно принимает операции других программ на этом адресе
+        self.ingest_server = self.ingest_thread = None
+        address = os.environ.get("FINANCES_SERVE")
+        if address:
+            self.start_ingest(address)
+
+    def toggle_profiler(self):
+        active = not self.profiler_overlay.isVisible()
+        self.profiler_overlay.set_active(active)
+        PROFILER.enable(active or bool(self.trace_path))
+
+    def save_trace(self):
+        if not PROFILER.events:
+            QMessageBox.information(self, "Профилирование", "Трасса пуста: включите профилирование клавишей F12")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить трассу", "финансы-trace.json",
+                                              "Chrome trace (*.json)")
+        if path:
+            try:
+                PROFILER.dump(path)
+            except OSError as error:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить трассу: {error}")
+
+    def start_ingest(self, address):
+        """Serve the JSON ingestion protocol on address from a background thread"""
+        self.ingest_bridge = IngestBridge(self)
+        self.ingest_bridge.batch.connect(self.commit_ingested)
+        try:
+            server = IngestServer(self.ingest_bridge.commit, address)
+            self.ingest_thread = server.start_thread()
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Приём операций", f"Не удалось открыть {address}: {error}")
+            return
+        self.ingest_server = server
+        self.statusBar().showMessage(f"Приём операций на {address}", self.STATUS_TIMEOUT)
+
+    @profiled("FinancialApp.commit_ingested")
+    def commit_ingested(self, transactions, done):
+        """Save one batch of the ingestion server; the window is redrawn once per batch"""
+        try:
+            year_deltas = self.finances.commit(transactions)
+        except Exception as e:
+            done(e)
+            return
+        done(len(transactions))
+        self.refresh_after_commit(year_deltas)
+        self.statusBar().showMessage(f"Принято операций: {len(transactions)}", self.STATUS_TIMEOUT)
+
+    @profiled("FinancialApp.load_history_chunk")
+    def load_history_chunk(self):
+        self.finances.load_history(self.HISTORY_CHUNK)
+        self.redraw.mark_dirty(pages=[self.transactions_tab])
+
+        if not self.finances.history_loaded:
+            self.history_timer.start(0)
+
+    def closeEvent(self, event):
+        self.history_timer.stop()
+        for worker in [self.import_worker, self.export_worker]:
+            if worker is not None:
+                worker.cancel()
+        QThreadPool.globalInstance().waitForDone()
+        self.import_worker = self.export_worker = None
+        if self.ingest_server is not None:
+            self.ingest_server.stop()
+            self.ingest_thread.join(1)
+        self.finances.close()
+        if self.trace_path:
+            PROFILER.dump(self.trace_path)
+        super().closeEvent(event)
+
+    def show_random_tip(self):
+        tips = [
+            "Откладывайте минимум 10% от каждого дохода - это основа финансовой стабильности.",
+            "Перед крупной покупкой подождите 24 часа - это поможет избежать импульсных трат.",
+            "Используйте правило 50/30/20: 50% на нужды, 30% на желания, 20% на сбережения.",
+            "Заведите отдельный счет для накоплений и не снимайте с него деньги без крайней необходимости.",
+            "Анализируйте свои расходы раз в месяц - это поможет выявить ненужные траты.",
+            "Планируйте крупные покупки заранее, откладывая небольшие суммы каждый месяц.",
+            "Используйте кэшбэк и бонусные программы - это может дать до 10% экономии.",
+            "Автоматизируйте платежи и накопления - так вы не забудете про важные финансовые операции.",
+            "Сравнивайте цены перед покупкой, особенно для дорогих товаров.",
+            "Создайте финансовую подушку безопасности - 3-6 месячных доходов на непредвиденные случаи.",
+            "Инвестируйте в свое образование - это самые выгодные долгосрочные вложения.",
+            "Избегайте кредитов на потребительские товары - они часто ведут к долговой яме.",
+            "Покупайте качественные вещи - они служат дольше и в итоге экономят ваши деньги.",
+            "Планируйте меню на неделю - это сократит расходы на еду и уменьшит количество спонтанных покупок.",
+            "Регулярно пересматривайте свои подписки и откажитесь от ненужных."
+        ]
+
+        tip = random.choice(tips)
+        self.tip_dialog = TipDialog(tip, self)
+        self.tip_dialog.exec_()
+
+    def init_data(self, ledger_path=LEDGER_PATH, rules_path=ALLOCATION_RULES_PATH):
+        # Правила автоматического распределения доходов
+        try:
+            rules = load_allocation_rules(rules_path)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Правила распределения",
+                                f"Не удалось загрузить {rules_path}: {error}. Используются правила по умолчанию")
+            rules = AllocationRules(DEFAULT_ALLOCATION_RULES)
+
+        # Журнал, итоги и история живут в ядре без Qt
+        self.finances = Finances(ledger_path, rules)
+
+        # Показываемый период: первый и последний день и шаг оси.
+        # Ядро держит в chart_data месяцы года, которым период заканчивается
+        year = self.finances.year
+        self.period = (datetime.date(year, 1, 1), datetime.date(year, 12, 31), "Месяцы")
+
+        # Фоновые импорт и экспорт (Worker), пока они идут
+        self.import_worker = None
+        self.export_worker = None
+
+    def init_ui(self):
+        self.setWindowTitle("Финансовая визуализация")
+        self.setGeometry(100, 100, 1200, 850)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+
+        main_layout = QVBoxLayout(central_widget)
+        main_layout.setContentsMargins(15, 15, 15, 15)
+        main_layout.setSpacing(15)
+
+        # Верхняя часть с кнопками и диаграммами
+        top_panel = QWidget()
+        top_panel.setObjectName("topPanel")
+        top_layout = QHBoxLayout(top_panel)
+        top_layout.setContentsMargins(15, 15, 15, 15)
+        top_layout.setSpacing(20)
+
+        # Левая панель с кнопками категорий
+        buttons_panel = QWidget()
+        buttons_panel.setObjectName("buttonsPanel")
+        buttons_layout = QVBoxLayout(buttons_panel)
+        buttons_layout.setAlignment(Qt.AlignCenter)
+        buttons_layout.setSpacing(20)
+        buttons_layout.setContentsMargins(15, 15, 15, 15)
+
+        # Кнопки категорий с цветами
+        self.income_btn = AnimatedButton("Доходы", self)
+        self.expense_btn = AnimatedButton("Расходы", self)
+        self.savings_btn = AnimatedButton("Сбережения", self)
+        self.charity_btn = AnimatedButton("Благотворительность", self)
+        self.loans_btn = AnimatedButton("Кредиты", self)
+        self.all_btn = AnimatedButton("Общая", self)
+
+        # Добавляем кнопку для показа советов
+        self.tip_btn = AnimatedButton("Совет", self)
+        self.tip_btn.clicked.connect(self.show_random_tip)
+
+        # Подключаем обработчики кликов
+        self.income_btn.clicked.connect(lambda: self.show_chart("Доходы"))
+        self.expense_btn.clicked.connect(lambda: self.show_chart("Расходы"))
+        self.savings_btn.clicked.connect(lambda: self.show_chart("Сбережения"))
+        self.charity_btn.clicked.connect(lambda: self.show_chart("Благотворительность"))
+        self.loans_btn.clicked.connect(lambda: self.show_chart("Кредиты"))
+        self.all_btn.clicked.connect(self.show_all_categories)
+
+        # Добавляем кнопки в layout
+        buttons_layout.addWidget(self.income_btn)
+        buttons_layout.addWidget(self.expense_btn)
+        buttons_layout.addWidget(self.savings_btn)
+        buttons_layout.addWidget(self.charity_btn)
+        buttons_layout.addWidget(self.loans_btn)
+        buttons_layout.addWidget(self.all_btn)
+        buttons_layout.addWidget(self.tip_btn)
+
+        buttons_layout.addItem(QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding))
+        top_layout.addWidget(buttons_panel, stretch=1)
+
+        # Правая панель с диаграммами и таблицей
+        self.tab_widget = QTabWidget()
+
+        # Вкладка с текущей диаграммой
+        self.current_chart_tab = QWidget()
+        current_chart_layout = QVBoxLayout(self.current_chart_tab)
+        current_chart_layout.setContentsMargins(10, 10, 10, 10)
+        current_chart_layout.setSpacing(15)
+
+        self.chart_title = QLabel("Доходы")
+        self.chart_title.setAlignment(Qt.AlignCenter)
+        self.chart_title.setObjectName("chartTitle")
+        self.chart_title.setProperty("role", "title")
+
+        # Добавляем виджет для круговой диаграммы подкатегорий
+        self.subcategories_chart_view = QChartView()
+        self.subcategories_chart_view.setRenderHint(QPainter.Antialiasing)
+
+        self.chart_view = QChartView()
+        self.chart_view.setRenderHint(QPainter.Antialiasing)
+
+        current_chart_layout.addWidget(self.chart_title)
+        current_chart_layout.addWidget(self.subcategories_chart_view, stretch=1)
+        current_chart_layout.addWidget(self.chart_view, stretch=2)
+
+        # Панель с итоговой суммой
+        summary_panel = QWidget()
+        summary_panel.setObjectName("summaryPanel")
+        summary_layout = QHBoxLayout(summary_panel)
+        summary_layout.setContentsMargins(15, 10, 15, 10)
+
+        self.total_label = QLabel("Сумма за год:")
+        self.total_label.setObjectName("totalLabel")
+
+        self.total_amount = QLabel(format_money(0))
+        self.total_amount.setObjectName("totalAmount")
+
+        # Бюджеты расходов и графики кредитов открываются с диаграммы своей категории,
+        # повторяющиеся операции - с диаграммы любой
+        self.budgets_btn = QPushButton("Бюджеты")
+        self.budgets_btn.clicked.connect(self.edit_budgets)
+        self.loan_schedules_btn = QPushButton("Графики кредитов")
+        self.loan_schedules_btn.clicked.connect(self.open_loans_window)
+        self.recurring_btn = QPushButton("Повторяющиеся")
+        self.recurring_btn.clicked.connect(self.open_recurring_window)
+        for button in [self.budgets_btn, self.loan_schedules_btn, self.recurring_btn]:
+            button.setProperty("role", "primary")
+        for button in [self.budgets_btn, self.loan_schedules_btn]:
+            button.setVisible(False)
+
+        summary_layout.addWidget(self.total_label)
+        summary_layout.addWidget(self.total_amount)
+        summary_layout.addStretch()
+        summary_layout.addWidget(self.budgets_btn)
+        summary_layout.addWidget(self.loan_schedules_btn)
+        summary_layout.addWidget(self.recurring_btn)
+
+        current_chart_layout.addWidget(summary_panel)
+
+        # Вкладка с общей диаграммой
+        self.all_chart_tab = QWidget()
+        all_chart_layout = QVBoxLayout(self.all_chart_tab)
+        all_chart_layout.setContentsMargins(10, 10, 10, 10)
+
+        all_chart_title = QLabel("Общая финансовая картина")
+        all_chart_title.setAlignment(Qt.AlignCenter)
+        all_chart_title.setProperty("role", "title")
+
+        self.all_chart_view = QChartView()
+        self.all_chart_view.setRenderHint(QPainter.Antialiasing)
+
+        all_chart_layout.addWidget(all_chart_title)
+        all_chart_layout.addWidget(self.all_chart_view)
+
+        # Вкладка с таблицей транзакций
+        self.transactions_tab = QWidget()
+        transactions_layout = QVBoxLayout(self.transactions_tab)
+        transactions_layout.setContentsMargins(10, 10, 10, 10)
+
+        transactions_title = QLabel("История операций")
+        transactions_title.setAlignment(Qt.AlignCenter)
+        transactions_title.setProperty("role", "title")
+
+        self.transactions_model = TransactionsTableModel(self.finances.transactions, self)
+        self.history_proxy = HistoryProxyModel(self.finances.history_index, self)
+        self.history_proxy.setSourceModel(self.transactions_model)
+        self.transactions_table = QTableView()
+        self.transactions_table.setModel(self.history_proxy)
+        # Щелчок по заголовку сортирует через индексы истории; до первого щелчка строки идут по порядку
+        self.transactions_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.transactions_table.setSortingEnabled(True)
+        self.transactions_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Фиксированная высота строк: представлению не нужно измерять всю историю
+        self.transactions_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.transactions_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.transactions_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.transactions_table.setObjectName("transactionsTable")
+
+        transactions_layout.addWidget(transactions_title)
+        transactions_layout.addWidget(self.create_history_filters())
+        transactions_layout.addWidget(self.transactions_table)
+
+        # Добавляем вкладки
+        self.tab_widget.addTab(self.current_chart_tab, "Детали")
+        self.tab_widget.addTab(self.all_chart_tab, "Общая картина")
+        self.tab_widget.addTab(self.transactions_tab, "История операций")
+
+        # Перерисовка по вкладкам: изменения копятся, обновляется только видимая вкладка
+        self.redraw = RedrawScheduler(self.tab_widget, {
+            self.current_chart_tab: self.refresh_details,
+            self.all_chart_tab: self.refresh_overview,
+            self.transactions_tab: self.refresh_history
+        }, self.REDRAW_INTERVAL)
+        self.tab_widget.currentChanged.connect(self.materialize_recurring)
+
+        # Выбор периода над вкладками
+        period_panel = QWidget()
+        period_layout = QHBoxLayout(period_panel)
+        period_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.start_year_spin = QSpinBox()
+        self.end_year_spin = QSpinBox()
+        for spin in [self.start_year_spin, self.end_year_spin]:
+            spin.setRange(1900, 2100)
+            spin.setValue(self.finances.year)
+            spin.valueChanged.connect(self.change_period)
+
+        self.granularity_combo = QComboBox()
+        self.granularity_combo.addItems([AUTO_GRANULARITY] + GRANULARITIES)
+        self.granularity_combo.setCurrentText("Месяцы")
+        self.granularity_combo.currentIndexChanged.connect(self.change_period)
+
+        period_layout.addWidget(QLabel("Период с"))
+        period_layout.addWidget(self.start_year_spin)
+        period_layout.addWidget(QLabel("по"))
+        period_layout.addWidget(self.end_year_spin)
+        period_layout.addWidget(QLabel("Шаг:"))
+        period_layout.addWidget(self.granularity_combo)
+        period_layout.addStretch()
+
+        right_panel = QWidget()
+        right_layout = QVBoxLayout(right_panel)
+        right_layout.setContentsMargins(0, 0, 0, 0)
+        right_layout.addWidget(period_panel)
+        right_layout.addWidget(self.tab_widget)
+
+        top_layout.addWidget(right_panel, stretch=3)
+        main_layout.addWidget(top_panel)
+
+        # Нижняя панель с кнопками добавления денег
+        bottom_panel = QWidget()
+        bottom_panel.setObjectName("bottomPanel")
+        bottom_layout = QHBoxLayout(bottom_panel)
+        bottom_layout.setContentsMargins(20, 15, 20, 15)
+        bottom_layout.setSpacing(15)
+
+        # Кнопки для добавления денег
+        self.add_income_btn = QPushButton("Добавить доходы")
+        self.add_expense_btn = QPushButton("Добавить расходы")
+        self.add_savings_btn = QPushButton("Добавить сбережения")
+        self.add_charity_btn = QPushButton("Добавить благотворительность")
+        self.add_loans_btn = QPushButton("Добавить кредиты")
+        self.import_btn = QPushButton("Импорт выписки")
+        self.export_btn = QPushButton("Экспорт")
+
+        # Цвета кнопок задаются в таблице стилей по категории
+        for button, category in [(self.add_income_btn, "Доходы"), (self.add_expense_btn, "Расходы"),
+                                 (self.add_savings_btn, "Сбережения"), (self.add_charity_btn, "Благотворительность"),
+                                 (self.add_loans_btn, "Кредиты"), (self.import_btn, "Импорт"),
+                                 (self.export_btn, "Экспорт")]:
+            button.setProperty("role", "add")
+            button.setProperty("category", category)
+
+        # Подключаем обработчики
+        self.add_income_btn.clicked.connect(lambda: self.open_add_money_window("Доходы", "Доходы"))
+        self.add_expense_btn.clicked.connect(lambda: self.open_add_money_window("Расходы", "Расходы"))
+        self.add_savings_btn.clicked.connect(lambda: self.open_add_money_window("Сбережения", "Сбережения"))
+        self.add_charity_btn.clicked.connect(
+            lambda: self.open_add_money_window("Благотворительность", "Благотворительность"))
+        self.add_loans_btn.clicked.connect(lambda: self.open_add_money_window("Кредиты", "Кредиты"))
+        self.import_btn.clicked.connect(self.import_statement)
+        self.export_btn.clicked.connect(self.export_report)
+
+        # Добавляем кнопки в layout
+        bottom_layout.addWidget(self.add_income_btn)
+        bottom_layout.addWidget(self.add_expense_btn)
+        bottom_layout.addWidget(self.add_savings_btn)
+        bottom_layout.addWidget(self.add_charity_btn)
+        bottom_layout.addWidget(self.add_loans_btn)
+        bottom_layout.addWidget(self.import_btn)
+        bottom_layout.addWidget(self.export_btn)
+
+        main_layout.addWidget(bottom_panel)
+
+        # Сообщения о бюджетах справа в строке состояния: видны на любой вкладке и не мешают вводу
+        self.budget_alert = QLabel()
+        self.budget_alert.setObjectName("budgetAlert")
+        self.budget_alert.setVisible(False)
+        self.statusBar().addPermanentWidget(self.budget_alert)
+        self.alert_timer = QTimer(self)
+        self.alert_timer.setSingleShot(True)
+        self.alert_timer.setInterval(self.ALERT_TIMEOUT)
+        self.alert_timer.timeout.connect(self.budget_alert.hide)
+
+        # Сразу строим диаграммы
+        self.create_charts()
+
+    @profiled("FinancialApp.animate_buttons")
+    def animate_buttons(self):
+        # Animate all category buttons
+        PROFILER.count("Анимации", self.button_animator.trigger())
+
+    def open_add_money_window(self, category_type, category):
+        # Форма каждой категории строится один раз и дальше только показывается
+        if category not in self.add_windows:
+            self.add_windows[category] = AddMoneyWindow(self, category_type, category)
+        self.add_windows[category].open()
+        self.animate_buttons()
+
+    def open_loans_window(self):
+        if self.loans_window is None:
+            self.loans_window = LoansWindow(self)
+        self.loans_window.open()
+        self.show_chart("Кредиты")
+
+    def open_recurring_window(self):
+        if self.recurring_window is None:
+            self.recurring_window = RecurringWindow(self)
+        self.recurring_window.open()
+
+    def materialize_recurring(self, tab=None):
+        """Write the due recurring operations to the journal; on a tab switch only when the history is shown"""
+        if tab is not None and self.tab_widget.widget(tab) is not self.transactions_tab:
+            return
+        count = self.finances.materialize()
+        if count:
+            self.redraw.mark_dirty(pages=[self.transactions_tab])
+            self.statusBar().showMessage(f"В историю записаны повторяющиеся операции: {count}", self.STATUS_TIMEOUT)
+
+    def refresh_loans(self):
+        """Redraw the loan schedules on the Кредиты chart after a loan changed"""
+        self.redraw.mark_dirty([("Кредиты", None, None)], pages=[self.current_chart_tab])
+
+    def add_to_category(self, category_type, category, date, amount, subcategory=None):
+        return self.add_amounts(category_type, category, date, [amount], subcategory)
+
+    @profiled("FinancialApp.add_amounts")
+    def add_amounts(self, category_type, category, date, amounts, subcategory=None):
+        """Add one operation per amount in a single commit; returns whether it succeeded"""
+        try:
+            self.refresh_after_commit(self.finances.commit(
+                [Transaction(category_type, category, subcategory or "", date, amount) for amount in amounts]))
+
+            self.show_chart(category_type if category_type in ["Доходы", "Расходы"] else category)
+
+            # Подтверждение в строке состояния не останавливает ввод
+            month_name = MONTHS[date.month - 1]
+            what = format_money(amounts[0]) if len(amounts) == 1 else \
+                f"{format_money(sum(amounts))} ({len(amounts)} шт.)"
+            self.statusBar().showMessage(f"Добавлено {what} в {category.lower()} за {month_name.lower()} {date.year}",
+                                         self.STATUS_TIMEOUT)
+            return True
+        except Exception as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось добавить данные: {str(e)}")
+            return False
+
+    def delete_transaction(self):
+        index = self.transactions_table.currentIndex()
+        if index.isValid():
+            self.change_history(self.finances.delete, self.history_proxy.mapToSource(index).row(),
+                                done="Операция удалена, Ctrl+Z вернёт её")
+
+    def edit_transaction(self, index):
+        row = self.history_proxy.mapToSource(index).row()
+        dialog = EditTransactionDialog(self.finances.transactions[row], self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.change_history(self.finances.edit, row, dialog.corrected(),
+                                done="Операция исправлена, Ctrl+Z вернёт прежнюю")
+
+    def undo(self):
+        self.change_history(self.finances.undo, done="Действие отменено", nothing="Нечего отменять")
+
+    def redo(self):
+        self.change_history(self.finances.redo, done="Действие повторено", nothing="Нечего повторять")
+
+    @profiled("FinancialApp.change_history")
+    def change_history(self, action, *args, done="", nothing=""):
+        """Run a Finances edit, delete, undo or redo and update only the bars and rows it touched"""
+        try:
+            change = action(*args)
+        except ValueError as e:
+            QMessageBox.warning(self, "Ошибка", str(e))
+            return
+        if change is None:
+            self.statusBar().showMessage(nothing, self.STATUS_TIMEOUT)
+            return
+
+        self.history_proxy.source_rows_hidden(change.hidden)
+        self.history_proxy.source_rows_shown(change.shown)
+        self.refresh_after_commit(change.deltas)
+        self.statusBar().showMessage(done, self.STATUS_TIMEOUT)
+
+    def create_history_filters(self):
+        """Filter row above the history table"""
+        panel = QWidget()
+        layout = QHBoxLayout(panel)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.type_filter = QComboBox()
+        self.type_filter.addItems(["Все типы"] + CATEGORIES)
+        self.category_filter = QComboBox()
+        self.category_filter.addItems(["Все категории"] + CATEGORIES)
+        self.subcategory_filter = QComboBox()
+        self.subcategory_filter.addItems(["Все подкатегории"] + [subcategory for category in SUBCATEGORIES
+                                                                  for subcategory in SUBCATEGORIES[category]])
+        # Месяцы, в которых есть операции, дополняются при обновлении вкладки
+        self.month_filter = QComboBox()
+        self.month_filter.addItem("Все месяцы", None)
+        for combo in [self.type_filter, self.category_filter, self.subcategory_filter, self.month_filter]:
+            combo.currentIndexChanged.connect(self.apply_history_filters)
+            layout.addWidget(combo)
+
+        self.low_filter = QLineEdit()
+        self.low_filter.setPlaceholderText("Сумма от")
+        self.high_filter = QLineEdit()
+        self.high_filter.setPlaceholderText("до")
+        self.search_filter = QLineEdit()
+        self.search_filter.setPlaceholderText("Поиск по названию или сумме")
+        for edit in [self.low_filter, self.high_filter, self.search_filter]:
+            edit.textChanged.connect(self.apply_history_filters)
+            layout.addWidget(edit)
+
+        reset_button = QPushButton("Сбросить")
+        reset_button.clicked.connect(self.reset_history_filters)
+        layout.addWidget(reset_button)
+
+        self.history_status = QLabel()
+        layout.addWidget(self.history_status)
+        return panel
+
+    def apply_history_filters(self):
+        filters = {}
+        for name, combo in [("type", self.type_filter), ("category", self.category_filter),
+                            ("subcategory", self.subcategory_filter)]:
+            if combo.currentIndex() > 0:
+                filters[name] = combo.currentText()
+        if self.month_filter.currentData() is not None:
+            filters["month"] = self.month_filter.currentData()
+
+        for name, edit in [("low", self.low_filter), ("high", self.high_filter)]:
+            text = edit.text().strip()
+            invalid = False
+            if text:
+                try:
+                    filters[name] = parse_money(text)
+                except ValueError:
+                    # Пока сумма не дописана, граница не применяется
+                    invalid = True
+            set_flag(edit, "invalid", invalid)
+        if self.search_filter.text().strip():
+            filters["text"] = self.search_filter.text().strip()
+
+        self.history_proxy.set_filters(filters)
+        self.update_history_status()
+
+    def reset_history_filters(self):
+        for widget in [self.type_filter, self.category_filter, self.subcategory_filter, self.month_filter,
+                       self.low_filter, self.high_filter, self.search_filter]:
+            widget.blockSignals(True)
+            if isinstance(widget, QComboBox):
+                widget.setCurrentIndex(0)
+            else:
+                widget.clear()
+            widget.blockSignals(False)
+        self.apply_history_filters()
+
+    def refresh_history(self, changes=None):
+        self.transactions_model.sync()
+
+        months = self.finances.history_index.month_keys()
+        if len(months) != self.month_filter.count() - 1:
+            selected = self.month_filter.currentData()
+            self.month_filter.blockSignals(True)
+            self.month_filter.clear()
+            self.month_filter.addItem("Все месяцы", None)
+            for key in reversed(months):
+                self.month_filter.addItem(f"{MONTHS[key % 100 - 1]} {key // 100}", key)
+            self.month_filter.setCurrentIndex(max(self.month_filter.findData(selected), 0))
+            self.month_filter.blockSignals(False)
+        self.update_history_status()
+
+    def update_history_status(self):
+        count = self.transactions_model.rowCount()
+        shown = self.history_proxy.rowCount()
+        total = count - sum(row < count for row in self.finances.transactions.deleted)
+        self.history_status.setText(f"{shown} из {total}" if shown != total else f"Всего: {total}")
+
+    def refresh_after_commit(self, year_deltas):
+        self.show_alerts()
+        # Представления обновятся один раз за такт, и только видимое
+        self.redraw.mark_dirty(pages=[self.transactions_tab])
+        if self.is_year_view():
+            self.redraw.mark_dirty([key for key, amount in year_deltas],
+                                   pages=[self.current_chart_tab, self.all_chart_tab])
+        else:
+            self.redraw.mark_dirty(pages=[self.current_chart_tab, self.all_chart_tab])
+
+    def show_alerts(self):
+        """Show the budget thresholds crossed since the last call next to the status bar"""
+        alerts = self.finances.take_alerts()
+        if not alerts:
+            return
+
+        # Последнее сообщение целиком, остальные числом
+        alert = alerts[-1]
+        what = "бюджет превышен" if alert.threshold >= 100 else f"израсходовано {alert.threshold}% бюджета"
+        text = (f"{alert.subcategory}, {MONTHS[alert.month].lower()} {alert.year}: {what} "
+                f"({format_money(alert.spent)} из {format_money(alert.limit)})")
+        if len(alerts) > 1:
+            text += f" и ещё {len(alerts) - 1}"
+        set_flag(self.budget_alert, "warning", alert.threshold < 100)
+        self.budget_alert.setText(text)
+        self.budget_alert.show()
+        self.alert_timer.start()
+
+    def edit_budgets(self):
+        dialog = BudgetsDialog(self.finances.budgets, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        for subcategory, limit in dialog.limits().items():
+            self.finances.set_budget(subcategory, limit)
+        self.redraw.mark_dirty([(BudgetIndex.CATEGORY, None, None)], pages=[self.current_chart_tab])
+        self.statusBar().showMessage("Бюджеты сохранены", self.STATUS_TIMEOUT)
+
+    def import_statement(self):
+        if self.import_worker is not None:
+            QMessageBox.warning(self, "Импорт", "Импорт уже выполняется")
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт выписки", "",
+                                              "Выписки (*.csv *.ofx);;Все файлы (*)")
+        if path:
+            self.start_import(path)
+
+    def start_import(self, path):
+        # Разбор файла и подсчёт итогов идут в фоновом потоке,
+        # главный поток только записывает готовые пачки
+        self.import_started = time.perf_counter()
+        self.import_worker = Worker(import_job, path, self.finances.rules)
+        # Весь импорт отменяется одним Ctrl+Z
+        self.finances.begin_batch()
+
+        self.import_progress = QProgressDialog("Импорт выписки...", "Отмена", 0, 100, self)
+        self.import_progress.setWindowTitle("Импорт")
+        self.import_progress.setMinimumDuration(0)
+        self.import_progress.canceled.connect(self.import_worker.cancel)
+
+        self.import_worker.signals.partial.connect(self.apply_import_chunk)
+        self.import_worker.signals.progress.connect(self.import_progress.setValue)
+        self.import_worker.signals.result.connect(self.finish_import)
+        self.import_worker.signals.error.connect(
+            lambda error: QMessageBox.warning(self, "Ошибка", f"Не удалось импортировать файл: {error}"))
+        self.import_worker.signals.finished.connect(self.end_import)
+        QThreadPool.globalInstance().start(self.import_worker)
+
+    @profiled("FinancialApp.apply_import_chunk")
+    def apply_import_chunk(self, batch):
+        # Окно уже закрыто, журнал недоступен
+        if self.import_worker is None:
+            return
+
+        self.finances.commit(*batch, record=False)
+
+    def finish_import(self, result):
+        rows, skipped = result
+        elapsed = time.perf_counter() - self.import_started
+        rate = rows / elapsed if elapsed > 0 else rows
+        status = "Импорт прерван" if self.import_worker.is_cancelled() else "Импорт завершён"
+        QMessageBox.information(self, "Импорт", f"{status}. Импортировано операций: {rows} "
+                                                f"({rate:.0f} строк/с), пропущено строк: {skipped}")
+
+    def end_import(self):
+        if self.import_worker is None:
+            return
+
+        self.import_progress.close()
+        self.import_worker = None
+        self.finances.end_batch()
+        self.redraw.mark_dirty()
+        self.show_alerts()
+
+    def export_report(self):
+        if self.export_worker is not None:
+            QMessageBox.warning(self, "Экспорт", "Экспорт уже выполняется")
+            return
+
+        path, selected = QFileDialog.getSaveFileName(self, "Экспорт", "", ";;".join(self.EXPORT_FILTERS))
+        if not path:
+            return
+        format = self.EXPORT_FILTERS[selected] if selected in self.EXPORT_FILTERS else \
+            "csv" if path.lower().endswith(".csv") else "колонки"
+        if format in ChartExporter.FORMATS:
+            self.export_charts(path, format)
+        else:
+            self.start_export(path, format)
+
+    def start_export(self, path, format):
+        # Журнал читается в фоновом потоке через своё соединение, окно продолжает записывать операции
+        if format == "csv" and not path.lower().endswith(".csv"):
+            path += ".csv"
+        # Выгрузка - тоже история: наступившие повторения записываются в журнал до неё
+        self.materialize_recurring()
+        self.export_worker = Worker(export_job, self.finances.ledger.path, path)
+
+        self.export_progress = QProgressDialog("Экспорт операций...", "Отмена", 0, 100, self)
+        self.export_progress.setWindowTitle("Экспорт")
+        self.export_progress.setMinimumDuration(0)
+        self.export_progress.canceled.connect(self.export_worker.cancel)
+
+        self.export_worker.signals.progress.connect(self.export_progress.setValue)
+        self.export_worker.signals.result.connect(
+            lambda rows: self.statusBar().showMessage(f"Экспортировано операций: {rows} в {path}", self.STATUS_TIMEOUT))
+        self.export_worker.signals.error.connect(
+            lambda error: QMessageBox.warning(self, "Ошибка", f"Не удалось экспортировать: {error}"))
+        self.export_worker.signals.finished.connect(self.end_export)
+        QThreadPool.globalInstance().start(self.export_worker)
+
+    def end_export(self):
+        if self.export_worker is None:
+            return
+
+        self.export_progress.close()
+        self.export_worker = None
+
+    def export_charts(self, path, format):
+        """Render the charts of the shown period next to path, named after it"""
+        directory, name = os.path.split(os.path.splitext(path)[0])
+        first, last, granularity = self.period
+        try:
+            paths = list(ChartExporter(self.finances).export(directory, first, last, granularity, [format],
+                                                             prefix=f"{name} - "))
+        except OSError as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить диаграммы: {str(e)}")
+            return
+        self.statusBar().showMessage(f"Сохранено диаграмм: {len(paths)} в {directory}", self.STATUS_TIMEOUT)
+
+    def import_file(self, path):
+        """Import a statement on the calling thread, chunk by chunk, and redraw once at the end"""
+        try:
+            return self.finances.import_file(path)
+        finally:
+            self.redraw.mark_dirty()
+
+    @profiled("FinancialApp.create_charts")
+    def create_charts(self):
+        # Диаграммы создаются один раз, дальше меняются только значения столбцов
+        self.category_charts = {
+            category: BarChartController(f"Месячные {category.lower()}", [category])
+            for category in CATEGORIES
+        }
+        self.category_charts["Кредиты"] = BarChartController("Месячные кредиты", LOAN_BARS, line="Остаток долга")
+        self.category_charts["Расходы"] = BarChartController("Месячные расходы", EXPENSE_BARS, line="Бюджет",
+                                                             own_axis=False)
+        self.subcategory_charts = {
+            category: PieChartController(subcategories) for category, subcategories in SUBCATEGORIES.items()
+        }
+        self.all_chart = BarChartController("Общая финансовая картина", CATEGORIES, stacked=True)
+
+        self.refresh_details()
+        self.refresh_overview()
+        with PROFILER.span("QChartView.setChart"):
+            self.all_chart_view.setChart(self.all_chart.chart)
+
+    def expand_changes(self, changes):
+        # None означает полное обновление: все месяцы и подкатегории каждой категории
+        if changes is None:
+            return [(category, None, None) for category in CATEGORIES]
+        return changes
+
+    def is_year_view(self):
+        # Месяцы одного года: диаграммы читают chart_data и AggregateIndex ядра
+        first, last, granularity = self.period
+        return (granularity == "Месяцы" and first == datetime.date(first.year, 1, 1)
+                and last == datetime.date(first.year, 12, 31))
+
+    def period_total(self, category, subcategory=None):
+        if self.is_year_view():
+            return self.finances.aggregates.yearly_total(category, subcategory)
+        first, last, granularity = self.period
+        return self.finances.range_total(category, first, last, subcategory)
+
+    def change_period(self):
+        start, end = self.start_year_spin.value(), self.end_year_spin.value()
+        # Начало периода не может быть позже конца: двигаем вторую границу
+        if start > end:
+            if self.sender() is self.start_year_spin:
+                end = start
+                self.end_year_spin.blockSignals(True)
+                self.end_year_spin.setValue(end)
+                self.end_year_spin.blockSignals(False)
+            else:
+                start = end
+                self.start_year_spin.blockSignals(True)
+                self.start_year_spin.setValue(start)
+                self.start_year_spin.blockSignals(False)
+
+        first, last = datetime.date(start, 1, 1), datetime.date(end, 12, 31)
+        self.set_period(first, last, self.detail_level(first, last))
+
+    def detail_level(self, first, last):
+        """Chosen granularity, coarsened until the bars of first..last fit the chart width"""
+        chosen = self.granularity_combo.currentText()
+        finest = GRANULARITIES[0] if chosen == AUTO_GRANULARITY else chosen
+        return choose_granularity(first, last, min(self.chart_view.width(), self.all_chart_view.width()), finest)
+
+    def update_detail_level(self):
+        first, last, granularity = self.period
+        detail = self.detail_level(first, last)
+        if detail != granularity:
+            self.set_period(first, last, detail)
+
+    def show_range(self, first, last):
+        """Show first..last kept inside the year fields range, with the fields following it"""
+        if first < self.FIRST_DAY:
+            first, last = self.FIRST_DAY, last + (self.FIRST_DAY - first)
+        if last > self.LAST_DAY:
+            first, last = max(first - (last - self.LAST_DAY), self.FIRST_DAY), self.LAST_DAY
+
+        for spin, year in [(self.start_year_spin, first.year), (self.end_year_spin, last.year)]:
+            spin.blockSignals(True)
+            spin.setValue(year)
+            spin.blockSignals(False)
+        self.set_period(first, last, self.detail_level(first, last))
+
+    def zoom_period(self, factor, position=0.5):
+        """Scale the shown period by factor, keeping the day under position (0..1) in place"""
+        first, last, granularity = self.period
+        days = (last - first).days + 1
+        scaled = min(max(round(days * factor), self.MIN_PERIOD_DAYS), (self.LAST_DAY - self.FIRST_DAY).days + 1)
+        if scaled == days:
+            return
+
+        anchor = first + datetime.timedelta(days=round(days * position))
+        first = anchor - datetime.timedelta(days=round(scaled * position))
+        self.show_range(first, first + datetime.timedelta(days=scaled - 1))
+
+    def pan_period(self, shift):
+        """Move the shown period by shift of its length; returns whether it moved"""
+        first, last, granularity = self.period
+        days = round(((last - first).days + 1) * shift)
+        if not days or (days < 0 and first == self.FIRST_DAY) or (days > 0 and last == self.LAST_DAY):
+            return False
+
+        self.show_range(first + datetime.timedelta(days=days), last + datetime.timedelta(days=days))
+        return True
+
+    @profiled("FinancialApp.set_period")
+    def set_period(self, first, last, granularity):
+        if self.period == (first, last, granularity):
+            return
+
+        self.period = (first, last, granularity)
+        if last.year != self.finances.year:
+            self.finances.load_year(last.year)
+
+        labels = [label for bucket_first, bucket_last, label in period_buckets(first, last, granularity)]
+        for chart in list(self.category_charts.values()) + [self.all_chart]:
+            chart.set_labels(labels, granularity)
+
+        whole_year = first == datetime.date(first.year, 1, 1) and last == datetime.date(first.year, 12, 31)
+        self.total_label.setText("Сумма за год:" if whole_year else "Сумма за период:")
+        self.redraw.mark_dirty(pages=[self.current_chart_tab, self.all_chart_tab])
+
+    def period_values(self, category):
+        """Bar values of a category for the shown period"""
+        if self.is_year_view():
+            return self.finances.aggregates.series(category)
+        first, last, granularity = self.period
+        return self.finances.range_values(category, first, last, granularity)
+
+    def period_budget(self, category, subcategory):
+        """Budget of an expense subcategory over the shown period, 0 for other categories"""
+        if category != BudgetIndex.CATEGORY:
+            return 0
+        first, last, granularity = self.period
+        return self.finances.budgets.range_limit(first, last, subcategory)
+
+    @profiled("FinancialApp.refresh_details")
+    def refresh_details(self, changes=None):
+        """Push changed values into the per-category bar charts and pies"""
+        # Вне годового вида значения берутся из корзин целиком, это десятки чисел
+        if not self.is_year_view():
+            changes = None
+
+        touched = set()
+        for category, subcategory, month in self.expand_changes(changes):
+            chart = self.category_charts[category]
+            touched.add(category)
+            if month is None:
+                values = self.period_values(category)
+                chart.set_values(category, values)
+                chart.set_maximum(max(values))
+            else:
+                chart.set_value(category, month, self.finances.aggregates.series(category)[month])
+                chart.set_maximum(self.finances.aggregates.maximum(category))
+
+            if category in self.subcategory_charts:
+                pie_chart = self.subcategory_charts[category]
+                subcategories = pie_chart.slices if subcategory is None else [subcategory]
+                for subcat in subcategories:
+                    pie_chart.set_value(subcat, self.period_total(category, subcat),
+                                        self.period_budget(category, subcat))
+
+        # Графики кредитов и бюджеты считаются по корзинам периода целиком и задают общий масштаб со столбцами
+        first, last, granularity = self.period
+        if "Кредиты" in touched:
+            show_loans(self.category_charts["Кредиты"], self.finances.loans, self.period_values("Кредиты"),
+                       first, last, granularity)
+        if "Расходы" in touched:
+            show_budget(self.category_charts["Расходы"], self.finances, self.period_values("Расходы"),
+                        first, last, granularity)
+
+        # Обновляем итоговую сумму
+        total = self.period_total(self.chart_title.text())
+        self.total_amount.setText(format_money(total))
+
+    @profiled("FinancialApp.refresh_overview")
+    def refresh_overview(self, changes=None):
+        if not self.is_year_view():
+            changes = None
+
+        stacked = None
+        for category, subcategory, month in self.expand_changes(changes):
+            if month is None:
+                values = self.period_values(category)
+                self.all_chart.set_values(category, values)
+                stacked = values if stacked is None else [a + b for a, b in zip(stacked, values)]
+            else:
+                self.all_chart.set_value(category, month, self.finances.aggregates.series(category)[month])
+
+        if self.is_year_view():
+            self.all_chart.set_maximum(self.finances.aggregates.stacked_maximum())
+        else:
+            self.all_chart.set_maximum(max(stacked))
+
+    @profiled("FinancialApp.show_chart")
+    def show_chart(self, category):
+        self.chart_title.setText(category)
+
+        chart = self.category_charts[category].chart
+        if self.chart_view.chart() is not chart:
+            with PROFILER.span("QChartView.setChart"):
+                self.chart_view.setChart(chart)
+
+        self.budgets_btn.setVisible(category == BudgetIndex.CATEGORY)
+        self.loan_schedules_btn.setVisible(category == "Кредиты")
+
+        # Круговая диаграмма подкатегорий есть только у доходов и расходов
+        if category in self.subcategory_charts:
+            pie_chart = self.subcategory_charts[category].chart
+            if self.subcategories_chart_view.chart() is not pie_chart:
+                with PROFILER.span("QChartView.setChart"):
+                    self.subcategories_chart_view.setChart(pie_chart)
+            self.subcategories_chart_view.setVisible(True)
+        else:
+            self.subcategories_chart_view.setVisible(False)
+
+        # Обновляем итоговую сумму
+        total = self.period_total(category)
+        self.total_amount.setText(format_money(total))
+        self.tab_widget.setCurrentIndex(0)
+
+    def show_all_categories(self):
+        self.tab_widget.setCurrentIndex(1)
+
+
+def main():
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")
+
+    apply_theme(app)
+
+    try:
+        from PyQt5.QtChart import QChart
+    except ImportError:
+        print("Ошибка: Необходимо установить модуль PyQtChart")
+        sys.exit(1)
+
+    window = FinancialApp()
+    window.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""Локальный приём операций в формате JSON.
+
+Другие программы (выгрузка зарплаты, выписки карт) передают операции
+по TCP на локальном адресе или через Unix-сокет, по одному JSON-документу
+в строке. Документ - одна операция или список операций:
+
+    {"category": "Доходы", "subcategory": "Зарплата", "date": "2025-03-15", "amount": "1500,50"}
+    [{"category": "Расходы", "subcategory": "Продукты", "kopecks": 45000}, ...]
+
+Поля: category (ключ chart_data, то есть одна из CATEGORIES), type (по
+умолчанию равен category), subcategory (подкатегория этого типа или
+пусто), date (ГГГГ-ММ-ДД или ДД.ММ.ГГГГ, по умолчанию сегодня) и сумма:
+amount в рублях (строка или число) либо kopecks целым числом. На каждую
+строку сервер отвечает строкой {"accepted": число операций} или
+{"error": текст}; запрос с ошибкой не сохраняется целиком.
+
+Запросы всех подключений собираются в пачки и сохраняются одним
+Finances.commit: одна транзакция SQLite, один проход по итогам и одно
+обновление окна на пачку. Ответ приходит после сохранения. Модуль не
+импортирует Qt, сервер запускается из консоли (финансы.py serve) или
+в отдельном потоке окна (FINANCES_SERVE).
+"""
+import os
+import json
+import asyncio
+import datetime
+import threading
+from itertools import chain
+
+from финансы_ядро import (CATEGORIES, MAX_KOPECKS, SUBCATEGORIES, StatementImporter, Transaction, format_money,
+                          parse_money)
+
+
+# Адрес по умолчанию; сервер принимает подключения только с этой машины
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+LOCAL_HOSTS = ["127.0.0.1", "localhost", "::1"]
+
+
+def parse_address(address):
+    """("unix", path) for a socket path, or ("tcp", host, port) for a local host:port"""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if os.sep in address:
+        return "unix", address
+
+    host, separator, port = address.rpartition(":")
+    host = host.strip("[]")
+    if not separator or not port.isdigit():
+        raise ValueError(f"Адрес должен быть хост:порт или путь к сокету: {address}")
+    if host not in LOCAL_HOSTS:
+        raise ValueError(f"Приём операций возможен только на локальном адресе, не {host}")
+    return "tcp", host, int(port)
+
+
+class TransactionParser:
+    """Validation of incoming JSON operations against the chart_data keys"""
+
+    def __init__(self):
+        self.importer = StatementImporter()
+        self.dates = {}
+
+    def parse_date(self, text):
+        # Даты в пачке повторяются, каждая строка разбирается один раз
+        if not isinstance(text, str):
+            raise ValueError(f"некорректная дата {text!r}")
+        if text not in self.dates:
+            try:
+                date = datetime.date.fromisoformat(text)
+            except ValueError:
+                date = self.importer.parse_date(text)
+            if date is None:
+                raise ValueError(f"некорректная дата {text!r}")
+            if len(self.dates) > 10000:
+                self.dates.clear()
+            self.dates[text] = date
+        return self.dates[text]
+
+    def parse_amount(self, item):
+        if "kopecks" in item:
+            amount = item["kopecks"]
+            if type(amount) is not int:
+                raise ValueError(f"kopecks должно быть целым числом, а не {amount!r}")
+        else:
+            amount = item.get("amount")
+            if isinstance(amount, bool) or not isinstance(amount, (str, int, float)):
+                raise ValueError(f"некорректная сумма {amount!r}")
+            amount = parse_money(str(amount))
+        if amount <= 0:
+            raise ValueError(f"сумма должна быть больше нуля: {format_money(amount)}")
+        if amount > MAX_KOPECKS:
+            raise ValueError(f"слишком большая сумма: {format_money(amount)}")
+        return amount
+
+    def parse(self, item):
+        """Transaction of one JSON object; raises ValueError"""
+        if not isinstance(item, dict):
+            raise ValueError("операция должна быть объектом JSON")
+        category = item.get("category")
+        kind = item.get("type", category)
+        if category not in CATEGORIES or kind not in CATEGORIES:
+            raise ValueError(f"неизвестная категория {kind if category in CATEGORIES else category!r}")
+        subcategory = item.get("subcategory") or ""
+        # Итоги ведутся по category, поэтому подкатегория должна быть у неё; у категорий без подкатегорий
+        # (сбережения, кредиты) подкатегория только подписывает операцию и проверяется по type
+        owner = category if category in SUBCATEGORIES else kind
+        if subcategory and subcategory not in SUBCATEGORIES.get(owner, ()):
+            raise ValueError(f"у категории {owner} нет подкатегории {subcategory!r}")
+        date = item.get("date")
+        date = self.parse_date(date) if date else datetime.date.today()
+        return Transaction(kind, category, subcategory, date, self.parse_amount(item))
+
+    def parse_request(self, line):
+        """Transactions of one request line; the whole request is rejected on the first error"""
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f"некорректный JSON: {error}")
+        items = data if isinstance(data, list) else [data]
+        if not items:
+            raise ValueError("пустой список операций")
+        transactions = []
+        for index, item in enumerate(items):
+            try:
+                transactions.append(self.parse(item))
+            except ValueError as error:
+                raise ValueError(f"операция {index + 1}: {error}" if len(items) > 1 else str(error))
+        return transactions
+
+
+class IngestServer:
+    """asyncio server that commits incoming operations in micro-batches.
+
+    Every connection reads its requests line by line, validates them and
+    queues them with a future. The batcher takes what is queued, waits
+    BATCH_DELAY for more to arrive and hands up to BATCH_ROWS operations to
+    commit (a coroutine taking the transactions) at once, then resolves the
+    futures, so each client gets its answer after its operations are saved.
+    """
+    # Сколько ждать новых запросов к пачке и сколько операций в ней самое большее
+    BATCH_DELAY = 0.005
+    BATCH_ROWS = 50000
+    # Самая длинная строка запроса (пачка операций в одной строке)
+    MAX_REQUEST = 64 * 1024 * 1024
+
+    def __init__(self, commit, address=DEFAULT_ADDRESS):
+        self.commit = commit
+        self.address = parse_address(address)
+        self.parser = TransactionParser()
+        self.rows = 0
+        self.batches = 0
+        self.loop = None
+        self.ready = threading.Event()
+        self.error = None
+        self.handlers = set()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.stopped = asyncio.Event()
+        if self.address[0] == "unix":
+            path = self.address[1]
+            # Сокет, оставшийся от прошлого запуска, мешает привязке
+            if os.path.exists(path):
+                os.remove(path)
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=self.MAX_REQUEST)
+        else:
+            kind, host, port = self.address
+            self.server = await asyncio.start_server(self.handle, host, port, limit=self.MAX_REQUEST)
+        self.batcher_task = asyncio.create_task(self.batcher())
+
+    async def serve(self):
+        """Serve until stop() is called"""
+        try:
+            await self.start()
+        except OSError as error:
+            self.error = error
+            raise
+        finally:
+            self.ready.set()
+        try:
+            await self.stopped.wait()
+        finally:
+            self.server.close()
+            self.batcher_task.cancel()
+            # Открытые подключения закрываются, и их обработчики выходят сами, а не отменой при остановке цикла
+            for writer, task in list(self.handlers):
+                writer.close()
+            if self.handlers:
+                await asyncio.wait([task for writer, task in self.handlers], timeout=1)
+            await self.server.wait_closed()
+            if self.address[0] == "unix" and os.path.exists(self.address[1]):
+                os.remove(self.address[1])
+
+    def stop(self):
+        """Stop serving; safe to call from any thread"""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def start_thread(self):
+        """Serve on a new daemon thread with its own event loop; raises OSError if the address is busy"""
+        thread = threading.Thread(target=self.run_thread, name="IngestServer", daemon=True)
+        thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            thread.join()
+            raise self.error
+        return thread
+
+    def run_thread(self):
+        try:
+            asyncio.run(self.serve())
+        except OSError:
+            # Ошибку привязки поднимает start_thread в вызвавшем потоке
+            pass
+
+    async def handle(self, reader, writer):
+        handler = (writer, asyncio.current_task())
+        self.handlers.add(handler)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(self.answer({"error": f"запрос длиннее {self.MAX_REQUEST} байт"}))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                try:
+                    transactions = self.parser.parse_request(line)
+                except ValueError as error:
+                    response = {"error": str(error)}
+                except Exception as error:
+                    # Разбор не должен обрывать подключение: на любой сбой клиент получает ответ
+                    response = {"error": f"некорректный запрос: {error!r}"}
+                else:
+                    future = self.loop.create_future()
+                    self.queue.put_nowait((transactions, future))
+                    try:
+                        response = {"accepted": await future}
+                    except Exception as error:
+                        response = {"error": f"не удалось сохранить: {error}"}
+                writer.write(self.answer(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.handlers.discard(handler)
+            writer.close()
+
+    def answer(self, response):
+        return json.dumps(response, ensure_ascii=False).encode() + b"\n"
+
+    async def batcher(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Пока идёт ожидание, к пачке успевают присоединиться запросы других подключений
+            await asyncio.sleep(self.BATCH_DELAY)
+            rows = len(batch[0][0])
+            while rows < self.BATCH_ROWS and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                rows += len(batch[-1][0])
+
+            try:
+                await self.commit(list(chain.from_iterable(transactions for transactions, future in batch)))
+            except Exception as error:
+                if len(batch) == 1:
+                    self.settle(batch, error)
+                    continue
+                # Пачка не сохраняется целиком: запросы сохраняются по одному, и ошибку получает только тот,
+                # из-за которого она не сохранилась
+                for request in batch:
+                    try:
+                        await self.commit(request[0])
+                    except Exception as error:
+                        self.settle([request], error)
+                    else:
+                        self.settle([request])
+                continue
+            self.settle(batch)
+
+    def settle(self, batch, error=None):
+        """Answer the requests of a batch: the number of saved operations of each, or the error"""
+        if error is None:
+            self.rows += sum(len(transactions) for transactions, future in batch)
+            self.batches += 1
+        for transactions, future in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(len(transactions))
+            else:
+                future.set_exception(error)
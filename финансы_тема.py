@@ -0,0 +1,305 @@
+"""Оформление окна финансового менеджера.
+
+Цвета, шрифты и таблица стилей считаются здесь один раз. Виджеты окна
+не задают свои стили, а получают имя объекта (setObjectName) или
+свойства role и category, по которым их находит общая таблица стилей
+приложения: Qt разбирает её один раз при apply_theme(), а не на каждый
+созданный виджет.
+"""
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QFont, QPalette
+
+
+CATEGORY_COLORS = {
+    "Доходы": "#4CAF50",  # Green
+    "Расходы": "#F44336",  # Red
+    "Сбережения": "#2196F3",  # Blue
+    "Благотворительность": "#9C27B0",  # Purple
+    "Кредиты": "#FF9800"  # Orange
+}
+
+SUBCATEGORY_COLORS = {
+    "Зарплата": "#388E3C",
+    "Подарок": "#81C784",
+    "Прочее": "#A5D6A7",
+    "Транспорт": "#E53935",
+    "Продукты": "#EF5350",
+    "Развлечения": "#FFCDD2"
+}
+
+# Графики кредитов на диаграмме категории «Кредиты»: столбцы процентов и погашения, линия остатка долга
+LOAN_COLORS = {
+    "Проценты": "#E65100",
+    "Основной долг": "#FFCC80",
+    "Остаток долга": "#5D4037"
+}
+
+# Линия месячного бюджета поверх столбцов расходов и столбцы расходов подкатегорий, у которых есть бюджет
+BUDGET_COLOR = "#37474F"
+BUDGETED_COLOR = "#EF9A9A"
+
+# Круглые кнопки слева: категории, общая диаграмма и совет
+BUTTON_COLORS = dict(CATEGORY_COLORS, Общая="#607D8B", Совет="#FFC107")
+
+# Кнопки нижней панели: цвет и цвет при наведении
+ADD_BUTTON_COLORS = {
+    "Доходы": ("#4CAF50", "#45a049"),
+    "Расходы": ("#F44336", "#d32f2f"),
+    "Сбережения": ("#2196F3", "#1976D2"),
+    "Благотворительность": ("#9C27B0", "#7B1FA2"),
+    "Кредиты": ("#FF9800", "#F57C00"),
+    "Импорт": ("#607D8B", "#455A64"),
+    "Экспорт": ("#795548", "#5D4037")
+}
+
+ERROR_COLOR = "#F44336"
+SUCCESS_COLOR = "#2E7D32"
+WARNING_COLOR = "#EF6C00"
+
+
+def adjust_color(color, amount):
+    """Make color lighter or darker"""
+    r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+    r = min(255, max(0, r + amount))
+    g = min(255, max(0, g + amount))
+    b = min(255, max(0, b + amount))
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+# Готовые QColor для диаграмм и таблицы истории
+BAR_COLORS = {category: QColor(color) for category, color in dict(CATEGORY_COLORS, **LOAN_COLORS, **{
+    "Бюджет": BUDGET_COLOR, "Расходы с бюджетом": BUDGETED_COLOR}).items()}
+DEFAULT_BAR_COLOR = QColor("#646464")
+SLICE_COLORS = {subcategory: QColor(color) for subcategory, color in SUBCATEGORY_COLORS.items()}
+DEFAULT_SLICE_COLOR = QColor("#c8c8c8")
+ROW_COLORS = {
+    "Доходы": QColor("#4CAF50").lighter(180),
+    "Расходы": QColor("#F44336").lighter(180)
+}
+DEFAULT_ROW_COLOR = QColor("#2196F3").lighter(180)
+TRANSPARENT = QColor(Qt.transparent)
+
+# Шрифты создаются при первом запросе: до QApplication их не из чего собрать
+_fonts = {}
+
+
+def title_font(size):
+    """Bold Arial of the given size for chart titles, shared between charts"""
+    if size not in _fonts:
+        _fonts[size] = QFont("Arial", size, QFont.Bold)
+    return _fonts[size]
+
+
+PALETTE_COLORS = [
+    (QPalette.Window, QColor("#f0f0f0")),
+    (QPalette.WindowText, QColor(Qt.black)),
+    (QPalette.Base, QColor("#ffffff")),
+    (QPalette.AlternateBase, QColor("#f5f5f5")),
+    (QPalette.ToolTipBase, QColor(Qt.white)),
+    (QPalette.ToolTipText, QColor(Qt.black)),
+    (QPalette.Text, QColor(Qt.black)),
+    (QPalette.Button, QColor("#e0e0e0")),
+    (QPalette.ButtonText, QColor(Qt.black)),
+    (QPalette.BrightText, QColor(Qt.red)),
+    (QPalette.Highlight, QColor("#4CAF50")),
+    (QPalette.HighlightedText, QColor(Qt.white))
+]
+
+STYLESHEET = """
+#topPanel, #bottomPanel {
+    background-color: white;
+    border-radius: 10px;
+}
+#buttonsPanel {
+    background-color: #f9f9f9;
+    border-radius: 10px;
+}
+#summaryPanel {
+    background-color: #f5f5f5;
+    border-radius: 5px;
+}
+
+QPushButton[role="category"] {
+    color: white;
+    border-radius: 60px;
+    font-weight: bold;
+    font-size: 16px;
+    border: 2px solid #333;
+}
+QPushButton[role="category"]:hover {
+    border: 3px solid #333;
+}
+
+QPushButton[role="add"] {
+    color: white;
+    padding: 12px;
+    font-size: 14px;
+    font-weight: bold;
+    border-radius: 5px;
+    border: none;
+    min-width: 120px;
+}
+
+QPushButton[role="primary"] {
+    background-color: #4CAF50;
+    color: white;
+    padding: 8px;
+    border-radius: 4px;
+    font-weight: bold;
+}
+QPushButton[role="primary"]:hover {
+    background-color: #45a049;
+}
+
+QTabWidget::pane {
+    border: 1px solid #ddd;
+    border-radius: 5px;
+    background: white;
+}
+QTabBar::tab {
+    padding: 8px 15px;
+    background: #f1f1f1;
+    border: 1px solid #ddd;
+    border-bottom: none;
+    border-top-left-radius: 5px;
+    border-top-right-radius: 5px;
+}
+QTabBar::tab:selected {
+    background: white;
+    border-bottom: 1px solid white;
+    margin-bottom: -1px;
+}
+
+QLabel[role="title"] {
+    font-size: 20px;
+    font-weight: bold;
+    color: #333;
+    margin-bottom: 15px;
+}
+QLabel#chartTitle {
+    margin-bottom: 10px;
+}
+QLabel#totalLabel {
+    font-size: 16px;
+    font-weight: bold;
+    color: #555;
+}
+QLabel#totalAmount {
+    font-size: 24px;
+    color: #4e54c8;
+    font-weight: bold;
+}
+
+QGraphicsView, QGraphicsView QWidget {
+    background: transparent;
+}
+
+QTableView#transactionsTable {
+    border: 1px solid #ddd;
+    border-radius: 5px;
+    background: white;
+}
+QTableView#transactionsTable QHeaderView::section {
+    background-color: #f1f1f1;
+    padding: 5px;
+    border: none;
+}
+QLineEdit[invalid="true"] {
+    border: 1px solid %(error)s;
+}
+
+#addMoneyWindow, #loansWindow, #recurringWindow {
+    background-color: #f5f5f5;
+}
+#addMoneyWindow QPlainTextEdit {
+    padding: 4px;
+    border: 1px solid #ccc;
+    border-radius: 4px;
+    font-size: 14px;
+}
+#addMoneyWindow QDateEdit, #addMoneyWindow QComboBox,
+#loansWindow QLineEdit, #loansWindow QDateEdit, #loansWindow QComboBox,
+#loansWindow QSpinBox, #loansWindow QDoubleSpinBox,
+#recurringWindow QLineEdit, #recurringWindow QDateEdit, #recurringWindow QComboBox, #recurringWindow QSpinBox {
+    padding: 6px;
+    border: 1px solid #ccc;
+    border-radius: 4px;
+    font-size: 14px;
+}
+#addMoneyWindow QPushButton[role="primary"], #loansWindow QPushButton[role="primary"],
+#recurringWindow QPushButton[role="primary"] {
+    padding: 10px;
+    border-radius: 5px;
+    border: none;
+    font-size: 14px;
+}
+QLabel#formStatus {
+    color: %(success)s;
+}
+QLabel#formStatus[error="true"] {
+    color: %(error)s;
+}
+QLabel#budgetAlert {
+    color: %(error)s;
+    font-weight: bold;
+    padding: 0 8px;
+}
+QLabel#budgetAlert[warning="true"] {
+    color: %(warning)s;
+}
+
+QLabel#tipLabel {
+    font-size: 14px;
+    color: #333;
+}
+
+QLabel#profilerOverlay {
+    background-color: rgba(0, 0, 0, 180);
+    color: #e0e0e0;
+    font-family: monospace;
+    font-size: 11px;
+    padding: 8px;
+    border-radius: 6px;
+}
+""" % {"error": ERROR_COLOR, "success": SUCCESS_COLOR, "warning": WARNING_COLOR}
+
+# Цвета по категориям дописываются к общим правилам кнопок
+STYLESHEET += "".join(f"""
+QPushButton[role="category"][category="{category}"] {{
+    background-color: {color};
+}}
+QPushButton[role="category"][category="{category}"]:hover {{
+    background-color: {adjust_color(color, 20)};
+}}
+""" for category, color in BUTTON_COLORS.items())
+
+STYLESHEET += "".join(f"""
+QPushButton[role="add"][category="{category}"] {{
+    background-color: {color};
+}}
+QPushButton[role="add"][category="{category}"]:hover {{
+    background-color: {hover};
+}}
+""" for category, (color, hover) in ADD_BUTTON_COLORS.items())
+
+
+def apply_theme(app):
+    """Install the palette and the stylesheet on the application once"""
+    if app.property("theme_applied"):
+        return
+    palette = QPalette()
+    for role, color in PALETTE_COLORS:
+        palette.setColor(role, color)
+    app.setPalette(palette)
+    app.setStyleSheet(STYLESHEET)
+    app.setProperty("theme_applied", True)
+
+
+def set_flag(widget, name, value):
+    """Set a boolean property the stylesheet matches on and restyle the widget if it changed"""
+    if bool(widget.property(name)) == value:
+        return
+    widget.setProperty(name, value)
+    # Qt не пересчитывает стиль сам при смене динамического свойства
+    widget.style().unpolish(widget)
+    widget.style().polish(widget)
@@ -0,0 +1,2461 @@
+"""Ядро финансового менеджера без Qt.
+
+Модель данных (журнал операций, итоги по дням, месяцам и годам, правила
+распределения, импорт выписок) импортируется без PyQt5 и годится для
+пакетных скриптов, консоли и серверного процесса. Окно приложения
+живёт в финансы_окно.py.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import bisect
+import struct
+import calendar
+import pathlib
+import sqlite3
+import decimal
+import datetime
+import functools
+import threading
+from array import array
+from collections import namedtuple, deque, defaultdict
+from itertools import compress, accumulate, chain, repeat, filterfalse
+
+# NumPy необязателен: с ним графики всех кредитов считаются одним проходом по массивам.
+# Его импорт дольше запуска всего ядра, поэтому он загружается при первом расчёте графиков (load_numpy)
+numpy = None
+_numpy_loaded = False
+
+
+# Файл с сохранёнными операциями
+LEDGER_PATH = os.path.join(os.path.expanduser("~"), ".финансы.sqlite3")
+
+MONTHS = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+          "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
+
+MONTHS_SHORT = ["Янв", "Фев", "Мар", "Апр", "Май", "Июн",
+                "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+
+QUARTERS = ["I", "II", "III", "IV"]
+
+# Шаг оси времени на диаграммах
+GRANULARITIES = ["Дни", "Недели", "Месяцы", "Кварталы", "Годы"]
+# Столбцы уже 10 пикселей на диаграмме не различить
+MIN_BAR_PIXELS = 10
+
+CATEGORIES = ["Доходы", "Расходы", "Сбережения", "Благотворительность", "Кредиты"]
+
+SUBCATEGORIES = {
+    "Доходы": ["Зарплата", "Подарок", "Прочее"],
+    "Расходы": ["Транспорт", "Продукты", "Развлечения", "Прочее"]
+}
+
+ALLOCATION_RULES_PATH = os.path.join(os.path.expanduser("~"), ".финансы_правила.json")
+
+# Правила автоматического распределения по умолчанию: 10% каждого дохода в сбережения, 5% на благотворительность.
+# Ключи правила: category - куда, source - из какой категории (по умолчанию доходы),
+# subcategories - только для этих подкатегорий источника, percent - доля в процентах,
+# fixed - фиксированная сумма в копейках, cap - не больше стольких копеек
+DEFAULT_ALLOCATION_RULES = [
+    {"category": "Сбережения", "percent": 10},
+    {"category": "Благотворительность", "percent": 5}
+]
+
+# Сумма операции (amount) везде хранится в копейках целым числом
+Transaction = namedtuple("Transaction", ["type", "category", "subcategory", "date", "amount"])
+
+# Распределённая часть операции: ссылка на исходную операцию (номер в той же пачке), категория и сумма.
+# Дата и подкатегория ("Автоначисление") берутся у источника, поэтому отдельной строкой не хранятся
+Allocation = namedtuple("Allocation", ["source", "category", "amount"])
+
+# Кредит: сумма в копейках, годовая ставка в процентах, срок в месяцах, вид платежа (LOAN_KINDS)
+# и дата первого платежа. Деньги выданы за месяц до неё, платежи идут в тот же день каждого месяца
+Loan = namedtuple("Loan", ["name", "principal", "rate", "term", "kind", "start"])
+LOAN_KINDS = ["Аннуитетный", "Дифференцированный"]
+
+# Повторяющаяся операция: тип, категория, подкатегория и сумма в копейках, как у Transaction, первая дата,
+# последняя дата (None - без конца) и шаг: каждые every дней, недель, месяцев или лет (RECURRENCE_UNITS).
+# Месячные и годовые повторы приходятся на день первой даты, в коротких месяцах на последний день месяца
+Recurrence = namedtuple("Recurrence", ["type", "category", "subcategory", "amount", "start", "end", "every", "unit"])
+RECURRENCE_UNITS = ["Дни", "Недели", "Месяцы", "Годы"]
+RECURRENCE_EVERY = {"Дни": "каждый день", "Недели": "каждую неделю", "Месяцы": "каждый месяц", "Годы": "каждый год"}
+RECURRENCE_SHORT = {"Дни": "дн.", "Недели": "нед.", "Месяцы": "мес.", "Годы": "г."}
+
+# Итог правки, удаления, отмены или повтора: изменения месяцев загруженного года
+# (как у Finances.commit) и строки истории, которые стали видны и которые скрыты
+Change = namedtuple("Change", ["deltas", "shown", "hidden"])
+
+# Месячные бюджеты подкатегорий расходов: пороги в процентах лимита, о пересечении которых
+# сообщает BudgetIndex, и само сообщение (месяц с нуля, суммы в копейках)
+BUDGET_THRESHOLDS = [80, 100]
+BudgetAlert = namedtuple("BudgetAlert", ["subcategory", "year", "month", "spent", "limit", "threshold"])
+
+
+class Profiler:
+    """Low-overhead timers and counters for hot paths, off by default.
+
+    Functions wrapped with profiled() check one attribute while profiling
+    is disabled. When enabled, every call is added to per-name statistics
+    (count, total, maximum, last duration in ns) and to a bounded list of
+    events that dump() writes as a Chrome trace (chrome://tracing, Perfetto).
+    """
+    MAX_EVENTS = 200000
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.counters = {}
+        self.events = deque(maxlen=self.MAX_EVENTS)
+        self.started = time.perf_counter_ns()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.stats = {}
+        self.counters = {}
+        self.events.clear()
+
+    def record(self, name, start, end):
+        duration = end - start
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0, 0, 0]
+        stat[0] += 1
+        stat[1] += duration
+        stat[2] = max(stat[2], duration)
+        stat[3] = duration
+        self.events.append((name, start, duration, threading.get_ident()))
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def span(self, name):
+        """Context manager timing a block; does nothing while disabled"""
+        return ProfilerSpan(self, name) if self.enabled else NULL_SPAN
+
+    def summary(self):
+        """(name, count, mean ms, max ms, last ms) sorted by total time, slowest first"""
+        rows = [(name, count, total / count / 1e6, maximum / 1e6, last / 1e6, total)
+                for name, (count, total, maximum, last) in self.stats.items()]
+        rows.sort(key=lambda row: -row[-1])
+        return [row[:-1] for row in rows]
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = [{"name": name, "cat": "финансы", "ph": "X", "ts": (start - self.started) / 1000,
+                   "dur": duration / 1000, "pid": pid, "tid": tid}
+                  for name, start, duration, tid in list(self.events)]
+        now = (time.perf_counter_ns() - self.started) / 1000
+        events.extend({"name": name, "ph": "C", "ts": now, "pid": pid, "args": {name: value}}
+                      for name, value in self.counters.items())
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.chrome_trace(), file, ensure_ascii=False)
+
+
+class ProfilerSpan:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+# Общий профилировщик приложения: включается оверлеем окна или переменной FINANCES_TRACE
+PROFILER = Profiler()
+
+
+def profiled(name):
+    """Decorator timing every call of a function with PROFILER under the given name"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.record(name, start, time.perf_counter_ns())
+        return wrapper
+    return decorator
+
+
+# Самая большая сумма, которую SQLite хранит в INTEGER (int64)
+MAX_KOPECKS = 2 ** 63 - 1
+
+MONEY_PATTERN = re.compile(r"([+-]?)(\d+)(?:\.(\d{1,2}))?$")
+
+
+def parse_money(text):
+    """Kopecks from a ruble amount like "1 234,56 ₽"; fractions of a kopeck are rounded half up.
+
+    Raises ValueError on anything else, including amounts SQLite cannot store (beyond MAX_KOPECKS).
+    """
+    text = text.replace("\xa0", "").replace(" ", "").replace("₽", "").replace(",", ".")
+    # Обычная запись вида -123.45 разбирается без Decimal
+    match = MONEY_PATTERN.match(text)
+    if match is not None:
+        sign, rubles, kopecks = match.groups()
+        amount = int(rubles) * 100 + int(kopecks.ljust(2, "0") if kopecks else 0)
+        amount = -amount if sign == "-" else amount
+    else:
+        try:
+            rubles = decimal.Decimal(text)
+            if not rubles.is_finite():
+                raise ValueError(f"Некорректная сумма: {text!r}")
+            amount = int((rubles * 100).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP))
+        except decimal.DecimalException:
+            # Например 1e30: копейки не помещаются в точность Decimal
+            raise ValueError(f"Некорректная сумма: {text!r}")
+    if abs(amount) > MAX_KOPECKS:
+        raise ValueError(f"Слишком большая сумма: {text!r}")
+    return amount
+
+
+def format_money(kopecks):
+    """Kopecks as rubles for display, e.g. 123456 -> 1 234,56 ₽"""
+    sign = "-" if kopecks < 0 else ""
+    rubles, kopecks = divmod(abs(kopecks), 100)
+    return f"{sign}{rubles:,}".replace(",", " ") + f",{kopecks:02d} ₽"
+
+
+def allocate(kopecks, percents):
+    """Split kopecks into parts proportional to percents, summing exactly to kopecks.
+
+    Every part is first rounded down; the kopecks left over go one each to
+    the parts with the largest dropped fractions, earlier parts first on a
+    tie, so the same amount always splits the same way.
+    """
+    total = sum(percents)
+    parts = [kopecks * percent // total for percent in percents]
+    fractions = [kopecks * percent % total for percent in percents]
+    order = sorted(range(len(percents)), key=lambda index: -fractions[index])
+    for index in order[:kopecks - sum(parts)]:
+        parts[index] += 1
+    return parts
+
+
+def date_key(date):
+    """Date packed into an int as YYYYMMDD"""
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def key_date(key):
+    return datetime.date(key // 10000, key // 100 % 100, key % 100)
+
+
+def day_of_year(date):
+    """Zero-based index of the date within its year"""
+    return date.toordinal() - datetime.date(date.year, 1, 1).toordinal()
+
+
+def bucket_start(date, granularity):
+    """First day of the day, week (from Monday), month, quarter or year holding the date"""
+    if granularity == "Дни":
+        return date
+    if granularity == "Недели":
+        return date - datetime.timedelta(days=date.weekday())
+    if granularity == "Месяцы":
+        return date.replace(day=1)
+    if granularity == "Кварталы":
+        return datetime.date(date.year, (date.month - 1) // 3 * 3 + 1, 1)
+    return datetime.date(date.year, 1, 1)
+
+
+def next_bucket(start, granularity):
+    if granularity == "Дни":
+        return start + datetime.timedelta(days=1)
+    if granularity == "Недели":
+        return start + datetime.timedelta(days=7)
+    if granularity == "Годы":
+        return datetime.date(start.year + 1, 1, 1)
+    month = start.month - 1 + (1 if granularity == "Месяцы" else 3)
+    return datetime.date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def period_buckets(first, last, granularity):
+    """(first day, last day, axis label) of every bucket covering first..last, clipped to that range"""
+    buckets = []
+    start = bucket_start(first, granularity)
+    several_years = first.year != last.year
+    while start <= last:
+        following = next_bucket(start, granularity)
+        bucket_first, bucket_last = max(start, first), min(following - datetime.timedelta(days=1), last)
+        suffix = f" {start.year}" if several_years else ""
+        if granularity in ["Дни", "Недели"]:
+            label = f"{bucket_first:%d.%m.%y}" if several_years else f"{bucket_first:%d.%m}"
+        elif granularity == "Месяцы":
+            label = f"{MONTHS_SHORT[start.month - 1]}{suffix}"
+        elif granularity == "Кварталы":
+            label = f"{QUARTERS[(start.month - 1) // 3]} кв.{suffix}"
+        else:
+            label = str(start.year)
+        buckets.append((bucket_first, bucket_last, label))
+        start = following
+    return buckets
+
+
+def period_labels(start, end, granularity):
+    """Axis labels for the years start..end at the given granularity"""
+    return [label for first, last, label in
+            period_buckets(datetime.date(start, 1, 1), datetime.date(end, 12, 31), granularity)]
+
+
+def bucket_count(first, last, granularity):
+    """Number of buckets period_buckets would return, without building them"""
+    if granularity == "Дни":
+        return (last - first).days + 1
+    if granularity == "Недели":
+        return (bucket_start(last, granularity) - bucket_start(first, granularity)).days // 7 + 1
+    if granularity == "Месяцы":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    if granularity == "Кварталы":
+        return (last.year - first.year) * 4 + (last.month - 1) // 3 - (first.month - 1) // 3 + 1
+    return last.year - first.year + 1
+
+
+def load_numpy():
+    """The numpy module, imported on the first call, or None when it is not installed"""
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+def choose_granularity(first, last, width, finest=GRANULARITIES[0]):
+    """Finest granularity, not finer than finest, that fits first..last into width pixels.
+
+    Every bar gets at least MIN_BAR_PIXELS, so a chart never holds more than
+    width / MIN_BAR_PIXELS bars however long the range and however many
+    transactions it has; years are the coarsest level.
+    """
+    limit = max(1, width // MIN_BAR_PIXELS)
+    for granularity in GRANULARITIES[GRANULARITIES.index(finest):]:
+        if bucket_count(first, last, granularity) <= limit:
+            return granularity
+    return GRANULARITIES[-1]
+
+
+class AllocationRules:
+    """Auto-allocation rules compiled into one evaluator per source.
+
+    Rules are plain dicts (see DEFAULT_ALLOCATION_RULES). For every
+    (category, subcategory) of a source transaction the matching rules are
+    compiled once into a function from an amount in kopecks to the parts
+    it allocates. Percentage shares are split with allocate(), caps and
+    fixed sums are applied in rule order, and the parts never exceed the
+    source amount.
+    """
+    KEYS = {"category", "source", "subcategories", "percent", "fixed", "cap"}
+
+    def __init__(self, rules):
+        self.rules = [self.check(rule) for rule in rules]
+        self.evaluators = {}
+
+    def check(self, rule):
+        unknown = set(rule) - self.KEYS
+        if unknown:
+            raise ValueError(f"Неизвестные поля правила: {', '.join(sorted(unknown))}")
+        if rule.get("category") not in CATEGORIES:
+            raise ValueError(f"Неизвестная категория правила: {rule.get('category')}")
+        if rule["category"] in SUBCATEGORIES:
+            # Распределённые суммы идут в подкатегорию «Автоначисление», которой у доходов и расходов нет
+            raise ValueError(f"Распределять можно только в категории без подкатегорий, не в {rule['category']}")
+        if ("percent" in rule) == ("fixed" in rule):
+            raise ValueError("В правиле нужна либо доля percent, либо сумма fixed")
+
+        for key in ["fixed", "cap"]:
+            if key in rule and not (isinstance(rule[key], int) and rule[key] >= 0):
+                raise ValueError(f"{key} задаётся целым числом копеек не меньше нуля")
+
+        rule = dict(rule)
+        rule.setdefault("source", "Доходы")
+        if "percent" in rule:
+            # Доли храним в сотых процента, чтобы делить целыми числами
+            rule["percent"] = int(decimal.Decimal(str(rule["percent"])) * 100)
+            if not 0 <= rule["percent"] <= 10000:
+                raise ValueError(f"Доля вне 0..100%: {rule['percent'] / 100}")
+        return rule
+
+    def evaluator(self, category, subcategory):
+        key = (category, subcategory)
+        if key not in self.evaluators:
+            self.evaluators[key] = self.compile([
+                rule for rule in self.rules
+                if rule["source"] == category and subcategory in rule.get("subcategories", [subcategory])])
+        return self.evaluators[key]
+
+    def compile(self, rules):
+        if not rules:
+            return None
+
+        weights = [rule["percent"] for rule in rules if "percent" in rule]
+        if sum(weights) > 10000:
+            raise ValueError("Сумма долей правил больше 100%")
+        weights.append(10000 - sum(weights))
+        # Для каждого правила: номер доли в weights (или None для fixed), сумма fixed и потолок
+        steps = []
+        share = 0
+        for rule in rules:
+            if "percent" in rule:
+                steps.append((rule["category"], share, 0, rule.get("cap")))
+                share += 1
+            else:
+                steps.append((rule["category"], None, rule["fixed"], rule.get("cap")))
+
+        def evaluate(amount):
+            shares = allocate(amount, weights)
+            parts = []
+            rest = amount
+            for category, index, fixed, cap in steps:
+                part = fixed if index is None else shares[index]
+                if cap is not None:
+                    part = min(part, cap)
+                part = min(part, rest)
+                if part > 0:
+                    parts.append((category, part))
+                    rest -= part
+            return parts
+
+        return evaluate
+
+    def evaluate(self, transaction):
+        """(category, kopecks) parts allocated from one transaction"""
+        evaluate = self.evaluator(transaction.category, transaction.subcategory or "")
+        return evaluate(transaction.amount) if evaluate and transaction.amount > 0 else []
+
+    def allocate(self, transactions):
+        """Allocations of a batch; the source of each is its index in transactions.
+
+        Evaluators are looked up once per (category, subcategory) and their
+        parts cached per distinct amount: statements repeat the same sums a
+        lot, so most rows cost two dict lookups.
+        """
+        evaluators = {}
+        cache = {}
+        allocations = []
+        append = allocations.append
+        for index, (type, category, subcategory, date, amount) in enumerate(transactions):
+            key = (category, subcategory or "")
+            evaluate = evaluators.get(key, False)
+            if evaluate is False:
+                evaluate = evaluators[key] = self.evaluator(*key)
+            if evaluate is None or amount <= 0:
+                continue
+
+            parts = cache.get((evaluate, amount))
+            if parts is None:
+                parts = cache[(evaluate, amount)] = evaluate(amount)
+            # Простые кортежи той же формы, что Allocation: на миллионах строк namedtuple заметно дороже
+            for target, part in parts:
+                append((index, target, part))
+        return allocations
+
+
+def load_allocation_rules(path=ALLOCATION_RULES_PATH):
+    """Rules from a JSON list in the given file, or the defaults when there is none"""
+    if not os.path.exists(path):
+        return AllocationRules(DEFAULT_ALLOCATION_RULES)
+    with open(path, encoding="utf-8") as file:
+        return AllocationRules(json.load(file))
+
+
+def aggregate_deltas(transactions, allocations=()):
+    """Amounts summed per (category, subcategory, year, month, day of year), ready for BucketIndex.apply"""
+    deltas = {}
+    year_starts = {}
+    for transaction in transactions:
+        date = transaction.date
+        if date.year not in year_starts:
+            year_starts[date.year] = datetime.date(date.year, 1, 1).toordinal()
+        key = (transaction.category, transaction.subcategory or None, date.year, date.month - 1,
+               date.toordinal() - year_starts[date.year])
+        deltas[key] = deltas.get(key, 0) + transaction.amount
+    for source, category, amount in allocations:
+        date = transactions[source].date
+        key = (category, "Автоначисление", date.year, date.month - 1, day_of_year(date))
+        deltas[key] = deltas.get(key, 0) + amount
+    return tuple(deltas.items())
+
+
+class TransactionStore:
+    """Columnar transaction history.
+
+    Type, category and subcategory are interned into one small string table
+    and stored as int8 codes next to an int32 YYYYMMDD date and an int64
+    amount in kopecks, so a row takes 15 bytes instead of a five-key dict.
+    Sums over the amounts column are exact.
+
+    Auto-allocations live in three more columns (source row, category code,
+    amount; 13 bytes each) sorted by source row, instead of full rows.
+    Deleted rows stay in the columns and are listed in the deleted set.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self.codes = {}
+
+        self.types = array("b")
+        self.categories = array("b")
+        self.subcategories = array("b")
+        self.dates = array("i")
+        self.amounts = array("q")
+
+        self.allocation_sources = array("i")
+        self.allocation_categories = array("b")
+        self.allocation_amounts = array("q")
+
+        self.deleted = set()
+
+    def intern(self, text):
+        text = text or ""
+        code = self.codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            if code > 127:
+                raise ValueError("Слишком много различных категорий в истории")
+            self.strings.append(text)
+            self.codes[text] = code
+        return code
+
+    def append(self, type, category, subcategory, date, amount):
+        self.types.append(self.intern(type))
+        self.categories.append(self.intern(category))
+        self.subcategories.append(self.intern(subcategory))
+        self.dates.append(date_key(date))
+        self.amounts.append(amount)
+        return len(self.amounts) - 1
+
+    def extend(self, transactions, allocations=(), deleted=()):
+        """Append rows; deleted holds the positions among them of rows already deleted"""
+        first = len(self)
+        for transaction in transactions:
+            self.append(*transaction)
+        self.deleted.update(first + position for position in deleted)
+        for source, category, amount in allocations:
+            self.allocation_sources.append(first + source)
+            self.allocation_categories.append(self.intern(category))
+            self.allocation_amounts.append(amount)
+
+    def allocations_of(self, row):
+        """(category, kopecks) parts allocated from a row"""
+        start = bisect.bisect_left(self.allocation_sources, row)
+        stop = bisect.bisect_right(self.allocation_sources, row, start)
+        strings = self.strings
+        return [(strings[category], amount) for category, amount in
+                zip(self.allocation_categories[start:stop], self.allocation_amounts[start:stop])]
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return self.slice(*row.indices(len(self))[:2])
+
+        strings = self.strings
+        return Transaction(strings[self.types[row]], strings[self.categories[row]],
+                           strings[self.subcategories[row]], key_date(self.dates[row]), self.amounts[row])
+
+    def slice(self, start, stop):
+        strings = self.strings
+        return [Transaction(strings[t], strings[c], strings[s], key_date(d), a)
+                for t, c, s, d, a in zip(self.types[start:stop], self.categories[start:stop],
+                                         self.subcategories[start:stop], self.dates[start:stop],
+                                         self.amounts[start:stop])]
+
+    def __iter__(self):
+        strings = self.strings
+        for t, c, s, d, a in zip(self.types, self.categories, self.subcategories, self.dates, self.amounts):
+            yield Transaction(strings[t], strings[c], strings[s], key_date(d), a)
+
+    def nbytes(self):
+        columns = [self.types, self.categories, self.subcategories, self.dates, self.amounts,
+                   self.allocation_sources, self.allocation_categories, self.allocation_amounts]
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def mask(self, column, text):
+        """Iterator of booleans: which rows have the given string in the column"""
+        code = self.codes.get(text or "")
+        if code is None:
+            return iter(())
+        return map(code.__eq__, column)
+
+    def total(self, category=None, subcategory=None):
+        amounts = self.amounts
+        if category is not None:
+            amounts = compress(amounts, self.mask(self.categories, category))
+        if subcategory is not None:
+            amounts = compress(amounts, self.mask(self.subcategories, subcategory))
+
+        allocated = 0
+        if subcategory in (None, "Автоначисление"):
+            allocations = self.allocation_amounts
+            if category is not None:
+                allocations = compress(allocations, self.mask(self.allocation_categories, category))
+            allocated = sum(allocations)
+        return sum(amounts) + allocated
+
+    def totals_by_month(self, category, year, subcategory=None):
+        totals = [0] * 12
+        rows = self.mask(self.categories, category)
+        if subcategory is not None:
+            rows = map(bool.__and__, rows, self.mask(self.subcategories, subcategory))
+        for key, amount in compress(zip(self.dates, self.amounts), rows):
+            if key // 10000 == year:
+                totals[key // 100 % 100 - 1] += amount
+
+        if subcategory in (None, "Автоначисление"):
+            dates = self.dates
+            rows = self.mask(self.allocation_categories, category)
+            for source, amount in compress(zip(self.allocation_sources, self.allocation_amounts), rows):
+                key = dates[source]
+                if key // 10000 == year:
+                    totals[key // 100 % 100 - 1] += amount
+        return totals
+
+
+class HistoryIndex:
+    """Secondary indexes over a TransactionStore for filtering and sorting.
+
+    Row ids of every type, category and subcategory code and of every month
+    are kept in ascending arrays, and the amount and date columns have
+    permutations of the row ids sorted by value. The indexes follow the
+    store incrementally: a query first indexes the rows appended since the
+    previous one. A query starts from its most selective index and checks
+    the other conditions on those rows alone, so a narrow filter never scans
+    the history; sorting reuses a permutation or sorts just the matches.
+    """
+    COLUMNS = ["types", "categories", "subcategories"]
+    # Столбцы таблицы истории по порядку; по распределённым суммам не сортируется
+    SORT_COLUMNS = ["types", "categories", "subcategories", "dates", "amounts"]
+    # Столько новых строк вставляется в перестановку по одной, больше - слиянием
+    INSERT_LIMIT = 64
+
+    def __init__(self, store):
+        self.store = store
+        self.indexed = 0
+        self.postings = {column: defaultdict(lambda: array("i")) for column in self.COLUMNS}
+        self.months = defaultdict(lambda: array("i"))
+        self.orders = {}
+
+    def update(self):
+        """Index the rows appended to the store since the last call"""
+        start, stop = self.indexed, len(self.store)
+        if start == stop:
+            return
+
+        for column in self.COLUMNS:
+            postings = self.postings[column]
+            for row, code in enumerate(getattr(self.store, column)[start:stop], start):
+                postings[code].append(row)
+        months = self.months
+        for row, key in enumerate(self.store.dates[start:stop], start):
+            months[key // 100].append(row)
+        self.indexed = stop
+
+    def order(self, column):
+        """Row ids sorted by the values of a column, equal values in row order"""
+        values = getattr(self.store, column)
+        order, covered = self.orders.get(column, (array("i"), 0))
+        if covered < len(values):
+            if len(values) - covered <= self.INSERT_LIMIT:
+                for row in range(covered, len(values)):
+                    bisect.insort_right(order, row, key=values.__getitem__)
+            elif not covered:
+                order = array("i", sorted(range(len(values)), key=values.__getitem__))
+            else:
+                # Timsort сливает упорядоченную часть с отсортированными новыми строками за один проход
+                added = sorted(range(covered, len(values)), key=values.__getitem__)
+                order = array("i", sorted(chain(order, added), key=values.__getitem__))
+            self.orders[column] = (order, len(values))
+        return order
+
+    def month_keys(self):
+        """YYYYMM keys of the months that have rows"""
+        self.update()
+        return sorted(self.months)
+
+    def amount_rows(self, low, high):
+        order = self.order("amounts")
+        amount = self.store.amounts.__getitem__
+        start = 0 if low is None else bisect.bisect_left(order, low, key=amount)
+        stop = len(order) if high is None else bisect.bisect_right(order, high, key=amount)
+        return order[start:stop]
+
+    def query(self, type=None, category=None, subcategory=None, month=None, low=None, high=None, text="",
+              sort=None):
+        """Row ids matching every given condition, ordered by the sort column or by row.
+
+        month is a YYYYMM key, low and high bound the amount in kopecks, text
+        is looked for in the names of the row or taken as an exact amount.
+        Deleted rows are left out.
+        """
+        rows = self.match(type, category, subcategory, month, low, high, text, sort)
+        deleted = self.store.deleted
+        if not deleted:
+            return rows
+        # Удалённых мало: индексы их не исключают, строки отсеиваются в конце одним проходом на C
+        return array("i", filterfalse(deleted.__contains__, rows))
+
+    def match(self, type=None, category=None, subcategory=None, month=None, low=None, high=None, text="",
+              sort=None):
+        """query() over every row of the store, deleted ones included"""
+        self.update()
+        store = self.store
+        types, categories, subcategories, amounts = store.types, store.categories, store.subcategories, store.amounts
+
+        # Кандидаты от каждого условия: (строки, по какому столбцу упорядочены или None - по номеру,
+        # отбор из чужих кандидатов тех строк, что подходят под это условие)
+        sources = []
+        for column, value in [("types", type), ("categories", category), ("subcategories", subcategory)]:
+            if value is not None:
+                code = store.codes.get(value)
+                if code not in self.postings[column]:
+                    return array("i")
+                sources.append((self.postings[column][code], None,
+                                lambda rows, column=column, code=code: self.keep_code(rows, column, code)))
+        if month is not None:
+            if month not in self.months:
+                return array("i")
+            sources.append((self.months[month], None, lambda rows: self.keep_values(
+                self.keep_values(rows, store.dates, (month * 100).__le__), store.dates, (month * 100 + 100).__gt__)))
+        if low is not None or high is not None:
+            def keep_amounts(rows):
+                if low is not None:
+                    rows = self.keep_values(rows, amounts, low.__le__)
+                if high is not None:
+                    rows = self.keep_values(rows, amounts, high.__ge__)
+                return rows
+            sources.append((self.amount_rows(low, high), "amounts", keep_amounts))
+        if text:
+            needle = text.casefold()
+            codes = {code for code, string in enumerate(store.strings) if needle in string.casefold()}
+            try:
+                amount = parse_money(text)
+            except ValueError:
+                amount = None
+            matched = set()
+            for column in self.COLUMNS:
+                for code in codes & self.postings[column].keys():
+                    matched.update(self.postings[column][code])
+            if amount is not None:
+                matched.update(self.amount_rows(amount, amount))
+            sources.append((array("i", sorted(matched)), None, lambda rows: array("i", filter(
+                lambda row: types[row] in codes or categories[row] in codes or subcategories[row] in codes
+                or amounts[row] == amount, rows))))
+
+        if not sources:
+            if sort is None:
+                return range(len(store))
+            if sort in ["dates", "amounts"]:
+                return array("i", self.order(sort))
+            # Без условий сортировка по названию - это списки строк кодов в алфавитном порядке
+            postings = self.postings[sort]
+            ranked = sorted(postings, key=store.strings.__getitem__)
+            return array("i", chain.from_iterable(postings[code] for code in ranked))
+
+        # Начинаем с самого узкого условия. При сортировке по сумме диапазон сумм уже упорядочен:
+        # если он ненамного шире, проверить его строки дешевле, чем потом сортировать совпавшие
+        sources.sort(key=lambda source: len(source[0]))
+        for source in sources:
+            if sort is not None and source[1] == sort and len(source[0]) <= 4 * len(sources[0][0]):
+                sources.remove(source)
+                sources.insert(0, source)
+                break
+        rows, ordered_by, keep = sources[0]
+        rows = array("i", rows)
+        for other_rows, other_ordered_by, other_keep in sources[1:]:
+            rows = other_keep(rows)
+
+        if ordered_by == sort:
+            return rows
+        if ordered_by is not None:
+            rows = array("i", sorted(rows))
+        if sort is None:
+            return rows
+        values = getattr(store, sort)
+        if sort in ["dates", "amounts"] and len(rows) * 2 > len(store):
+            # Совпала большая часть истории: дешевле пройти готовую перестановку, чем сортировать
+            order = self.order(sort)
+            return array("i", compress(order, map(self.mask(rows).__getitem__, order)))
+        if sort in ["dates", "amounts"]:
+            return array("i", sorted(rows, key=values.__getitem__))
+        rank = {code: position for position, code in
+                enumerate(sorted(range(len(store.strings)), key=store.strings.__getitem__))}
+        return array("i", sorted(rows, key=lambda row: rank[values[row]]))
+
+    def keep_code(self, rows, column, code):
+        """Rows whose column holds the code"""
+        # Маска по всему столбцу строится одним translate на C, дальше одна выборка на строку
+        table = bytes(value == code for value in range(256))
+        flags = getattr(self.store, column).tobytes().translate(table)
+        return array("i", compress(rows, map(flags.__getitem__, rows)))
+
+    def keep_values(self, rows, column, check):
+        """Rows whose column value passes check, a C-level predicate like (100).__le__"""
+        return array("i", compress(rows, map(check, map(column.__getitem__, rows))))
+
+    def mask(self, rows):
+        """bytearray of the store length with ones at the given rows"""
+        selected = bytearray(len(self.store))
+        # Запись идёт циклом map на C, без байткода на каждую строку
+        deque(map(selected.__setitem__, rows, repeat(1)), maxlen=0)
+        return selected
+
+
+class BucketIndex:
+    """Daily and monthly totals of every series, bucketed by year.
+
+    A series (a category, or a category with a subcategory) maps each year
+    to its 12 month values and its 366 day values. Quarters and year totals
+    are rolled up lazily, and so are running sums over the days, which give
+    the total of any date range (a week, a clipped month) in two lookups per
+    year. Both caches live until a day of that year changes, so a range query
+    never rescans transactions and costs the same at any history size.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.days = {}
+        self.rollups = {}
+
+    def add(self, category, subcategory, year, month, day, amount):
+        keys = [(category, None)]
+        if subcategory and category in SUBCATEGORIES:
+            keys.append((category, subcategory))
+
+        for key in keys:
+            months = self.buckets.setdefault(key, {}).setdefault(year, [0] * 12)
+            months[month] += amount
+            days = self.days.setdefault(key, {}).setdefault(year, [0] * 366)
+            days[day] += amount
+            self.rollups.pop(key + (year,), None)
+            self.rollups.pop(key + (year, "Дни"), None)
+
+    def apply(self, deltas):
+        for (category, subcategory, year, month, day), amount in deltas:
+            self.add(category, subcategory, year, month, day, amount)
+
+    def months(self, category, year, subcategory=None):
+        return self.buckets.get((category, subcategory), {}).get(year) or [0] * 12
+
+    def rollup(self, category, year, subcategory=None):
+        """Quarter totals and the year total of a series"""
+        key = (category, subcategory, year)
+        if key not in self.rollups:
+            months = self.months(category, year, subcategory)
+            quarters = [sum(months[i:i + 3]) for i in range(0, 12, 3)]
+            self.rollups[key] = (quarters, sum(quarters))
+        return self.rollups[key]
+
+    def range_total(self, category, first, last, subcategory=None):
+        """Total of a series over the days first..last"""
+        years = self.days.get((category, subcategory), {})
+        total = 0
+        for year in range(first.year, last.year + 1):
+            if year not in years:
+                continue
+
+            key = (category, subcategory, year, "Дни")
+            if key not in self.rollups:
+                self.rollups[key] = [0] + list(accumulate(years[year]))
+            running = self.rollups[key]
+            start = day_of_year(first) if year == first.year else 0
+            stop = day_of_year(last) + 1 if year == last.year else 366
+            total += running[stop] - running[start]
+        return total
+
+    def range_values(self, category, first, last, granularity, subcategory=None):
+        """Totals of a series per bucket of period_buckets(first, last, granularity)"""
+        return [self.range_total(category, bucket_first, bucket_last, subcategory)
+                for bucket_first, bucket_last, label in period_buckets(first, last, granularity)]
+
+    def values(self, category, start, end, granularity, subcategory=None):
+        if granularity in ["Дни", "Недели"]:
+            return self.range_values(category, datetime.date(start, 1, 1), datetime.date(end, 12, 31),
+                                     granularity, subcategory)
+
+        values = []
+        for year in range(start, end + 1):
+            if granularity == "Месяцы":
+                values.extend(self.months(category, year, subcategory))
+            elif granularity == "Кварталы":
+                values.extend(self.rollup(category, year, subcategory)[0])
+            else:
+                values.append(self.rollup(category, year, subcategory)[1])
+        return values
+
+    def total(self, category, start, end, subcategory=None):
+        return sum(self.rollup(category, year, subcategory)[1] for year in range(start, end + 1))
+
+    def years(self):
+        return sorted({year for years in self.buckets.values() for year in years})
+
+    def to_json(self, excluded=None):
+        """Rows for load(); the amounts of the excluded BucketIndex, if any, are left out"""
+        rows = []
+        for key, years in self.buckets.items():
+            for year, months in years.items():
+                days = self.days[key][year]
+                if excluded is not None and year in excluded.buckets.get(key, {}):
+                    months = [a - b for a, b in zip(months, excluded.buckets[key][year])]
+                    days = [a - b for a, b in zip(days, excluded.days[key][year])]
+                rows.append([key[0], key[1], year, months, days])
+        return rows
+
+    def load(self, rows):
+        for category, subcategory, year, months, days in rows:
+            self.buckets.setdefault((category, subcategory), {})[year] = months
+            self.days.setdefault((category, subcategory), {})[year] = days
+        self.rollups = {}
+
+
+class AggregateIndex:
+    """Totals over chart_data maintained incrementally.
+
+    Every change of a month value goes through add(), which also updates the
+    yearly total of the series, the stacked total of the month over all
+    categories and the maxima that the chart axes need. A maximum is only
+    recomputed (over 12 months) after the month holding it went down, so
+    removals and edits never leave it stale.
+    """
+    CATEGORIES = CATEGORIES
+
+    def __init__(self, chart_data):
+        self.chart_data = chart_data
+        self.rebuild()
+
+    def rebuild(self):
+        self.yearly = {}
+        self.maxima = {}
+        for category in self.CATEGORIES:
+            data = self.chart_data[category]
+            subcategories = [key for key in data if key != "total"] if isinstance(data, dict) else []
+            for subcategory in [None] + subcategories:
+                values = self.series(category, subcategory)
+                self.yearly[(category, subcategory)] = sum(values)
+                self.maxima[(category, subcategory)] = max(values)
+
+        self.stacked = [sum(self.series(category)[month] for category in self.CATEGORIES)
+                        for month in range(12)]
+        self.stacked_max = max(self.stacked)
+
+    def series(self, category, subcategory=None):
+        data = self.chart_data[category]
+        if isinstance(data, dict):
+            return data[subcategory or "total"]
+        return data
+
+    def add(self, category, month, amount, subcategory=None):
+        """Add amount (negative to remove) to the month of a category and its subcategory"""
+        self._add_to_series(category, None, month, amount)
+        if subcategory and isinstance(self.chart_data[category], dict):
+            self._add_to_series(category, subcategory, month, amount)
+
+        old = self.stacked[month]
+        self.stacked[month] = new = old + amount
+        if self.stacked_max is not None:
+            if new >= self.stacked_max:
+                self.stacked_max = new
+            elif old == self.stacked_max:
+                self.stacked_max = None
+
+    def remove(self, category, month, amount, subcategory=None):
+        self.add(category, month, -amount, subcategory)
+
+    def apply(self, deltas):
+        for (category, subcategory, month), amount in deltas:
+            self.add(category, month, amount, subcategory)
+
+    def edit(self, category, month, old_amount, new_amount, subcategory=None):
+        self.add(category, month, new_amount - old_amount, subcategory)
+
+    def _add_to_series(self, category, subcategory, month, amount):
+        key = (category, subcategory)
+        values = self.series(category, subcategory)
+        old = values[month]
+        values[month] = new = old + amount
+        self.yearly[key] += amount
+
+        maximum = self.maxima[key]
+        if maximum is not None:
+            if new >= maximum:
+                self.maxima[key] = new
+            elif old == maximum:
+                self.maxima[key] = None
+
+    def yearly_total(self, category, subcategory=None):
+        return self.yearly[(category, subcategory)]
+
+    def maximum(self, category, subcategory=None):
+        key = (category, subcategory)
+        if self.maxima[key] is None:
+            self.maxima[key] = max(self.series(category, subcategory))
+        return self.maxima[key]
+
+    def stacked_maximum(self):
+        if self.stacked_max is None:
+            self.stacked_max = max(self.stacked)
+        return self.stacked_max
+
+
+class BudgetIndex:
+    """Monthly budgets of the Расходы subcategories over the BucketIndex.
+
+    The spent amount of a month is the bucket BucketIndex already keeps up
+    to date, so the remaining budget costs one lookup. Each limit is turned
+    into its threshold amounts (BUDGET_THRESHOLDS percent of it) once, and
+    crossings() checks only the months a batch of deltas touched: spent
+    before and after the batch against two or three fixed amounts, no
+    matter how much history there is.
+    """
+    CATEGORY = "Расходы"
+
+    def __init__(self, buckets, limits=None):
+        self.buckets = buckets
+        self.limits = {}
+        self.levels = {}
+        for subcategory, limit in (limits or {}).items():
+            self.set_limit(subcategory, limit)
+
+    def set_limit(self, subcategory, limit):
+        """Set the monthly limit of a subcategory in kopecks; 0 removes the budget"""
+        if subcategory not in SUBCATEGORIES[self.CATEGORY]:
+            raise ValueError(f"У расходов нет подкатегории {subcategory}")
+        if limit < 0:
+            raise ValueError("Бюджет не может быть отрицательным")
+        if not limit:
+            self.limits.pop(subcategory, None)
+            self.levels.pop(subcategory, None)
+            return
+        self.limits[subcategory] = limit
+        self.levels[subcategory] = [(limit * percent // 100, percent) for percent in BUDGET_THRESHOLDS]
+
+    def limit(self, subcategory=None):
+        """Monthly limit of a subcategory, or the sum of all limits"""
+        if subcategory is None:
+            return sum(self.limits.values())
+        return self.limits.get(subcategory, 0)
+
+    def spent(self, subcategory, year, month):
+        return self.buckets.months(self.CATEGORY, year, subcategory)[month]
+
+    def remaining(self, subcategory, year, month):
+        """Budget left in a month (month from 0), negative when overspent"""
+        return self.limit(subcategory) - self.spent(subcategory, year, month)
+
+    def crossings(self, deltas):
+        """BudgetAlerts of thresholds the deltas (already in the buckets) pushed a month up through"""
+        if not self.limits:
+            return []
+        # Дельты одного месяца складываются: порог пересекает их сумма, а не каждая по отдельности
+        changed = {}
+        for (category, subcategory, year, month, day), amount in deltas:
+            if category == self.CATEGORY and subcategory in self.limits:
+                key = (subcategory, year, month)
+                changed[key] = changed.get(key, 0) + amount
+
+        alerts = []
+        for (subcategory, year, month), amount in changed.items():
+            after = self.spent(subcategory, year, month)
+            before = after - amount
+            crossed = [percent for level, percent in self.levels[subcategory] if before < level <= after]
+            if crossed:
+                alerts.append(BudgetAlert(subcategory, year, month, after, self.limits[subcategory], crossed[-1]))
+        return alerts
+
+    def range_limit(self, first, last, subcategory=None):
+        """Budget of the days first..last: the monthly limit, prorated by days in clipped months"""
+        limit = self.limit(subcategory)
+        if not limit:
+            return 0
+        total = 0
+        month = first.replace(day=1)
+        while month <= last:
+            days = calendar.monthrange(month.year, month.month)[1]
+            month_last = month.replace(day=days)
+            total += limit * ((min(last, month_last) - max(first, month)).days + 1) / days
+            month = month_last + datetime.timedelta(days=1)
+        return round(total)
+
+    def range_values(self, first, last, granularity, subcategory=None):
+        """Budgets per bucket of period_buckets(first, last, granularity)"""
+        return [self.range_limit(bucket_first, bucket_last, subcategory)
+                for bucket_first, bucket_last, label in period_buckets(first, last, granularity)]
+
+
+class LoanBook:
+    """Amortization schedules of all loans, summed per payment day.
+
+    A schedule is the balance after every payment, rounded to kopecks:
+    an annuity repays B * (g**n - g**k) / (g**n - 1) after k of n payments
+    (g = 1 + monthly rate), a differentiated loan B * (n - k) / n. The
+    principal of a payment is the drop of the balance and the interest is
+    the previous balance times the monthly rate, so every loan repays its
+    principal to the kopeck. The interest, the repaid principal and the
+    issued amounts are added into three flat grids with a cell per day
+    slot (31 per month) from FIRST_YEAR to LAST_YEAR. Running sums over a
+    grid give the total of any date range and the balance at any day
+    (issued minus repaid) in two lookups.
+
+    With NumPy the schedules of all loans are computed together as
+    loans x months arrays and summed with bincount; without it a loop
+    over the months of each loan does the same. Changing one loan only
+    subtracts its old schedule and adds the new one. NumPy is imported
+    only when there are loans to schedule, so a ledger without loans
+    starts without it.
+    """
+    SERIES = ["Проценты", "Основной долг", "Выдано"]
+    FIRST_YEAR = 1900
+    LAST_YEAR = 2100
+    MONTHS = (LAST_YEAR - FIRST_YEAR + 1) * 12
+    CELLS = MONTHS * 31
+    MAX_TERM = 600
+    # С меньшего числа кредитов проходы NumPy по всей сетке дороже цикла по месяцам
+    ARRAY_LOANS = 8
+
+    def __init__(self, loans=None):
+        self.loans = {}
+        self.days_in_month = [calendar.monthrange(self.FIRST_YEAR + month // 12, month % 12 + 1)[1]
+                              for month in range(self.MONTHS)]
+        self.rebuild(loans or {})
+
+    def check(self, loan):
+        """Raise ValueError unless the loan can be scheduled"""
+        if loan.principal <= 0:
+            raise ValueError("Сумма кредита должна быть больше нуля")
+        if not 0 <= loan.rate <= 1000:
+            raise ValueError(f"Некорректная ставка: {loan.rate}")
+        if not 1 <= loan.term <= self.MAX_TERM:
+            raise ValueError(f"Срок кредита от 1 до {self.MAX_TERM} месяцев")
+        if loan.kind not in LOAN_KINDS:
+            raise ValueError(f"Неизвестный вид платежа: {loan.kind}")
+        first = self.month_index(loan.start)
+        if first < 1 or first + loan.term > self.MONTHS:
+            raise ValueError(f"График кредита выходит за {self.FIRST_YEAR}-{self.LAST_YEAR} годы")
+
+    def month_index(self, date):
+        return (date.year - self.FIRST_YEAR) * 12 + date.month - 1
+
+    def cell(self, date):
+        """Grid cell of a date, clamped to the grid"""
+        return min(max(self.month_index(date) * 31 + date.day - 1, 0), self.CELLS - 1)
+
+    def rebuild(self, loans):
+        """Schedule all loans ({id: Loan}) from scratch"""
+        self.loans = dict(loans)
+        # Сетки остаются массивами array, если кредитов нет или NumPy не установлен
+        self.arrays = bool(self.loans) and load_numpy() is not None
+        if self.arrays:
+            self.month_lengths = numpy.array(self.days_in_month)
+            self.grids = {series: numpy.zeros(self.CELLS, dtype=numpy.int64) for series in self.SERIES}
+        else:
+            self.grids = {series: array("q", bytes(8 * self.CELLS)) for series in self.SERIES}
+        self.apply(list(self.loans.values()), 1)
+
+    def set(self, loan_id, loan):
+        """Add a loan or replace the loan with the given id"""
+        self.check(loan)
+        old = self.loans.get(loan_id)
+        if old is not None:
+            self.apply([old], -1)
+        self.loans[loan_id] = loan
+        self.apply([loan], 1)
+
+    def remove(self, loan_id):
+        self.apply([self.loans.pop(loan_id)], -1)
+
+    @profiled("LoanBook.apply")
+    def apply(self, loans, sign):
+        """Add (sign=1) or subtract (sign=-1) the schedules of the loans to the grids"""
+        self.running = {}
+        if not loans:
+            return
+        if self.arrays and len(loans) >= self.ARRAY_LOANS:
+            self.apply_arrays(loans, sign)
+            return
+
+        interest, repaid, issued = (self.grids[series] for series in self.SERIES)
+        days_in_month = self.days_in_month
+        for loan in loans:
+            rate = loan.rate / 1200
+            first = self.month_index(loan.start)
+            issued[(first - 1) * 31 + min(loan.start.day, days_in_month[first - 1]) - 1] += sign * loan.principal
+            balances = self.balances(loan)
+            for k in range(1, loan.term + 1):
+                month = first + k - 1
+                cell = month * 31 + min(loan.start.day, days_in_month[month]) - 1
+                interest[cell] += sign * round(balances[k - 1] * rate)
+                repaid[cell] += sign * (balances[k - 1] - balances[k])
+
+    def balances(self, loan):
+        """Balance before the first and after every payment of one loan, in kopecks"""
+        n, principal, rate = loan.term, loan.principal, loan.rate / 1200
+        if loan.kind == "Дифференцированный" or rate == 0:
+            return [round(principal * (n - k) / n) for k in range(n + 1)]
+        growth = 1 + rate
+        total_growth = growth ** n
+        return [round(principal * (total_growth - growth ** k) / (total_growth - 1)) for k in range(n + 1)]
+
+    def payment(self, loan):
+        """First monthly payment of a loan (interest plus principal), in kopecks"""
+        before, after = self.balances(loan)[:2]
+        return round(before * loan.rate / 1200) + before - after
+
+    def apply_arrays(self, loans, sign):
+        # Те же формулы, что в balances(), сразу для всех кредитов: строка - кредит, столбец - номер платежа.
+        # Аннуитетные кредиты идут первыми, и каждая формула считается на своём срезе строк без копий
+        loans = sorted(loans, key=lambda loan: loan.kind == "Дифференцированный" or loan.rate == 0)
+        annuities = sum(loan.kind != "Дифференцированный" and loan.rate != 0 for loan in loans)
+        columns = numpy.array([(loan.term, loan.principal, loan.rate / 1200, self.month_index(loan.start),
+                                loan.start.day) for loan in loans])
+        terms, principals, rates = columns[:, 0:1], columns[:, 1:2], columns[:, 2:3]
+        firsts, days = columns[:, 3].astype(numpy.int64), columns[:, 4].astype(numpy.int64)
+        count = max(loan.term for loan in loans)
+
+        # После последнего платежа остаток нулевой, дальше столбцы ничего не добавляют
+        paid = numpy.minimum(numpy.arange(count + 1, dtype=numpy.float64), terms)
+        balances = numpy.empty_like(paid)
+        if annuities:
+            growth = 1 + rates[:annuities]
+            total_growth = growth ** terms[:annuities]
+            numpy.power(growth, paid[:annuities], out=balances[:annuities])
+            numpy.subtract(total_growth, balances[:annuities], out=balances[:annuities])
+            balances[:annuities] *= principals[:annuities]
+            balances[:annuities] /= total_growth - 1
+        if annuities < len(loans):
+            numpy.subtract(terms[annuities:], paid[annuities:], out=balances[annuities:])
+            balances[annuities:] *= principals[annuities:]
+            balances[annuities:] /= terms[annuities:]
+        numpy.rint(balances, out=balances)
+        interest = numpy.multiply(balances[:, :-1], rates)
+        numpy.rint(interest, out=interest)
+        repaid = balances[:, :-1] - balances[:, 1:]
+
+        # День платежа - день первого платежа, в коротких месяцах последний день месяца.
+        # Ячейки нулевых столбцов после срока могут выйти за сетку, их итоги отрезаются
+        days_in_month = self.month_lengths
+        if days.max() > 28:
+            months = firsts[:, None] + numpy.arange(count)
+            cells = months * 31 + numpy.minimum(days[:, None], days_in_month[numpy.minimum(months, self.MONTHS - 1)])
+            cells -= 1
+        else:
+            cells = (firsts * 31 + days - 1)[:, None] + numpy.arange(0, 31 * count, 31)
+        issued_cells = (firsts - 1) * 31 + numpy.minimum(days, days_in_month[firsts - 1]) - 1
+
+        # Веса bincount во float64: суммы целых копеек в нём точны до 2**53
+        cells = cells.ravel()
+        for series, values in [("Проценты", interest), ("Основной долг", repaid)]:
+            totals = numpy.bincount(cells, weights=values.ravel(), minlength=self.CELLS)[:self.CELLS]
+            self.grids[series] += sign * totals.astype(numpy.int64)
+        numpy.add.at(self.grids["Выдано"], issued_cells, sign * principals.ravel().astype(numpy.int64))
+
+    def running_sums(self, series):
+        """Running sums of a grid with a leading zero, computed once per change"""
+        if series not in self.running:
+            grid = self.grids[series]
+            if self.arrays:
+                self.running[series] = numpy.concatenate(([0], numpy.cumsum(grid))).tolist()
+            else:
+                self.running[series] = [0] + list(accumulate(grid))
+        return self.running[series]
+
+    def range_total(self, series, first, last):
+        """Total of a series over the days first..last"""
+        running = self.running_sums(series)
+        return running[self.cell(last) + 1] - running[self.cell(first)]
+
+    def range_values(self, series, first, last, granularity):
+        """Totals of a series per bucket of period_buckets(first, last, granularity)"""
+        return [self.range_total(series, bucket_first, bucket_last)
+                for bucket_first, bucket_last, label in period_buckets(first, last, granularity)]
+
+    def balance(self, date):
+        """Debt left on all loans at the end of a day"""
+        stop = self.cell(date) + 1
+        return self.running_sums("Выдано")[stop] - self.running_sums("Основной долг")[stop]
+
+    def balance_values(self, first, last, granularity):
+        """Debt left at the end of every bucket of period_buckets(first, last, granularity)"""
+        return [self.balance(bucket_last)
+                for bucket_first, bucket_last, label in period_buckets(first, last, granularity)]
+
+
+class RecurringBook:
+    """Recurring operations, projected into the buckets one year at a time.
+
+    The occurrences of a rule are not stored as rows: expand() turns the
+    occurrences of the years a view asks for into aggregate_deltas, with the
+    allocation rules applied as to any income, once per year, so an endless
+    weekly rule costs 52 occurrences per shown year instead of a row per
+    week forever. The projected amounts are also kept in a BucketIndex of
+    their own, which Finances leaves out of the ledger snapshots.
+
+    Occurrences up to materialized[id] are rows of the ledger already and
+    are never projected again; materialize() moves the due ones there.
+    Changing or removing a rule subtracts its projection over the expanded
+    years and adds the new one.
+    """
+    MAX_EVERY = 1000
+
+    def __init__(self, rules, recurrences=None, materialized=None):
+        self.rules = rules
+        self.recurrences = dict(recurrences or {})
+        self.materialized = dict(materialized or {})
+        self.years = set()
+        self.buckets = BucketIndex()
+
+    def check(self, rule):
+        """Raise ValueError unless the rule can be expanded"""
+        if rule.type not in CATEGORIES or rule.category not in CATEGORIES:
+            raise ValueError(f"Неизвестная категория: {rule.category}")
+        if rule.subcategory and rule.subcategory not in SUBCATEGORIES.get(rule.type, []):
+            raise ValueError(f"У категории {rule.type} нет подкатегории {rule.subcategory}")
+        if rule.amount <= 0:
+            raise ValueError("Сумма должна быть больше нуля")
+        if rule.unit not in RECURRENCE_UNITS:
+            raise ValueError(f"Неизвестный шаг повтора: {rule.unit}")
+        if not 1 <= rule.every <= self.MAX_EVERY:
+            raise ValueError(f"Повтор раз в 1-{self.MAX_EVERY} {rule.unit.lower()}")
+        if rule.end is not None and rule.end < rule.start:
+            raise ValueError("Последняя дата раньше первой")
+
+    def occurrences(self, rule, first, last):
+        """Dates of the occurrences of a rule within first..last"""
+        first = max(first, rule.start)
+        if rule.end is not None:
+            last = min(last, rule.end)
+        if first > last:
+            return []
+
+        if rule.unit in ["Дни", "Недели"]:
+            step = rule.every * (7 if rule.unit == "Недели" else 1)
+            # Первое повторение не раньше first: отступ от начала правила округляется вверх до шага
+            start = rule.start.toordinal() - (rule.start.toordinal() - first.toordinal()) // step * step
+            return [datetime.date.fromordinal(ordinal) for ordinal in range(start, last.toordinal() + 1, step)]
+
+        step = rule.every * (12 if rule.unit == "Годы" else 1)
+        start = rule.start.year * 12 + rule.start.month - 1
+        month = start + max(0, (first.year * 12 + first.month - 1 - start) // step * step)
+        dates = []
+        while month <= last.year * 12 + last.month - 1:
+            year = month // 12
+            days = calendar.monthrange(year, month % 12 + 1)[1]
+            date = datetime.date(year, month % 12 + 1, min(rule.start.day, days))
+            if date > last:
+                break
+            if date >= first:
+                dates.append(date)
+            month += step
+        return dates
+
+    def dates(self, rule_id, first, last):
+        """Occurrences of a rule within first..last that are not in the ledger yet"""
+        after = self.materialized.get(rule_id)
+        if after is not None:
+            first = max(first, after + datetime.timedelta(days=1))
+        return self.occurrences(self.recurrences[rule_id], first, last)
+
+    def transactions(self, ids, first, last):
+        """Transactions of the occurrences of the rules within first..last that are not in the ledger yet"""
+        return [Transaction(rule.type, rule.category, rule.subcategory, date, rule.amount)
+                for rule_id, rule in ((rule_id, self.recurrences[rule_id]) for rule_id in ids)
+                for date in self.dates(rule_id, first, last)]
+
+    def deltas(self, ids, years, sign=1):
+        """Deltas of the projected occurrences of the rules in the years times sign, as aggregate_deltas gives them.
+
+        Every occurrence of a rule has the same amount, so its allocation is
+        evaluated once per rule and each occurrence only adds its day keys.
+        """
+        deltas = {}
+        for rule_id in ids:
+            rule = self.recurrences[rule_id]
+            parts = [(rule.category, rule.subcategory or None, sign * rule.amount)]
+            parts.extend((category, "Автоначисление", sign * amount) for category, amount in self.rules.evaluate(
+                Transaction(rule.type, rule.category, rule.subcategory, rule.start, rule.amount)))
+            for year in years:
+                year_start = datetime.date(year, 1, 1).toordinal()
+                for date in self.dates(rule_id, datetime.date(year, 1, 1), datetime.date(year, 12, 31)):
+                    month, day = date.month - 1, date.toordinal() - year_start
+                    for category, subcategory, amount in parts:
+                        key = (category, subcategory, year, month, day)
+                        deltas[key] = deltas.get(key, 0) + amount
+        deltas = tuple(deltas.items())
+        self.buckets.apply(deltas)
+        return deltas
+
+    @profiled("RecurringBook.expand")
+    def expand(self, years):
+        """Deltas of the years not expanded yet, which the caller adds to its buckets"""
+        years = sorted(set(years) - self.years)
+        if not years:
+            return ()
+        self.years.update(years)
+        return self.deltas(list(self.recurrences), years)
+
+    def set(self, rule_id, rule):
+        """Add a rule or replace the rule with the given id; returns the change of the expanded years"""
+        self.check(rule)
+        deltas = ()
+        if rule_id in self.recurrences:
+            deltas = self.deltas([rule_id], sorted(self.years), -1)
+        self.recurrences[rule_id] = rule
+        return deltas + self.deltas([rule_id], sorted(self.years))
+
+    def remove(self, rule_id):
+        """Remove a rule; returns the change of the expanded years"""
+        deltas = self.deltas([rule_id], sorted(self.years), -1)
+        del self.recurrences[rule_id]
+        self.materialized.pop(rule_id, None)
+        return deltas
+
+    def due(self, through):
+        """Occurrences up to the given day that are not in the ledger yet, and the last date of each rule"""
+        transactions = self.transactions(list(self.recurrences), datetime.date.min, through)
+        last = {}
+        for rule_id, rule in self.recurrences.items():
+            dates = self.occurrences(rule, datetime.date.min, through)
+            if dates and dates[-1] > (self.materialized.get(rule_id) or datetime.date.min):
+                last[rule_id] = dates[-1]
+        return transactions, last
+
+    def materialize(self, transactions, last):
+        """Stop projecting occurrences that became ledger rows; their years must be expanded.
+
+        Returns their allocations.
+        """
+        allocations = self.rules.allocate(transactions)
+        self.buckets.apply((key, -amount) for key, amount in aggregate_deltas(transactions, allocations))
+        self.materialized.update(last)
+        return allocations
+
+
+class Ledger:
+    """Persistent ledger in SQLite (WAL mode).
+
+    Every add is a single INSERT committed on its own, so the journal only
+    grows at the end. Every SNAPSHOT_EVERY rows the day and month buckets of all
+    years are saved as a JSON snapshot together with the last row they cover:
+    startup loads the latest snapshot and replays only the rows added after it.
+
+    Rows are never changed. Deleting marks a range of rows deleted, editing
+    deletes the row and appends the corrected one, and every add, edit and
+    delete is an event holding the range of rows it hid and the range it
+    showed, so undo and redo only flip those flags back and forth. Flips of
+    rows a snapshot already covers are logged in changes and replayed after it.
+    """
+    SNAPSHOT_EVERY = 1000
+    # PRAGMA user_version: 1 - суммы в копейках, 2 - снимки хранят итоги по дням,
+    # 3 - удалённые строки и журнал событий для отмены
+    SCHEMA_VERSION = 3
+    # Пустой диапазон строк в событии
+    NO_ROWS = (1, 0)
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY,
+                type TEXT NOT NULL,
+                category TEXT NOT NULL,
+                subcategory TEXT NOT NULL,
+                month INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                date INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS allocations (
+                source INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                amount INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS allocations_source ON allocations (source);
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY,
+                last_row INTEGER NOT NULL,
+                chart_data TEXT NOT NULL,
+                last_change INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                hidden_first INTEGER NOT NULL,
+                hidden_last INTEGER NOT NULL,
+                shown_first INTEGER NOT NULL,
+                shown_last INTEGER NOT NULL,
+                undone INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                first INTEGER NOT NULL,
+                last INTEGER NOT NULL,
+                deleted INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS budgets (
+                subcategory TEXT PRIMARY KEY,
+                amount INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS loans (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                principal INTEGER NOT NULL,
+                rate REAL NOT NULL,
+                term INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                start INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS recurring (
+                id INTEGER PRIMARY KEY,
+                type TEXT NOT NULL,
+                category TEXT NOT NULL,
+                subcategory TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL DEFAULT 0,
+                every INTEGER NOT NULL,
+                unit TEXT NOT NULL,
+                materialized INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0 and self.connection.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0] == 0 \
+                and self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0:
+            version = self.SCHEMA_VERSION
+
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(transactions)")]
+        if "date" not in columns:
+            # Операции, записанные до появления дат, относим к первому числу месяца текущего года.
+            # Старые снимки хранили один год, поэтому итоги пересчитываются заново
+            with self.connection:
+                self.connection.execute("ALTER TABLE transactions ADD COLUMN date INTEGER")
+                self.connection.execute("UPDATE transactions SET date = ? + (month + 1) * 100 + 1",
+                                        (datetime.date.today().year * 10000,))
+                self.connection.execute("DELETE FROM snapshots")
+
+        if version < 1:
+            # Суммы в рублях переводим в целые копейки, снимки пересчитываются по операциям
+            with self.connection:
+                self.connection.execute("UPDATE transactions SET amount = CAST(ROUND(amount * 100) AS INTEGER)")
+                self.connection.execute("DELETE FROM snapshots")
+        if version < 2:
+            # В снимках не было итогов по дням, пересчитываем их по операциям
+            with self.connection:
+                self.connection.execute("DELETE FROM snapshots")
+        # Все прежние операции действующие, и снимки их уже учитывают
+        snapshot_columns = [row[1] for row in self.connection.execute("PRAGMA table_info(snapshots)")]
+        with self.connection:
+            if "deleted" not in columns:
+                self.connection.execute("ALTER TABLE transactions ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+            if "last_change" not in snapshot_columns:
+                self.connection.execute("ALTER TABLE snapshots ADD COLUMN last_change INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+        self.last_row = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        # Номера изменений не повторяются и после очистки таблицы (AUTOINCREMENT)
+        self.last_change = self.connection.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'changes'").fetchone()[0]
+        snapshot = self.connection.execute(
+            "SELECT last_row, last_change FROM snapshots ORDER BY id DESC LIMIT 1").fetchone()
+        self.snapshot_row, self.snapshot_change = snapshot or (0, 0)
+
+    def append(self, transactions, allocations=(), record=True, replaces=None):
+        """Store transactions and their allocations; returns the id of the last row.
+
+        With record the rows are one add event, which undo hides again;
+        replaces is the id of a row the new ones correct: it is deleted
+        in the same transaction and belongs to the same event.
+        """
+        # Журнал пишет один процесс, поэтому новые строки получают номера подряд после last_row
+        first = self.last_row + 1
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO transactions (id, type, category, subcategory, month, amount, date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((first + index, t.type, t.category, t.subcategory or "", t.date.month - 1, t.amount,
+                  date_key(t.date)) for index, t in enumerate(transactions)))
+            self.connection.executemany(
+                "INSERT INTO allocations (source, category, amount) VALUES (?, ?, ?)",
+                ((first + source, category, amount) for source, category, amount in allocations))
+            self.last_row = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+            hidden = self.NO_ROWS
+            if replaces is not None:
+                hidden = (replaces, replaces)
+                self._mark(hidden, True)
+            if record or replaces is not None:
+                self._record(hidden, (first, self.last_row))
+        return self.last_row
+
+    def record(self, first, last):
+        """Make the already stored rows first..last one add event, as an import of many chunks is"""
+        if first <= last:
+            with self.connection:
+                self._record(self.NO_ROWS, (first, last))
+
+    def delete(self, first, last):
+        """Mark the rows first..last deleted as one event"""
+        with self.connection:
+            self._mark((first, last), True)
+            self._record((first, last), self.NO_ROWS)
+
+    def undo(self):
+        """Revert the latest event; returns the (first, last) ranges it showed and hid, or None"""
+        return self._flip("SELECT id, shown_first, shown_last, hidden_first, hidden_last FROM events "
+                          "WHERE undone = 0 ORDER BY id DESC LIMIT 1", 1)
+
+    def redo(self):
+        """Apply the earliest undone event again; returns the ranges it hid and showed, or None"""
+        return self._flip("SELECT id, hidden_first, hidden_last, shown_first, shown_last FROM events "
+                          "WHERE undone = 1 ORDER BY id LIMIT 1", 0)
+
+    def can_undo(self):
+        return self.connection.execute("SELECT 1 FROM events WHERE undone = 0 LIMIT 1").fetchone() is not None
+
+    def can_redo(self):
+        return self.connection.execute("SELECT 1 FROM events WHERE undone = 1 LIMIT 1").fetchone() is not None
+
+    def _flip(self, query, undone):
+        with self.connection:
+            event = self.connection.execute(query).fetchone()
+            if event is None:
+                return None
+            event_id, hide_first, hide_last, show_first, show_last = event
+            self._mark((hide_first, hide_last), True)
+            self._mark((show_first, show_last), False)
+            self.connection.execute("UPDATE events SET undone = ? WHERE id = ?", (undone, event_id))
+        return (show_first, show_last), (hide_first, hide_last)
+
+    def _record(self, hidden, shown):
+        # Новое событие отменяет возможность повторить отменённые
+        self.connection.execute("DELETE FROM events WHERE undone = 1")
+        self.connection.execute(
+            "INSERT INTO events (hidden_first, hidden_last, shown_first, shown_last) VALUES (?, ?, ?, ?)",
+            hidden + shown)
+
+    def _mark(self, rows, deleted):
+        first, last = rows
+        if first > last:
+            return
+        self.connection.execute("UPDATE transactions SET deleted = ? WHERE id BETWEEN ? AND ?",
+                                (int(deleted), first, last))
+        # Строки после снимка и так пересчитываются при запуске по своему флагу
+        if first <= self.snapshot_row:
+            self.last_change = self.connection.execute(
+                "INSERT INTO changes (first, last, deleted) VALUES (?, ?, ?)",
+                (first, min(last, self.snapshot_row), int(deleted))).lastrowid
+
+    def needs_snapshot(self):
+        return self.last_row - self.snapshot_row >= self.SNAPSHOT_EVERY
+
+    def save_snapshot(self, buckets, excluded=None):
+        """Save the buckets without the amounts of excluded (see BucketIndex.to_json)"""
+        if self.last_row == self.snapshot_row and self.last_change == self.snapshot_change:
+            return
+
+        with self.connection:
+            self.connection.execute("INSERT INTO snapshots (last_row, chart_data, last_change) VALUES (?, ?, ?)",
+                                    (self.last_row, json.dumps(buckets.to_json(excluded), ensure_ascii=False),
+                                     self.last_change))
+            # Старые снимки и учтённые в новом изменения больше не нужны
+            self.connection.execute("DELETE FROM snapshots WHERE id < ?", (self.connection.execute(
+                "SELECT MAX(id) FROM snapshots").fetchone()[0],))
+            self.connection.execute("DELETE FROM changes WHERE id <= ?", (self.last_change,))
+        self.snapshot_row = self.last_row
+        self.snapshot_change = self.last_change
+
+    def load_snapshot(self):
+        """Latest saved bucket rows (BucketIndex.to_json) and the last row they cover, or (None, 0)"""
+        row = self.connection.execute(
+            "SELECT chart_data, last_row FROM snapshots ORDER BY id DESC LIMIT 1").fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def load_budgets(self):
+        """Monthly budgets as {subcategory: kopecks}"""
+        return dict(self.connection.execute("SELECT subcategory, amount FROM budgets"))
+
+    def save_budget(self, subcategory, amount):
+        with self.connection:
+            if amount:
+                self.connection.execute("INSERT OR REPLACE INTO budgets (subcategory, amount) VALUES (?, ?)",
+                                        (subcategory, amount))
+            else:
+                self.connection.execute("DELETE FROM budgets WHERE subcategory = ?", (subcategory,))
+
+    def load_loans(self):
+        """Saved loans as {id: Loan}"""
+        return {loan_id: Loan(name, principal, rate, term, kind, key_date(start))
+                for loan_id, name, principal, rate, term, kind, start in self.connection.execute(
+                    "SELECT id, name, principal, rate, term, kind, start FROM loans ORDER BY id")}
+
+    def save_loan(self, loan, loan_id=None):
+        """Insert a loan or overwrite the one with the given id; returns its id"""
+        with self.connection:
+            return self.connection.execute(
+                "INSERT OR REPLACE INTO loans (id, name, principal, rate, term, kind, start) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (loan_id, loan.name, loan.principal, loan.rate, loan.term, loan.kind, date_key(loan.start))).lastrowid
+
+    def delete_loan(self, loan_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM loans WHERE id = ?", (loan_id,))
+
+    def load_recurring(self):
+        """Saved recurring operations as {id: Recurrence} and the last date of each already in the journal"""
+        recurrences, materialized = {}, {}
+        for rule_id, type, category, subcategory, amount, start, end, every, unit, last in self.connection.execute(
+                "SELECT id, type, category, subcategory, amount, start, end, every, unit, materialized "
+                "FROM recurring ORDER BY id"):
+            recurrences[rule_id] = Recurrence(type, category, subcategory, amount, key_date(start),
+                                              key_date(end) if end else None, every, unit)
+            if last:
+                materialized[rule_id] = key_date(last)
+        return recurrences, materialized
+
+    def save_recurrence(self, rule, rule_id=None, materialized=None):
+        """Insert a recurring operation or overwrite the one with the given id; returns its id"""
+        with self.connection:
+            return self.connection.execute(
+                "INSERT OR REPLACE INTO recurring (id, type, category, subcategory, amount, start, end, every, unit, "
+                "materialized) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rule_id, rule.type, rule.category, rule.subcategory or "", rule.amount, date_key(rule.start),
+                 date_key(rule.end) if rule.end else 0, rule.every, rule.unit,
+                 date_key(materialized) if materialized else 0)).lastrowid
+
+    def delete_recurrence(self, rule_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM recurring WHERE id = ?", (rule_id,))
+
+    def set_materialized(self, last):
+        """Remember the last journal date of each rule ({id: date}).
+
+        Not committed on its own: the append of the materialized rows that
+        follows commits both, so the rows are never written twice.
+        """
+        self.connection.executemany("UPDATE recurring SET materialized = ? WHERE id = ?",
+                                    ((date_key(date), rule_id) for rule_id, date in last.items()))
+
+    def load_changes(self):
+        """(first, last, deleted) flips of snapshot rows made after the snapshot, oldest first"""
+        return self.connection.execute("SELECT first, last, deleted FROM changes WHERE id > ? ORDER BY id",
+                                       (self.snapshot_change,)).fetchall()
+
+    def load_rows(self, after_row, limit=-1, deleted=None):
+        """Rows stored after the given row: the id of the last one, the transactions and their allocations.
+
+        deleted=False skips deleted rows and limit counts the rows returned;
+        by default every row is returned.
+        """
+        condition = "" if deleted is None else f" AND deleted = {int(deleted)}"
+        return self._rows(f"id > ?{condition} ORDER BY id LIMIT ?", (after_row, limit), after_row)
+
+    def load_range(self, first, last, deleted=None):
+        """Like load_rows for the rows first..last, all of them or only deleted or live ones"""
+        condition = "" if deleted is None else f" AND deleted = {int(deleted)}"
+        return self._rows(f"id BETWEEN ? AND ?{condition} ORDER BY id", (first, last), first - 1)[1:]
+
+    def deleted_rows(self, first, last):
+        """Ids of the deleted rows among first..last"""
+        return [row[0] for row in self.connection.execute(
+            "SELECT id FROM transactions WHERE id BETWEEN ? AND ? AND deleted = 1", (first, last))]
+
+    def _rows(self, condition, parameters, after_row):
+        rows = self.connection.execute(
+            "SELECT id, type, category, subcategory, date, amount FROM transactions WHERE " + condition,
+            parameters).fetchall()
+        if not rows:
+            return after_row, [], []
+
+        last_row = rows[-1][0]
+        positions = {row[0]: index for index, row in enumerate(rows)}
+        # Доли удалённых строк, попавших между выбранными, пропускаются
+        allocations = [Allocation(positions[source], category, amount) for source, category, amount in
+                       self.connection.execute(
+                           "SELECT source, category, amount FROM allocations WHERE source >= ? AND source <= ? "
+                           "ORDER BY source, rowid", (rows[0][0], last_row)) if source in positions]
+        # В журналах, созданных до перехода на копейки, столбец amount остался REAL
+        return last_row, [Transaction(type, category, subcategory, key_date(date), int(amount))
+                          for row_id, type, category, subcategory, date, amount in rows], allocations
+
+    def close(self):
+        self.connection.close()
+
+
+class StatementImporter:
+    """Streaming import of CSV and OFX bank statements.
+
+    The file is read line by line and handed out in chunks of CHUNK_SIZE
+    transactions already mapped to known categories, so memory use is
+    bounded by one chunk rather than by the file size.
+
+    CSV files need a header with the columns "сумма" and "дата" or "месяц";
+    "категория" and "подкатегория" are optional. Without a known category the
+    sign of the amount decides between income and expenses. Rows with only a
+    month are dated the first of that month of the current year.
+    """
+    CHUNK_SIZE = 10000
+    MONTH_NUMBERS = {name.lower(): month for month, name in enumerate(MONTHS)}
+
+    def __init__(self):
+        self.year = datetime.date.today().year
+        self.rows = 0
+        self.skipped = 0
+        self.file = None
+        self.size = 0
+
+    def progress(self):
+        """Percent of the file read so far"""
+        if not self.file or not self.size:
+            return 0
+        if self.file.closed:
+            return 100
+        return min(100, int(self.file.buffer.tell() * 100 / self.size))
+
+    def chunks(self, path):
+        self.size = os.path.getsize(path)
+        records = self.read_ofx(path) if path.lower().endswith(".ofx") else self.read_csv(path)
+
+        chunk = []
+        for record in records:
+            transaction = self.map_record(*record)
+            if transaction is None:
+                self.skipped += 1
+                continue
+
+            chunk.append(transaction)
+            if len(chunk) >= self.CHUNK_SIZE:
+                self.rows += len(chunk)
+                yield chunk
+                chunk = []
+
+        if chunk:
+            self.rows += len(chunk)
+            yield chunk
+
+    def read_csv(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            self.file = file
+            try:
+                dialect = csv.Sniffer().sniff(file.read(4096), delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            file.seek(0)
+
+            for row in csv.DictReader(file, dialect=dialect):
+                row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+                yield (row.get("категория", ""), row.get("подкатегория", ""),
+                       row.get("дата") or row.get("месяц", ""), row.get("сумма", ""))
+
+    def read_ofx(self, path):
+        # Операции в OFX лежат в блоках <STMTTRN> ... </STMTTRN>, закрывающие теги у полей не обязательны
+        date = amount = ""
+        with open(path, encoding="utf-8", errors="replace") as file:
+            self.file = file
+            for line in file:
+                for tag, value in re.findall(r"<(/?\w+)>([^<]*)", line):
+                    tag = tag.upper()
+                    if tag == "STMTTRN":
+                        date = amount = ""
+                    elif tag == "DTPOSTED":
+                        date = value.strip()
+                    elif tag == "TRNAMT":
+                        amount = value.strip()
+                    elif tag == "/STMTTRN":
+                        yield "", "", date, amount
+
+    def parse_date(self, text):
+        text = text.strip().lower()
+        if text in self.MONTH_NUMBERS:
+            return datetime.date(self.year, self.MONTH_NUMBERS[text] + 1, 1)
+
+        if text.isdigit() and len(text) <= 2:
+            year, month, day = self.year, int(text), 1
+        else:
+            # 2025-01-15, 20250115 (OFX) или 15.01.2025
+            match = re.match(r"(\d{4})-?(\d{2})-?(\d{2})", text)
+            if match is not None:
+                year, month, day = (int(group) for group in match.groups())
+            else:
+                match = re.match(r"(\d{1,2})[./](\d{1,2})[./](\d{2,4})", text)
+                if match is None:
+                    return None
+                day, month, year = (int(group) for group in match.groups())
+                if year < 100:
+                    year += 2000
+
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+
+    def map_record(self, category, subcategory, when, amount_text):
+        try:
+            amount = parse_money(amount_text)
+        except ValueError:
+            return None
+
+        date = self.parse_date(when)
+        if date is None:
+            return None
+
+        if category not in CATEGORIES:
+            category = "Доходы" if amount >= 0 else "Расходы"
+
+        if category in SUBCATEGORIES:
+            if subcategory not in SUBCATEGORIES[category]:
+                subcategory = "Прочее"
+        else:
+            subcategory = ""
+
+        return Transaction(category, category, subcategory, date, abs(amount))
+
+
+def money_text(kopecks):
+    """Kopecks as a plain ruble amount for files, e.g. 123456 -> 1234,56"""
+    sign = "-" if kopecks < 0 else ""
+    rubles, kopecks = divmod(abs(kopecks), 100)
+    return f"{sign}{rubles},{kopecks:02d}"
+
+
+def recurrence_text(rule):
+    """Step of a Recurrence in words, e.g. каждый месяц or раз в 2 нед."""
+    if rule.every == 1:
+        return RECURRENCE_EVERY[rule.unit]
+    return f"раз в {rule.every} {RECURRENCE_SHORT[rule.unit]}"
+
+
+class ColumnWriter:
+    """One int column written to a .npy file chunk by chunk.
+
+    The header is written with room for any row count and rewritten with
+    the real shape on close, so the column never has to be held in memory.
+    """
+    HEADER_SIZE = 128
+
+    def __init__(self, path, typecode):
+        self.file = open(path, "wb")
+        itemsize = array(typecode).itemsize
+        order = "|" if itemsize == 1 else "<" if sys.byteorder == "little" else ">"
+        self.descr = f"{order}i{itemsize}"
+        self.rows = 0
+        self.write_header()
+
+    def write_header(self):
+        header = f"{{'descr': '{self.descr}', 'fortran_order': False, 'shape': ({self.rows},), }}"
+        # Магия, версия 1.0 и длина заголовка занимают 10 байт, заголовок кончается переводом строки
+        header = header.ljust(self.HEADER_SIZE - 11) + "\n"
+        self.file.seek(0)
+        self.file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin-1"))
+
+    def append(self, values):
+        values.tofile(self.file)
+        self.rows += len(values)
+
+    def close(self):
+        self.write_header()
+        self.file.close()
+
+
+class LedgerExporter:
+    """Streaming export of a ledger file to CSV or to a directory of columns.
+
+    Rows are read through a separate read-only connection CHUNK_SIZE at a
+    time and written out before the next chunk is read, so memory use is
+    bounded by one chunk whatever the size of the journal, and the export
+    can run on a worker thread next to the window that writes the ledger.
+
+    The CSV uses the columns StatementImporter reads back, amounts in rubles
+    with a decimal comma. The columnar export writes one .npy file per
+    column of TransactionStore (numpy.load(path, mmap_mode="r") opens them
+    without copying) and strings.json with the names the int8 codes refer to.
+    """
+    CHUNK_SIZE = 10000
+    FORMATS = ["csv", "колонки"]
+    CSV_COLUMNS = ["дата", "тип", "категория", "подкатегория", "сумма", "распределено"]
+    COLUMNS = ["types", "categories", "subcategories", "dates", "amounts",
+               "allocation_sources", "allocation_categories", "allocation_amounts"]
+
+    def __init__(self, ledger_path):
+        self.connection = sqlite3.connect(pathlib.Path(ledger_path).resolve().as_uri() + "?mode=ro", uri=True)
+        self.total = self.connection.execute("SELECT COUNT(*) FROM transactions WHERE deleted = 0").fetchone()[0]
+        self.rows = 0
+
+    def progress(self):
+        """Percent of the journal exported so far"""
+        return 100 if not self.total else min(100, self.rows * 100 // self.total)
+
+    def chunks(self):
+        """(rows, allocations) of the live journal rows CHUNK_SIZE rows at a time, as stored"""
+        last_row = 0
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, type, category, subcategory, date, amount FROM transactions "
+                "WHERE id > ? AND deleted = 0 ORDER BY id LIMIT ?", (last_row, self.CHUNK_SIZE)).fetchall()
+            if not rows:
+                return
+            allocations = self.connection.execute(
+                "SELECT source, category, amount FROM allocations WHERE source > ? AND source <= ? "
+                "ORDER BY source, rowid", (last_row, rows[-1][0])).fetchall()
+            last_row = rows[-1][0]
+            yield rows, allocations
+
+    def export(self, path, format=None):
+        """Write the journal to path; yields the rows written so far after every chunk"""
+        if format is None:
+            format = "csv" if path.lower().endswith(".csv") else "колонки"
+        if format not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат экспорта: {format}")
+        return self.write_csv(path) if format == "csv" else self.write_columns(path)
+
+    def write_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8-sig") as file:
+            writer = csv.writer(file, delimiter=";")
+            writer.writerow(self.CSV_COLUMNS)
+            for rows, allocations in self.chunks():
+                parts = defaultdict(list)
+                for source, category, amount in allocations:
+                    parts[source].append(f"{category}: {money_text(int(amount))}")
+                writer.writerows((f"{date % 100:02d}.{date // 100 % 100:02d}.{date // 10000}", type, category,
+                                  subcategory, money_text(int(amount)), ", ".join(parts.get(row_id, ())))
+                                 for row_id, type, category, subcategory, date, amount in rows)
+                self.rows += len(rows)
+                yield self.rows
+
+    def write_columns(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        # Пачка кодируется в столбцы того же вида, что TransactionStore истории в окне,
+        # и сразу уходит на диск: в памяти остаются только строки названий
+        store = TransactionStore()
+        intern = store.intern
+        columns = {name: ColumnWriter(os.path.join(directory, f"{name}.npy"), getattr(store, name).typecode)
+                   for name in self.COLUMNS}
+        try:
+            for rows, allocations in self.chunks():
+                row_ids, types, categories, subcategories, dates, amounts = zip(*rows)
+                store.types.extend(map(intern, types))
+                store.categories.extend(map(intern, categories))
+                store.subcategories.extend(map(intern, subcategories))
+                store.dates.extend(dates)
+                # В старых журналах суммы остались REAL
+                store.amounts.extend(map(int, amounts))
+                positions = dict(zip(row_ids, range(self.rows, self.rows + len(rows))))
+                # Доли удалённых строк между выгружаемыми не нужны
+                allocations = [allocation for allocation in allocations if allocation[0] in positions]
+                if allocations:
+                    sources, categories, amounts = zip(*allocations)
+                    store.allocation_sources.extend(map(positions.__getitem__, sources))
+                    store.allocation_categories.extend(map(intern, categories))
+                    store.allocation_amounts.extend(map(int, amounts))
+
+                for name in self.COLUMNS:
+                    column = getattr(store, name)
+                    columns[name].append(column)
+                    del column[:]
+                self.rows += len(rows)
+                yield self.rows
+        finally:
+            for column in columns.values():
+                column.close()
+            with open(os.path.join(directory, "strings.json"), "w", encoding="utf-8") as file:
+                json.dump({"strings": store.strings, "rows": self.rows}, file, ensure_ascii=False)
+
+    def close(self):
+        self.connection.close()
+
+
+def empty_chart_data():
+    """Month values of one year per category and subcategory, as the charts read them"""
+    return {
+        "Доходы": {
+            "total": [0] * 12,
+            "Зарплата": [0] * 12,
+            "Подарок": [0] * 12,
+            "Прочее": [0] * 12
+        },
+        "Расходы": {
+            "total": [0] * 12,
+            "Транспорт": [0] * 12,
+            "Продукты": [0] * 12,
+            "Развлечения": [0] * 12,
+            "Прочее": [0] * 12
+        },
+        "Сбережения": [0] * 12,
+        "Благотворительность": [0] * 12,
+        "Кредиты": [0] * 12
+    }
+
+
+class Finances:
+    """Headless data model of the app: ledger, totals and history.
+
+    Holds the month buckets of all years, chart_data with the months of one
+    year (self.year) and its AggregateIndex, and the history loaded so far
+    with its HistoryIndex. History row k is ledger row k + 1. The loans
+    saved in the ledger are scheduled in a LoanBook. Recurring operations
+    (RecurringBook) are projected into the buckets for the years that are
+    read, and due ones become ledger rows on materialize(). Every change of the
+    buckets is checked against the expense budgets (BudgetIndex), and the
+    thresholds it crossed wait in self.alerts until take_alerts().
+    Deleting, editing, undo and redo subtract or add back the deltas of the
+    rows they hide or show, so their cost depends on those rows alone.
+    The SQLite connection belongs to the thread that created the object, so
+    a server keeps one Finances per worker thread or serialises calls.
+    """
+    # Столько строк журнала читается за раз, когда отмена скрывает или возвращает целый импорт
+    FLIP_CHUNK = 100000
+    # Непрочитанных сообщений о бюджетах хранится не больше этого, старые вытесняются
+    ALERT_LIMIT = 100
+
+    def __init__(self, ledger_path=LEDGER_PATH, rules=None):
+        self.rules = rules or AllocationRules(DEFAULT_ALLOCATION_RULES)
+
+        # Загружаем последний снимок итогов по месяцам всех лет
+        # и досчитываем операции, добавленные после него
+        self.ledger = Ledger(ledger_path)
+        self.buckets = BucketIndex()
+        snapshot, snapshot_row = self.ledger.load_snapshot()
+        if snapshot:
+            self.buckets.load(snapshot)
+        last_row, transactions, allocations = self.ledger.load_rows(snapshot_row, deleted=False)
+        self.buckets.apply(aggregate_deltas(transactions, allocations))
+        # Удаления и отмены строк, которые снимок уже учёл
+        for first, last, deleted in self.ledger.load_changes():
+            self.buckets.apply(self.range_deltas(first, last, -1 if deleted else 1))
+
+        # Повторяющиеся операции: их повторения добавляются к итогам по годам, когда те читаются
+        self.recurring = RecurringBook(self.rules, *self.ledger.load_recurring())
+
+        # Итоги и максимумы по месяцам одного года, обновляются при каждом добавлении
+        self.chart_data = empty_chart_data()
+        self.aggregates = AggregateIndex(self.chart_data)
+        self.load_year(datetime.date.today().year)
+
+        # История операций подгружается отдельно, см. load_history
+        self.transactions = TransactionStore()
+        self.history_index = HistoryIndex(self.transactions)
+        self.history_row = 0
+        self.history_loaded = False
+
+        # Первая строка импорта, который станет одним событием, пока он идёт (см. begin_batch)
+        self.batch_first = None
+
+        # Графики погашения кредитов
+        self.loans = LoanBook(self.ledger.load_loans())
+
+        # Бюджеты расходов и сообщения о пересечённых порогах, которые ещё не показаны
+        self.budgets = BudgetIndex(self.buckets, self.ledger.load_budgets())
+        self.alerts = deque(maxlen=self.ALERT_LIMIT)
+
+    def load_year(self, year):
+        """Fill chart_data with the months of the given year from the buckets"""
+        self.year = year
+        self.expand(range(year, year + 1))
+        for category in CATEGORIES:
+            for subcategory in [None] + SUBCATEGORIES.get(category, []):
+                self.aggregates.series(category, subcategory)[:] = self.buckets.months(category, year, subcategory)
+        self.aggregates.rebuild()
+
+    @profiled("Finances.load_history")
+    def load_history(self, limit=-1):
+        """Load up to limit more rows of history into self.transactions; returns how many were loaded"""
+        first = self.history_row
+        self.history_row, transactions, allocations = self.ledger.load_rows(first, limit)
+        deleted = [row - first - 1 for row in self.ledger.deleted_rows(first + 1, self.history_row)]
+        self.transactions.extend(transactions, allocations, deleted)
+        self.history_index.update()
+        if limit < 0 or len(transactions) < limit:
+            self.history_loaded = True
+        return len(transactions)
+
+    def expand(self, years):
+        """Add the projected recurring operations of the years to the buckets, once per year"""
+        deltas = self.recurring.expand(years)
+        if deltas:
+            # Проекция - не изменение: о бюджетах здесь не сообщаем
+            self.buckets.apply(deltas)
+            self.aggregates.apply([((category, subcategory, month), amount)
+                                   for (category, subcategory, year, month, day), amount in deltas
+                                   if year == self.year])
+
+    def apply_deltas(self, deltas, alerts_through=None):
+        """Add aggregate_deltas to the buckets and to chart_data; returns the (key, amount) deltas of the loaded year.
+
+        With alerts_through (year, month from 0) budget thresholds of later months are not reported.
+        Raises ValueError before any index changes if a delta has an unknown category or subcategory.
+        """
+        self.check_deltas(deltas)
+        if self.recurring.recurrences:
+            # Пороги бюджетов сравниваются с итогами вместе с повторениями месяца
+            self.expand({key[2] for key, amount in deltas})
+        self.buckets.apply(deltas)
+        alerts = self.budgets.crossings(deltas)
+        if alerts_through is not None:
+            alerts = [alert for alert in alerts if (alert.year, alert.month) <= alerts_through]
+        self.alerts.extend(alerts)
+        # В chart_data попадают только месяцы загруженного года
+        year_deltas = [((category, subcategory, month), amount)
+                       for (category, subcategory, year, month, day), amount in deltas if year == self.year]
+        self.aggregates.apply(year_deltas)
+        return year_deltas
+
+    def check_deltas(self, deltas):
+        """Raise ValueError if a delta has no series: an unknown category or a subcategory of another category"""
+        for (category, subcategory, year, month, day), amount in deltas:
+            if category not in CATEGORIES or subcategory and category in SUBCATEGORIES and \
+                    subcategory not in SUBCATEGORIES[category]:
+                raise ValueError(f"Нет ряда для категории {category} и подкатегории {subcategory}")
+
+    def range_deltas(self, first, last, sign=1):
+        """aggregate_deltas of the ledger rows first..last times sign, read FLIP_CHUNK rows at a time"""
+        deltas = []
+        for start in range(first, last + 1, self.FLIP_CHUNK):
+            transactions, allocations = self.ledger.load_range(start, min(start + self.FLIP_CHUNK - 1, last))
+            deltas.extend((key, sign * amount) for key, amount in aggregate_deltas(transactions, allocations))
+        return deltas
+
+    @profiled("Finances.commit")
+    def commit(self, transactions, allocations=None, deltas=None, record=True, replaces=None):
+        """Record transactions and their allocations; returns the (key, amount) deltas of the loaded year.
+
+        record and replaces are passed to Ledger.append. Raises ValueError, and changes nothing,
+        on an amount SQLite cannot store or a row without a series.
+        """
+        if transactions and max(abs(transaction.amount) for transaction in transactions) > MAX_KOPECKS:
+            raise ValueError("Сумма операции не помещается в журнал")
+        if allocations is None:
+            allocations = self.rules.allocate(transactions)
+        if deltas is None:
+            deltas = aggregate_deltas(transactions, allocations)
+        self.check_deltas(deltas)
+        PROFILER.count("Операции", len(transactions))
+
+        # Итоги меняются только после того, как операции сохранены на диск: при ошибке записи
+        # в них не остаётся сумм, которых нет в журнале (и их не запишет следующий снимок)
+        batch = (record or replaces is not None) and self.end_batch()
+        try:
+            self.ledger.append(transactions, allocations, record, replaces)
+        finally:
+            if batch:
+                self.begin_batch()
+        year_deltas = self.apply_deltas(deltas)
+        if self.ledger.needs_snapshot():
+            self.ledger.save_snapshot(self.buckets, self.recurring.buckets)
+
+        # Пока история догружается, новые строки придут вместе с ней
+        if self.history_loaded:
+            self.transactions.extend(transactions, allocations)
+            self.history_index.update()
+            self.history_row = self.ledger.last_row
+        return year_deltas
+
+    def add(self, category_type, category, date, amount, subcategory=None):
+        # Доходы распределяются в сбережения и благотворительность по правилам
+        return self.commit([Transaction(category_type, category, subcategory or "", date, amount)])
+
+    @profiled("Finances.import_file")
+    def import_file(self, path):
+        """Import a statement chunk by chunk as one undoable event; returns (rows, skipped rows, seconds)"""
+        start = time.perf_counter()
+        importer = StatementImporter()
+        self.begin_batch()
+        try:
+            for chunk in importer.chunks(path):
+                self.commit(chunk, record=False)
+        finally:
+            self.end_batch()
+        return importer.rows, importer.skipped, time.perf_counter() - start
+
+    def begin_batch(self):
+        """Collect the rows of the following commit(record=False) calls into one undoable event"""
+        self.batch_first = self.ledger.last_row + 1
+
+    def end_batch(self):
+        """Record the collected rows as one event; returns whether a batch was open"""
+        if self.batch_first is None:
+            return False
+        self.ledger.record(self.batch_first, self.ledger.last_row)
+        self.batch_first = None
+        return True
+
+    def check_row(self, row):
+        if not 0 <= row < self.ledger.last_row or self.ledger.deleted_rows(row + 1, row + 1):
+            raise ValueError(f"Операции {row + 1} нет в журнале или она удалена")
+
+    @profiled("Finances.flip")
+    def flip(self, rows, deleted):
+        """Follow ledger rows (first, last) just deleted or restored; returns their year deltas and history rows"""
+        first, last = rows
+        if first > last:
+            return [], range(0)
+        year_deltas = self.apply_deltas(self.range_deltas(first, last, -1 if deleted else 1))
+
+        # Строки, которые история ещё не загрузила, придут из журнала уже с флагом
+        history_rows = range(first - 1, max(first - 1, min(last, self.history_row)))
+        if deleted:
+            self.transactions.deleted.update(history_rows)
+        else:
+            self.transactions.deleted.difference_update(history_rows)
+        return year_deltas, history_rows
+
+    def delete(self, row):
+        """Delete a history row as one undoable event; returns a Change"""
+        self.check_row(row)
+        batch = self.end_batch()
+        self.ledger.delete(row + 1, row + 1)
+        if batch:
+            self.begin_batch()
+        year_deltas, hidden = self.flip((row + 1, row + 1), True)
+        return Change(year_deltas, range(0), hidden)
+
+    def edit(self, row, transaction):
+        """Replace a history row with a corrected transaction as one undoable event; returns a Change.
+
+        The corrected row is appended to the history, its allocations follow the rules again.
+        """
+        self.check_row(row)
+        year_deltas = self.commit([transaction], replaces=row + 1)
+        hidden_deltas, hidden = self.flip((row + 1, row + 1), True)
+        return Change(year_deltas + hidden_deltas, range(0), hidden)
+
+    def undo(self):
+        """Revert the latest add, import, edit or delete; returns a Change or None if there is nothing to undo"""
+        # Импорт, который ещё идёт, отменяется по уже записанную строку
+        batch = self.end_batch()
+        rows = self.ledger.undo()
+        if batch:
+            self.begin_batch()
+        return rows and self.apply_flip(*rows)
+
+    def redo(self):
+        """Repeat the latest undone event; returns a Change or None if there is nothing to redo"""
+        batch = self.end_batch()
+        rows = self.ledger.redo()
+        if batch:
+            self.begin_batch()
+        return rows and self.apply_flip(*rows)
+
+    def apply_flip(self, shown, hidden):
+        shown_deltas, shown_rows = self.flip(shown, False)
+        hidden_deltas, hidden_rows = self.flip(hidden, True)
+        return Change(shown_deltas + hidden_deltas, shown_rows, hidden_rows)
+
+    def set_budget(self, subcategory, amount):
+        """Set the monthly budget of a Расходы subcategory in kopecks; 0 removes it"""
+        self.budgets.set_limit(subcategory, amount)
+        self.ledger.save_budget(subcategory, amount)
+
+    def take_alerts(self):
+        """Budget alerts raised since the last call, oldest first"""
+        alerts = list(self.alerts)
+        self.alerts.clear()
+        return alerts
+
+    def save_loan(self, loan, loan_id=None):
+        """Add a loan or change the one with the given id and reschedule it; returns its id"""
+        self.loans.check(loan)
+        loan_id = self.ledger.save_loan(loan, loan_id)
+        self.loans.set(loan_id, loan)
+        return loan_id
+
+    def delete_loan(self, loan_id):
+        self.ledger.delete_loan(loan_id)
+        self.loans.remove(loan_id)
+
+    def save_recurrence(self, rule, rule_id=None):
+        """Add a recurring operation or change the one with the given id.
+
+        Returns its id and the (key, amount) deltas of the loaded year, as commit() does.
+        """
+        self.recurring.check(rule)
+        rule_id = self.ledger.save_recurrence(rule, rule_id, self.recurring.materialized.get(rule_id))
+        return rule_id, self.apply_deltas(self.recurring.set(rule_id, rule), self.current_month())
+
+    def delete_recurrence(self, rule_id):
+        """Stop a recurring operation; occurrences already in the journal stay. Returns the year deltas"""
+        self.ledger.delete_recurrence(rule_id)
+        return self.apply_deltas(self.recurring.remove(rule_id), self.current_month())
+
+    def current_month(self):
+        # Будущие повторения - прогноз: о бюджетах сообщаем только до текущего месяца
+        today = datetime.date.today()
+        return today.year, today.month - 1
+
+    @profiled("Finances.materialize")
+    def materialize(self, through=None):
+        """Write the recurring occurrences up to the given day (today) to the journal; returns how many.
+
+        The rows are not an undoable event: deleting one of them skips that
+        occurrence. The totals stay the same, the projection becomes rows.
+        """
+        transactions, last = self.recurring.due(through or datetime.date.today())
+        if not transactions:
+            return 0
+        self.expand({transaction.date.year for transaction in transactions})
+        allocations = self.recurring.materialize(transactions, last)
+
+        # Строки повторений не входят в событие идущего импорта
+        batch = self.end_batch()
+        self.ledger.set_materialized(last)
+        self.commit(transactions, allocations, deltas=(), record=False)
+        if batch:
+            self.begin_batch()
+        return len(transactions)
+
+    def values(self, category, start, end, granularity, subcategory=None):
+        self.expand(range(start, end + 1))
+        return self.buckets.values(category, start, end, granularity, subcategory)
+
+    def total(self, category, start, end, subcategory=None):
+        self.expand(range(start, end + 1))
+        return self.buckets.total(category, start, end, subcategory)
+
+    def range_values(self, category, first, last, granularity, subcategory=None):
+        self.expand(range(first.year, last.year + 1))
+        return self.buckets.range_values(category, first, last, granularity, subcategory)
+
+    def range_total(self, category, first, last, subcategory=None):
+        self.expand(range(first.year, last.year + 1))
+        return self.buckets.range_total(category, first, last, subcategory)
+
+    def report(self, start, end, granularity):
+        """Period labels and the values of every category over them"""
+        return period_labels(start, end, granularity), {
+            category: self.values(category, start, end, granularity) for category in CATEGORIES}
+
+    def close(self):
+        self.end_batch()
+        # Проекции повторений в снимок не попадают, при запуске они считаются заново
+        self.ledger.save_snapshot(self.buckets, self.recurring.buckets)
+        self.ledger.close()